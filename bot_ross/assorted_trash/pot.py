@@ -1,28 +1,33 @@
-# include RPi libraries in to Python code
-import RPi.GPIO as GPIO
+import os
+import sys
 import time
 
+# the GPIO backends live one directory up
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import gpio_backend  # noqa: E402
+
 
 class Pot():
-    def __init__(self, a, b):
+    def __init__(self, a, b, gpio=None):
         # define GPIO pins with variables a_pin and b_pin
         self.a_pin = a
         self.b_pin = b
+        self._gpio = gpio or gpio_backend.default()
 
     # create discharge function for reading capacitor data
     def discharge(self):
-        GPIO.setup(self.a_pin, GPIO.IN)
-        GPIO.setup(self.b_pin, GPIO.OUT)
-        GPIO.output(self.b_pin, False)
+        self._gpio.setup(self.a_pin, self._gpio.IN)
+        self._gpio.setup(self.b_pin, self._gpio.OUT)
+        self._gpio.output(self.b_pin, False)
         time.sleep(0.005)
 
     # create time function for capturing analog count value
     def charge_time(self):
-        GPIO.setup(self.b_pin, GPIO.IN)
-        GPIO.setup(self.a_pin, GPIO.OUT)
+        self._gpio.setup(self.b_pin, self._gpio.IN)
+        self._gpio.setup(self.a_pin, self._gpio.OUT)
         count = 0
-        GPIO.output(self.a_pin, True)
-        while not GPIO.input(self.b_pin):
+        self._gpio.output(self.a_pin, True)
+        while not self._gpio.input(self.b_pin):
             count = count + 1
         return count
 
@@ -35,8 +40,8 @@ class Pot():
 if __name__ == '__main__':
     pot = Pot(a=18, b=23)
 
-    # instantiate GPIO as an object
-    GPIO.setmode(GPIO.BCM)
+    # number the pins like every other driver
+    pot._gpio.setmode(pot._gpio.BCM)
 
     # provide a loop to display analog data count value on the screen
     while True:
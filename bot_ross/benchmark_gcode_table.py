@@ -0,0 +1,56 @@
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from gcode import parse
+from gcode_table import tokenize, tokenize_file
+
+
+def synthetic_job(lines, seed=0):
+    """
+    Make a job of tiny relative G1 moves in the format XboxToGcode sends, with a tool change every so often
+
+    Arguments:
+        lines {int} -- how many lines to make
+
+    Keyword Arguments:
+        seed {int} -- the random seed (default: {0})
+
+    Returns:
+        bytes -- the job
+    """
+    rng = random.Random(seed)
+    out = ['G91']
+    for i in range(lines - 1):
+        if i % 5000 == 4999:
+            out.append('T{}'.format(rng.randrange(8)))
+        else:
+            out.append('G1 X{} Y{} Z{} E{} F{}'.format(rng.uniform(-1, 1), rng.uniform(-1, 1), 0, 0,
+                                                       rng.uniform(10, 100)))
+    return ('\n'.join(out) + '\n').encode()
+
+
+def measure(name, function, lines):
+    start_time = time.perf_counter()
+    commands = function()
+    elapsed = time.perf_counter() - start_time
+    print('{:<20} {:>12.0f} lines/s ({:.2f} s, {} commands)'.format(name, lines / elapsed, elapsed, len(commands)))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='measure how fast G-code is parsed into a GcodeTable')
+    parser.add_argument('--lines', type=int, default=1000000, help='the number of lines in the synthetic job')
+    args = parser.parse_args()
+
+    job = synthetic_job(args.lines)
+    with tempfile.NamedTemporaryFile(suffix='.gcode', delete=False) as f:
+        f.write(job)
+    try:
+        measure('tokenize bytes', lambda: tokenize(job), args.lines)
+        measure('tokenize_file mmap', lambda: tokenize_file(f.name), args.lines)
+        measure('tokenize_file read', lambda: tokenize_file(f.name, use_mmap=False), args.lines)
+        measure('parse per line', lambda: list(parse(job.decode().splitlines())), args.lines)
+    finally:
+        os.remove(f.name)
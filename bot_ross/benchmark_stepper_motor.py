@@ -0,0 +1,107 @@
+import argparse
+import gpio_backend
+import time
+
+from stepper_motor import StepperMotor, StepperMotorDirection
+
+
+def legacy_step(motor, direction=StepperMotorDirection.FORWARD):
+    """
+    The if/elif implementation of StepperMotor.step that issued one GPIO.output call per pin, kept for comparison
+    """
+    gpio = motor._gpio
+    out1, out2, out3, out4 = motor._outs
+    motor._i = (motor._i + direction.value) % 8
+
+    if motor._i == 0:
+        gpio.output(out1, gpio.HIGH)
+        gpio.output(out2, gpio.LOW)
+        gpio.output(out3, gpio.LOW)
+        gpio.output(out4, gpio.LOW)
+    elif motor._i == 1:
+        gpio.output(out1, gpio.HIGH)
+        gpio.output(out2, gpio.HIGH)
+        gpio.output(out3, gpio.LOW)
+        gpio.output(out4, gpio.LOW)
+    elif motor._i == 2:
+        gpio.output(out1, gpio.LOW)
+        gpio.output(out2, gpio.HIGH)
+        gpio.output(out3, gpio.LOW)
+        gpio.output(out4, gpio.LOW)
+    elif motor._i == 3:
+        gpio.output(out1, gpio.LOW)
+        gpio.output(out2, gpio.HIGH)
+        gpio.output(out3, gpio.HIGH)
+        gpio.output(out4, gpio.LOW)
+    elif motor._i == 4:
+        gpio.output(out1, gpio.LOW)
+        gpio.output(out2, gpio.LOW)
+        gpio.output(out3, gpio.HIGH)
+        gpio.output(out4, gpio.LOW)
+    elif motor._i == 5:
+        gpio.output(out1, gpio.LOW)
+        gpio.output(out2, gpio.LOW)
+        gpio.output(out3, gpio.HIGH)
+        gpio.output(out4, gpio.HIGH)
+    elif motor._i == 6:
+        gpio.output(out1, gpio.LOW)
+        gpio.output(out2, gpio.LOW)
+        gpio.output(out3, gpio.LOW)
+        gpio.output(out4, gpio.HIGH)
+    elif motor._i == 7:
+        gpio.output(out1, gpio.HIGH)
+        gpio.output(out2, gpio.LOW)
+        gpio.output(out3, gpio.LOW)
+        gpio.output(out4, gpio.HIGH)
+
+
+def measure(step, motor, steps):
+    """
+    Time a number of steps
+
+    Arguments:
+        step {function} -- called with (motor, direction) once per step
+        motor {StepperMotor} -- the motor to step
+        steps {int} -- how many steps to take
+
+    Returns:
+        (float, float) -- the microseconds each step took, and the number of GPIO writes per step if the backend counts
+            them (None if not)
+    """
+    writes = getattr(motor._gpio, 'writes', None)
+    direction = StepperMotorDirection.FORWARD
+    start_time = time.perf_counter()
+    for _ in range(steps):
+        step(motor, direction)
+    elapsed = time.perf_counter() - start_time
+    if writes is not None:
+        writes = (motor._gpio.writes - writes) / steps
+    return elapsed / steps * 1e6, writes
+
+
+def print_result(name, step_time, writes):
+    writes = '-' if writes is None else '{:.0f}'.format(writes)
+    print('{:<28} {:>10.2f} us/step {:>4} GPIO writes/step'.format(name, step_time, writes))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='compare the per-step cost of StepperMotor.step across GPIO backends')
+    parser.add_argument('--steps', type=int, default=200000, help='number of steps to time for each path')
+    parser.add_argument('--pins', type=int, nargs=4, default=(6, 19, 22, 26), help='the BCM channels to step')
+    parser.add_argument('--backends', nargs='+', default=gpio_backend.BACKENDS, choices=gpio_backend.BACKENDS,
+                        help='the backends to time')
+    args = parser.parse_args()
+
+    for backend in args.backends:
+        try:
+            gpio = gpio_backend.create(backend)
+            motor = StepperMotor(*args.pins, gpio=gpio)
+        except (ImportError, OSError, RuntimeError) as e:
+            print('{:<28} unavailable: {}'.format(backend, e))
+            continue
+
+        try:
+            print_result('{} legacy if/elif'.format(backend), *measure(legacy_step, motor, args.steps))
+            print_result('{} phase table'.format(backend), *measure(StepperMotor.step, motor, args.steps))
+        finally:
+            gpio.cleanup()
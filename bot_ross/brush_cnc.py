@@ -1,62 +1,223 @@
 import defines
+import geometry
+from ganged_stepper_motor import GangedStepperMotor
+from homing import Homing, HomingAxis
+from linear_interpolator import LinearInterpolator, path_frequency
+from move_futures import running_loop, wait_async
 from stepper_motor import StepperMotor, StepperMotorDirection  # noqa: 402
+from step_scheduler import StepScheduler
 from switch import Switch
 
 
 class BrushCNC():
-    def __init__(self):
+    def __init__(self, gpio=None, scheduler=None, trace=None, telemetry=None):
+        """
+        Keyword Arguments:
+            gpio {module} -- the GPIO backend for the motors and switches, for example a SimulatedGPIO
+                (default: {gpio_backend.default()})
+            scheduler {StepScheduler} -- times the steps of every motor on the machine (default: a new StepScheduler)
+            trace {JogTrace} -- stamps the first step of each jog command, or None to not trace (default: {None})
+            telemetry {StepTelemetry} -- records how late each step of every motor is, whether the motor steps on its
+                own or in a coordinated move, or None to not record (default: {None})
+        """
+        self._scheduler = scheduler or StepScheduler()
+
         self._stepper_x = StepperMotor(
             defines.STEPPER_X_1,
             defines.STEPPER_X_2,
             defines.STEPPER_X_3,
-            defines.STEPPER_X_4
+            defines.STEPPER_X_4,
+            scheduler=self._scheduler,
+            acceleration=defines.STEPPER_X_MAX_ACCEL,
+            jerk=defines.STEPPER_X_MAX_JERK,
+            gpio=gpio,
+            telemetry=telemetry,
+            trace=trace
         )
-        self._stepper_y_left = StepperMotor(
-            defines.STEPPER_Y_LEFT_1,
-            defines.STEPPER_Y_LEFT_2,
-            defines.STEPPER_Y_LEFT_3,
-            defines.STEPPER_Y_LEFT_4
-        )
-        self._stepper_y_right = StepperMotor(
-            defines.STEPPER_Y_RIGHT_1,
-            defines.STEPPER_Y_RIGHT_2,
-            defines.STEPPER_Y_RIGHT_3,
-            defines.STEPPER_Y_RIGHT_4
+        self._stepper_y = GangedStepperMotor(
+            [
+                (defines.STEPPER_Y_LEFT_1, defines.STEPPER_Y_LEFT_2, defines.STEPPER_Y_LEFT_3,
+                 defines.STEPPER_Y_LEFT_4),
+                (defines.STEPPER_Y_RIGHT_1, defines.STEPPER_Y_RIGHT_2, defines.STEPPER_Y_RIGHT_3,
+                 defines.STEPPER_Y_RIGHT_4)
+            ],
+            home_offsets=(0, defines.STEPPER_Y_RIGHT_HOME_OFFSET),
+            scheduler=self._scheduler,
+            acceleration=defines.STEPPER_Y_MAX_ACCEL,
+            jerk=defines.STEPPER_Y_MAX_JERK,
+            gpio=gpio,
+            telemetry=telemetry,
+            trace=trace
         )
         self._stepper_z = StepperMotor(
             defines.STEPPER_Z_1,
             defines.STEPPER_Z_2,
             defines.STEPPER_Z_3,
-            defines.STEPPER_Z_4
+            defines.STEPPER_Z_4,
+            scheduler=self._scheduler,
+            acceleration=defines.STEPPER_Z_MAX_ACCEL,
+            jerk=defines.STEPPER_Z_MAX_JERK,
+            gpio=gpio,
+            telemetry=telemetry,
+            trace=trace
         )
-        self._switch_reset_x = Switch(defines.SWITCH_RESET_X)
-        self._switch_reset_y = Switch(defines.SWITCH_RESET_Y)
-        self._switch_reset_z = Switch(defines.SWITCH_RESET_Z)
+        self._interpolator = LinearInterpolator(self._scheduler, telemetry=telemetry)
+        self._switch_reset_x = Switch(defines.SWITCH_RESET_X, gpio=gpio, scheduler=self._scheduler)
+        self._switch_reset_y = Switch(defines.SWITCH_RESET_Y, gpio=gpio, scheduler=self._scheduler)
+        self._switch_reset_z = Switch(defines.SWITCH_RESET_Z, gpio=gpio, scheduler=self._scheduler)
+        self._homed = False
+
+    def _homing_axes(self):
+        """
+        Returns:
+            [HomingAxis] -- the motors, reset switch, top speed and length of each axis
+        """
+        return [
+            HomingAxis('x', [self._stepper_x], self._switch_reset_x, defines.STEPPER_X_MAX_HZ, defines.BOARD_X_LENGTH),
+            HomingAxis('y', [self._stepper_y], self._switch_reset_y, defines.STEPPER_Y_MAX_HZ, defines.BOARD_Y_LENGTH),
+            HomingAxis('z', [self._stepper_z], self._switch_reset_z, defines.STEPPER_Z_MAX_HZ, defines.BOARD_Z_LENGTH)
+        ]
 
-    def zeroing(self):
+    def zeroing(self, timeout=defines.HOMING_TIMEOUT):
         """
         Uses the limit switches for each of the motors to bring them all back to a zeroed position
+
+        All the axes home at once, each with a fast approach, a back-off, and a slow re-approach (see Homing). Once
+        homed, moves outside of the board are refused.
+
+        Keyword Arguments:
+            timeout {float} -- the most seconds each axis may take, or None for no limit
+                (default: {defines.HOMING_TIMEOUT})
+
+        Returns:
+            {str: AxisHomingResult} -- how long each axis took and where the slow re-approach found its switch
+
+        Raises:
+            HomingError -- if an axis did not reach its switch, could not back off it, or timed out
+        """
+        self._homed = False
+        results = Homing(
+            self._scheduler,
+            self._homing_axes(),
+            fast_fraction=defines.HOMING_FAST_FRACTION,
+            slow_fraction=defines.HOMING_SLOW_FRACTION,
+            backoff=defines.HOMING_BACKOFF_STEPS,
+            timeout=timeout
+        ).run()
+        self._homed = True
+        return results
+
+    def get_position(self):
+        """
+        Get the position of the brush
+
+        Returns:
+            (int, int, int) -- the x, y, and z position in steps
+        """
+        return self._stepper_x._pos, self._stepper_y._pos, self._stepper_z._pos
+
+    def move_to(self, x=None, y=None, z=None, feed_rate=None, wait=False):
+        """
+        Move the brush in a straight line to an absolute position. All the axes start and stop together.
+
+        Keyword Arguments:
+            x {int} -- the x position to move to in steps, or None to stay put (default: {None})
+            y {int} -- the y position to move to in steps, or None to stay put (default: {None})
+            z {int} -- the z position to move to in steps, or None to stay put (default: {None})
+            feed_rate {float} -- the speed along the path in steps/second. It is lowered if any axis would go over its
+                STEPPER_*_MAX_HZ. (default: the slowest STEPPER_*_MAX_HZ)
+            wait {bool} -- True iff the calling thread should wait until the move is done (default: {False})
+
+        Returns:
+            Future -- resolves when the move is done, or is cancelled if it is replaced first
+
+        Raises:
+            ValueError -- if the machine has been homed and the target is off of the board
+        """
+        position = self.get_position()
+        target = [p if t is None else int(round(t)) for p, t in zip(position, (x, y, z))]
+        if self._homed:
+            lengths = (defines.BOARD_X_LENGTH, defines.BOARD_Y_LENGTH, defines.BOARD_Z_LENGTH)
+            for name, t, length in zip('xyz', target, lengths):
+                if not 0 <= t <= length:
+                    raise ValueError('{} = {} is outside of the soft limits 0 to {}'.format(name, t, length))
+        deltas = [t - p for p, t in zip(position, target)]
+
+        max_hzs = (defines.STEPPER_X_MAX_HZ, defines.STEPPER_Y_MAX_HZ, defines.STEPPER_Z_MAX_HZ)
+        if feed_rate is None:
+            feed_rate = min(max_hzs)
+        frequency = path_frequency(deltas, feed_rate)
+
+        # Scale the whole move down if any axis would step faster than its limit
+        major = max(abs(d) for d in deltas)
+        for delta, max_hz in zip(deltas, max_hzs):
+            if delta and max_hz > 0 and frequency * abs(delta) / major > max_hz:
+                frequency = max_hz * major / abs(delta)
+
+        accelerations = (defines.STEPPER_X_MAX_ACCEL, defines.STEPPER_Y_MAX_ACCEL, defines.STEPPER_Z_MAX_ACCEL)
+        jerks = (defines.STEPPER_X_MAX_JERK, defines.STEPPER_Y_MAX_JERK, defines.STEPPER_Z_MAX_JERK)
+        moving = [i for i, delta in enumerate(deltas) if delta]
+        acceleration = min((accelerations[i] for i in moving), default=None)
+        jerk = min((jerks[i] for i in moving), default=None)
+
+        return self._interpolator.move([
+            ([self._stepper_x], deltas[0]),
+            ([self._stepper_y], deltas[1]),
+            ([self._stepper_z], deltas[2])
+        ], frequency, wait=wait, acceleration=acceleration, jerk=jerk)
+
+    def move_to_mm(self, x=None, y=None, z=None, feed_rate=None, wait=False):
+        """
+        Move the brush in a straight line to an absolute position in mm. See move_to.
+
+        Keyword Arguments:
+            x {float} -- the x position to move to in mm, or None to stay put (default: {None})
+            y {float} -- the y position to move to in mm, or None to stay put (default: {None})
+            z {float} -- the z position to move to in mm, or None to stay put (default: {None})
+            feed_rate {float} -- the speed along the path in mm/second (default: see move_to)
+            wait {bool} -- True iff the calling thread should wait until the move is done (default: {False})
+
+        Returns:
+            Future -- see move_to
+        """
+        def to_steps(mm):
+            return None if mm is None else geometry.mm_to_steps(mm)
+
+        return self.move_to(to_steps(x), to_steps(y), to_steps(z), feed_rate=to_steps(feed_rate), wait=wait)
+
+    def wait_until_complete(self, timeout=None):
+        """
+        Block until the current coordinated move is done
+
+        Keyword Arguments:
+            timeout {float} -- the most seconds to wait, or None to wait forever (default: {None})
+        """
+        self._interpolator.wait_until_complete(timeout)
+
+    def stop(self):
+        """
+        Stop the coordinated move in progress at once, leaving the machine wherever it is. Safe to call from any
+        thread.
+        """
+        self._interpolator.stop()
+
+    async def move_to_async(self, x=None, y=None, z=None, feed_rate=None):
+        """
+        Make a coordinated move and wait for it from an event loop. See move_to.
+
+        Raises:
+            asyncio.CancelledError -- if the move is replaced before it finishes
+        """
+        await wait_async(self.move_to(x, y, z, feed_rate=feed_rate))
+
+    async def move_to_mm_async(self, x=None, y=None, z=None, feed_rate=None):
+        """
+        Make a coordinated move in mm and wait for it from an event loop. See move_to_mm.
+        """
+        await wait_async(self.move_to_mm(x, y, z, feed_rate=feed_rate))
+
+    async def zeroing_async(self, timeout=defines.HOMING_TIMEOUT):
+        """
+        Zero every axis from an event loop. See zeroing.
         """
-        x_zeroed, y_zeroed, z_zeroed = False, False, False
-        self._stepper_x.set_stepper(defines.STEPPER_X_MAX_HZ / 2, -defines.BOARD_X_LENGTH)
-        self._stepper_y_left.set_stepper(defines.STEPPER_Y_MAX_HZ / 2, -defines.BOARD_Y_LENGTH)
-        self._stepper_y_right.set_stepper(defines.STEPPER_Y_MAX_HZ / 2, -defines.BOARD_Y_LENGTH)
-        self._stepper_z.set_stepper(defines.STEPPER_Z_MAX_HZ / 2, -defines.BOARD_Z_LENGTH)
-
-        while not x_zeroed or not y_zeroed or not z_zeroed:
-            if not x_zeroed and self._switch_reset_x.get_state():
-                self._stepper_x.set_stepper(0, 0)
-                self._stepper_x.zero()
-                x_zeroed = True
-
-            if not y_zeroed and self._switch_reset_y.get_state():
-                self._stepper_y_left.set_stepper(0, 0)
-                self._stepper_y_right.set_stepper(0, 0)
-                self._stepper_y_left.zero()
-                self._stepper_y_right.zero()
-                y_zeroed = True
-
-            if not z_zeroed and self._switch_reset_z.get_state():
-                self._stepper_z.set_stepper(0, 0)
-                self._stepper_z.zero()
-                z_zeroed = True
+        return await running_loop().run_in_executor(None, self.zeroing, timeout)
@@ -0,0 +1,283 @@
+import motion_profile
+import time
+
+from array import array
+
+
+class Waveform():
+    """
+    The pin edges of a move, worked out in advance.
+
+    Edge k happens times[k] seconds after the start and sets every pin in pins to the matching bit of masks[k], where
+    bit n is GPIO.BCM channel n.
+    """
+
+    def __init__(self, pins, initial_mask, times, masks):
+        """
+        Arguments:
+            pins {[int]} -- the GPIO.BCM channels the waveform drives
+            initial_mask {int} -- the pin states before the first edge
+            times {array} -- doubles, the time of each edge in seconds since the start
+            masks {array} -- unsigned 64 bit integers, the pin states after each edge
+        """
+        self.pins = pins
+        self.initial_mask = initial_mask
+        self.times = times
+        self.masks = masks
+
+    def __len__(self):
+        return len(self.times)
+
+    def duration(self):
+        return self.times[-1] if self.times else 0.0
+
+
+class CompiledMove():
+    """
+    A waveform plus where it leaves each motor, so the motors can be updated once it has been played
+    """
+
+    def __init__(self, waveform, motor_steps):
+        """
+        Arguments:
+            waveform {Waveform} -- the edges to play
+            motor_steps {[(StepperMotor, int)]} -- each motor in the move and how many steps it takes
+        """
+        self.waveform = waveform
+        self._motor_steps = motor_steps
+
+    def commit(self):
+        """
+        Update each motor's step cycle and position as though it had taken the move's steps itself
+        """
+        for motor, steps in self._motor_steps:
+            motor._i = (motor._i + steps) % len(motor._sequence)
+            motor._pos += steps
+
+
+def _phase_pin_masks(motor):
+    """
+    Get the pins that are high in each phase of a motor's step cycle
+
+    Returns:
+        [int] -- a bitmask of GPIO.BCM channels for each phase
+    """
+    masks = []
+    for phase in motor._sequence:
+        mask = 0
+        for bit, out in enumerate(motor._outs):
+            if phase & (1 << bit):
+                mask |= 1 << out
+        masks.append(mask)
+    return masks
+
+
+def _tick_times(ticks, frequency, acceleration, jerk):
+    """
+    Get the time of each tick of a move, with the first tick at time 0
+    """
+    if acceleration and acceleration > 0:
+        times = array('d', [0.0])
+        elapsed = 0.0
+        for interval in motion_profile.step_intervals(ticks, frequency, acceleration, jerk):
+            elapsed += interval
+            times.append(elapsed)
+        return times
+    period = 1 / frequency
+    return array('d', (k * period for k in range(ticks)))
+
+
+def compile_move(axes, frequency, acceleration=None, jerk=None):
+    """
+    Compile a straight-line move of one or more axes into a waveform. The axes are interpolated the same way as
+    LinearInterpolator, so a single motor is just a move with one axis.
+
+    Arguments:
+        axes {[([StepperMotor], int)]} -- for each axis, the motors that drive it and the number of steps it should
+            move (negative means reverse)
+        frequency {float} -- the step frequency of the axis that moves the furthest (Hz)
+
+    Keyword Arguments:
+        acceleration {float} -- steps/second^2, or None or <= 0 for a constant frequency (default: {None})
+        jerk {float} -- steps/second^3, or None or <= 0 for trapezoidal acceleration (default: {None})
+
+    Returns:
+        CompiledMove -- the move, ready to be played by a backend
+    """
+    major_steps = max([abs(steps) for _, steps in axes] + [0])
+
+    pins = []
+    motor_steps = []
+    motor_states = []  # [phase pin masks, phase, direction] for each motor
+    axis_states = []  # [motor indexes, steps, error] for each axis
+    initial_mask = 0
+    for motors, steps in axes:
+        indexes = []
+        for motor in motors:
+            pins.extend(motor._outs)
+            phase_masks = _phase_pin_masks(motor)
+            initial_mask |= phase_masks[motor._i]
+            indexes.append(len(motor_states))
+            motor_states.append([phase_masks, motor._i, 1 if steps > 0 else -1])
+            motor_steps.append((motor, steps))
+        axis_states.append([indexes, abs(steps), major_steps // 2])
+
+    masks = array('Q')
+    for _ in range(major_steps):
+        for axis in axis_states:
+            indexes, steps, error = axis
+            error -= steps
+            if error < 0:
+                error += major_steps
+                for index in indexes:
+                    state = motor_states[index]
+                    state[1] = (state[1] + state[2]) % len(state[0])
+            axis[2] = error
+
+        mask = 0
+        for phase_masks, phase, _ in motor_states:
+            mask |= phase_masks[phase]
+        masks.append(mask)
+
+    times = _tick_times(major_steps, frequency, acceleration, jerk) if major_steps else array('d')
+    return CompiledMove(Waveform(pins, initial_mask, times, masks), motor_steps)
+
+
+class LoopBackend():
+    """
+    Play waveforms by writing the pins from Python in a tight loop.
+
+    Each edge is waited for by sleeping until shortly before it is due, then spinning on the clock for the rest, which
+    is much more precise than sleep alone without spinning the whole time.
+    """
+
+    def __init__(self, gpio, spin_time=.001):
+        """
+        Arguments:
+            gpio {module} -- the GPIO module to write the pins with
+
+        Keyword Arguments:
+            spin_time {float} -- how long before each edge to stop sleeping and start spinning, in seconds
+                (default: {.001})
+        """
+        self._gpio = gpio
+        self._spin_time = spin_time
+
+    def play(self, waveform):
+        """
+        Play a waveform, returning once it is done
+        """
+        pins = waveform.pins
+        high, low = self._gpio.HIGH, self._gpio.LOW
+        levels = [[high if mask >> pin & 1 else low for pin in pins] for mask in waveform.masks]
+
+        output = self._gpio.output
+        clock = time.perf_counter
+        sleep = time.sleep
+        spin_time = self._spin_time
+        start = clock()
+        for edge_time, edge_levels in zip(waveform.times, levels):
+            deadline = start + edge_time
+            remaining = deadline - clock()
+            if remaining > spin_time:
+                sleep(remaining - spin_time)
+            while clock() < deadline:
+                pass
+            output(pins, edge_levels)
+
+
+class PigpioWaveBackend():
+    """
+    Play waveforms with pigpio's hardware-timed waves, so the timing does not depend on Python at all.
+
+    The waveform is converted to pulses and sent in chunks of at most max_pulses, since pigpio limits the size of a
+    wave. Each chunk is made while the one before plays, and sent to start the moment that one ends, so there is no
+    gap between them. Two chunks are held at once, so max_pulses is at most half of the pulses pigpio can hold.
+    """
+
+    def __init__(self, pi, max_pulses=5000):
+        """
+        Arguments:
+            pi {pigpio.pi} -- a connection to the pigpio daemon
+
+        Keyword Arguments:
+            max_pulses {int} -- the most pulses to put in one wave (default: {5000})
+        """
+        import pigpio  # only needed on machines that use this backend
+        self._pigpio = pigpio
+        self._pi = pi
+        self._max_pulses = max_pulses
+
+    def pulses(self, waveform):
+        """
+        Convert a waveform to pigpio pulses
+
+        Returns:
+            [pigpio.pulse] -- one pulse per edge, holding until the next edge
+        """
+        pulses = []
+        previous = waveform.initial_mask
+        times = waveform.times
+        for k, mask in enumerate(waveform.masks):
+            delay = times[k + 1] - times[k] if k + 1 < len(times) else 0
+            pulses.append(self._pigpio.pulse(mask & ~previous, previous & ~mask, int(round(delay * 1e6))))
+            previous = mask
+        return pulses
+
+    def play(self, waveform):
+        """
+        Play a waveform, returning once it is done
+        """
+        for pin in waveform.pins:
+            self._pi.set_mode(pin, self._pigpio.OUTPUT)
+
+        pulses = self.pulses(waveform)
+        self._pi.wave_clear()
+        playing = None
+        for start in range(0, len(pulses), self._max_pulses):
+            self._pi.wave_add_generic(pulses[start:start + self._max_pulses])
+            wave_id = self._pi.wave_create()
+            # Starts when the wave playing now ends, or at once if none is
+            self._pi.wave_send_using_mode(wave_id, self._pigpio.WAVE_MODE_ONE_SHOT_SYNC)
+            if playing is not None:
+                while self._pi.wave_tx_at() == playing:
+                    time.sleep(.001)
+                self._pi.wave_delete(playing)
+            playing = wave_id
+        while self._pi.wave_tx_busy():
+            time.sleep(.001)
+        if playing is not None:
+            self._pi.wave_delete(playing)
+
+
+class SimulatedBackend():
+    """
+    Play waveforms instantly, keeping every edge for inspection
+    """
+
+    def __init__(self, gpio=None):
+        """
+        Keyword Arguments:
+            gpio {SimulatedGPIO} -- a simulated GPIO to leave the pins of the last edge on (default: {None})
+        """
+        self._gpio = gpio
+        self.edges = []  # [(time, mask)]
+
+    def play(self, waveform):
+        self.edges.extend(zip(waveform.times, waveform.masks))
+        if self._gpio and len(waveform):
+            mask = waveform.masks[-1]
+            self._gpio.output(waveform.pins, [self._gpio.HIGH if mask >> pin & 1 else self._gpio.LOW
+                                              for pin in waveform.pins])
+
+
+def play(compiled_move, backend):
+    """
+    Play a compiled move and update its motors to match
+
+    Arguments:
+        compiled_move {CompiledMove} -- the move to play
+        backend {LoopBackend or PigpioWaveBackend or SimulatedBackend} -- what to play it with
+    """
+    backend.play(compiled_move.waveform)
+    compiled_move.commit()
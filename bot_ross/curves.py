@@ -0,0 +1,199 @@
+import defines
+import functools
+import geometry
+import math
+
+# How many distinct curve shapes to remember. Brush dabs repeat the same few shapes all over a painting.
+CACHE_SIZE = 1024
+
+_MAX_DEPTH = 16  # how many times a Bezier curve may be split in half
+
+
+def resolution():
+    """
+    Returns:
+        float -- the distance in mm of one motor step, the finest detail the machine can draw
+    """
+    return geometry.steps_to_mm(1)
+
+
+def _effective_tolerance(tolerance):
+    if tolerance is None:
+        tolerance = defines.ARC_TOLERANCE
+    # Anything finer than half a step is rounded away by the motors anyway
+    return max(tolerance, resolution() / 2)
+
+
+def _key(value):
+    # Round away the float noise of subtracting positions, so dabs at different places share their shape
+    return round(value, 6)
+
+
+def arc(start, end, center_offset, clockwise, tolerance=None):
+    """
+    Linearize an arc in the XY plane, like G2 and G3 draw. Z moves evenly along it, making a helix.
+
+    The arc is split into the fewest equal segments whose chords stray no more than tolerance from it, so tight arcs
+    get more segments than wide ones of the same length. An end equal to the start draws a full circle.
+
+    Arguments:
+        start {(float, float, float)} -- where the arc starts, in mm
+        end {(float, float, float)} -- where the arc ends, in mm
+        center_offset {(float, float)} -- the center of the arc in XY, relative to start
+        clockwise {bool} -- True for G2, and False for G3
+
+    Keyword Arguments:
+        tolerance {float} -- the most any segment may stray from the arc in mm (default: {defines.ARC_TOLERANCE})
+
+    Returns:
+        [(float, float, float)] -- the points to move through, not including start, and ending exactly at end
+
+    Raises:
+        ValueError -- if end is not on the circle
+    """
+    offsets = _arc_offsets(_key(end[0] - start[0]), _key(end[1] - start[1]), _key(end[2] - start[2]),
+                           _key(center_offset[0]), _key(center_offset[1]), clockwise, _effective_tolerance(tolerance))
+    return _translate(offsets, start, end)
+
+
+def center_from_radius(start, end, radius, clockwise):
+    """
+    Find the center of an arc given by its radius, like G2 and G3 with R
+
+    Arguments:
+        start {(float, float, float)} -- where the arc starts, in mm
+        end {(float, float, float)} -- where the arc ends, in mm
+        radius {float} -- the radius. A negative radius picks the arc that goes more than half way around.
+        clockwise {bool} -- True for G2, and False for G3
+
+    Returns:
+        (float, float) -- the center of the arc in XY, relative to start
+
+    Raises:
+        ValueError -- if the ends are too far apart for the radius, or are the same point
+    """
+    dx, dy = end[0] - start[0], end[1] - start[1]
+    chord = math.hypot(dx, dy)
+    if chord == 0:
+        raise ValueError('an arc given by its radius can not end where it starts')
+    if chord > 2 * abs(radius) + 1e-9:
+        raise ValueError('the arc ends are {:.4f} mm apart, which is too far for a radius of {}'.format(chord, radius))
+    height = math.sqrt(max(0.0, radius * radius - chord * chord / 4))
+    # The center of a short counterclockwise arc is on the left of the chord
+    side = 1 if clockwise == (radius < 0) else -1
+    return dx / 2 - side * height * dy / chord, dy / 2 + side * height * dx / chord
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def _arc_offsets(dx, dy, dz, i, j, clockwise, tolerance):
+    """
+    Linearize an arc that starts at the origin. See arc.
+    """
+    radius = math.hypot(i, j)
+    end_radius = math.hypot(dx - i, dy - j)
+    if radius == 0 or abs(end_radius - radius) > max(.05, radius * 1e-3):
+        raise ValueError('the arc ends {:.4f} mm and {:.4f} mm from its center, which should be the same'.format(
+            radius, end_radius))
+
+    start_angle = math.atan2(-j, -i)
+    sweep = math.atan2(dy - j, dx - i) - start_angle
+    if clockwise:
+        sweep = -((-sweep) % (2 * math.pi) or 2 * math.pi)
+    else:
+        sweep = sweep % (2 * math.pi) or 2 * math.pi
+
+    # The sagitta of a chord spanning angle a is radius * (1 - cos(a / 2)), so this is the widest angle within
+    # tolerance, widened if its chord would be shorter than a step
+    if tolerance >= radius:
+        step = math.pi / 2
+    else:
+        step = 2 * math.acos(1 - tolerance / radius)
+    step = max(step, 2 * math.asin(min(1.0, resolution() / (2 * radius))))
+    count = max(1, int(math.ceil(abs(sweep) / step - 1e-9)))
+
+    points = []
+    for k in range(1, count):
+        angle = start_angle + sweep * k / count
+        points.append((i + radius * math.cos(angle), j + radius * math.sin(angle), dz * k / count))
+    return tuple(points)
+
+
+def bezier(start, control1, control2, end, tolerance=None):
+    """
+    Linearize a cubic Bezier curve in the XY plane, like G5 draws. Z moves evenly along it.
+
+    The curve is split in half until each piece is flat to within tolerance, so straight stretches get one segment
+    however long they are, and tight bends get many.
+
+    Arguments:
+        start {(float, float, float)} -- where the curve starts, in mm
+        control1 {(float, float)} -- the first control point in XY
+        control2 {(float, float)} -- the second control point in XY
+        end {(float, float, float)} -- where the curve ends, in mm
+
+    Keyword Arguments:
+        tolerance {float} -- the most any segment may stray from the curve in mm (default: {defines.ARC_TOLERANCE})
+
+    Returns:
+        [(float, float, float)] -- the points to move through, not including start, and ending exactly at end
+    """
+    offsets = _bezier_offsets(_key(control1[0] - start[0]), _key(control1[1] - start[1]),
+                              _key(control2[0] - start[0]), _key(control2[1] - start[1]),
+                              _key(end[0] - start[0]), _key(end[1] - start[1]), _key(end[2] - start[2]),
+                              _effective_tolerance(tolerance))
+    return _translate(offsets, start, end)
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def _bezier_offsets(x1, y1, x2, y2, x3, y3, dz, tolerance):
+    """
+    Linearize a Bezier curve that starts at the origin. See bezier.
+    """
+    points = []
+    minimum = resolution()
+    # Depth first, second halves pushed first, so the points come off in order. Each entry is the control points
+    # of a piece and the range of t it covers.
+    stack = [((0.0, 0.0), (x1, y1), (x2, y2), (x3, y3), 0.0, 1.0, 0)]
+    while stack:
+        p0, p1, p2, p3, t0, t1, depth = stack.pop()
+        # A piece is too small to split once its control points are all close to its start. Its chord alone is not
+        # enough, since a closed loop's chord is zero however big the loop is.
+        size = max(math.hypot(p[0] - p0[0], p[1] - p0[1]) for p in (p1, p2, p3))
+        if depth >= _MAX_DEPTH or size < minimum or \
+                max(_distance_to_line(p1, p0, p3), _distance_to_line(p2, p0, p3)) <= tolerance:
+            points.append((p3[0], p3[1], dz * t1))
+            continue
+        # de Casteljau's algorithm at t = .5
+        p01, p12, p23 = _midpoint(p0, p1), _midpoint(p1, p2), _midpoint(p2, p3)
+        p012, p123 = _midpoint(p01, p12), _midpoint(p12, p23)
+        middle = _midpoint(p012, p123)
+        t = (t0 + t1) / 2
+        stack.append((middle, p123, p23, p3, t, t1, depth + 1))
+        stack.append((p0, p01, p012, middle, t0, t, depth + 1))
+    return tuple(points[:-1])
+
+
+def _midpoint(a, b):
+    return (a[0] + b[0]) / 2, (a[1] + b[1]) / 2
+
+
+def _distance_to_line(point, start, end):
+    dx, dy = end[0] - start[0], end[1] - start[1]
+    length = math.hypot(dx, dy)
+    if length == 0:
+        return math.hypot(point[0] - start[0], point[1] - start[1])
+    return abs(dx * (point[1] - start[1]) - dy * (point[0] - start[0])) / length
+
+
+def _translate(offsets, start, end):
+    points = [(start[0] + x, start[1] + y, start[2] + z) for x, y, z in offsets]
+    points.append(tuple(end))
+    return points
+
+
+def cache_info():
+    """
+    Returns:
+        {str: functools._CacheInfo} -- the hits, misses and sizes of the arc and Bezier caches
+    """
+    return {'arc': _arc_offsets.cache_info(), 'bezier': _bezier_offsets.cache_info()}
@@ -3,6 +3,11 @@ BOARD_X_LENGTH = -1
 BOARD_Y_LENGTH = -1
 BOARD_Z_LENGTH = -1
 
+#  GPIO backend: 'rpi' for RPi.GPIO, 'gpiochip' for the Linux GPIO character device, or 'simulated'
+#  The BOT_ROSS_GPIO environment variable overrides this
+GPIO_BACKEND = 'rpi'
+GPIO_CHIP = '/dev/gpiochip0'
+
 #  Stepper motor out-channel declarations
 #  In GPIO.BCM layout (not GPIO.BOARD)
 STEPPER_X_1 = 6
@@ -20,6 +25,9 @@ STEPPER_Y_RIGHT_2 = -1
 STEPPER_Y_RIGHT_3 = -1
 STEPPER_Y_RIGHT_4 = -1
 
+#  Steps to move the right side of the Y gantry on its own after homing, to square it with the left
+STEPPER_Y_RIGHT_HOME_OFFSET = 0
+
 STEPPER_Z_1 = 25
 STEPPER_Z_2 = 16
 STEPPER_Z_3 = 20
@@ -30,6 +38,22 @@ STEPPER_X_MAX_HZ = -1.0
 STEPPER_Y_MAX_HZ = -1.0  # Two y motors conditions are doubled
 STEPPER_Z_MAX_HZ = -1.0  # The rest of these bad boys, PRESUMABLY have different torques
 
+#  Acceleration (steps/second^2) and jerk (steps/second^3) for ramping up to and down from the max speeds
+#  An acceleration <= 0 disables ramping, and a jerk <= 0 ramps trapezoidally instead of with an S-curve
+STEPPER_X_MAX_ACCEL = -1.0
+STEPPER_Y_MAX_ACCEL = -1.0
+STEPPER_Z_MAX_ACCEL = -1.0
+STEPPER_X_MAX_JERK = -1.0
+STEPPER_Y_MAX_JERK = -1.0
+STEPPER_Z_MAX_JERK = -1.0
+
+#  Homing: a fast approach to each switch, a back-off, then a slow re-approach so home is found at the same place
+#  The speeds are fractions of STEPPER_*_MAX_HZ, and the timeout is in seconds per axis
+HOMING_FAST_FRACTION = 1.0
+HOMING_SLOW_FRACTION = 0.1
+HOMING_BACKOFF_STEPS = 40
+HOMING_TIMEOUT = 120.0
+
 #  Servo motor address declarations
 
 
@@ -39,3 +63,25 @@ STEPPER_Z_MAX_HZ = -1.0  # The rest of these bad boys, PRESUMABLY have different
 SWITCH_RESET_X = -1
 SWITCH_RESET_Y = -1
 SWITCH_RESET_Z = -1
+
+#  Toolpath optimization: the brush's width in mm, for deciding when strokes of different colors overlap, the height in
+#  mm to lift the brush to between strokes (None to travel straight to the next stroke), the seconds a tool change
+#  takes, and the most seconds to spend improving the stroke order
+BRUSH_WIDTH = 5.0
+TRAVEL_Z = 0.0
+TOOL_CHANGE_TIME = 10.0
+OPTIMIZER_TIME_BUDGET = 2.0
+
+#  Polyline simplification: how far in mm a merged move may stray from the moves it replaces
+SIMPLIFY_TOLERANCE = 0.05
+
+#  Curves: how far in mm the straight segments G2, G3 and G5 curves are drawn with may stray from the curve
+ARC_TOLERANCE = 0.02
+
+#  Painting: the height in mm the brush touches the canvas at, and the speed in mm/second it paints at
+PAINT_Z = 5.0
+PAINT_FEED_RATE = 20.0
+
+#  Jogging: the longest in seconds a jog move sent by JogSender may take, so the machine stops this soon after the
+#  stick is released and starts on a new command at most this late
+JOG_MAX_LATENCY = 0.25
@@ -0,0 +1,124 @@
+from concurrent.futures import Future
+from move_futures import finished_future
+from stepper_motor import HALF_STEP_SEQUENCE, StepperMotor, phase_levels
+
+
+def ganged_sequence(sequence, phases):
+    """
+    Combine the step cycles of several motors into one cycle over all of their pins
+
+    Arguments:
+        sequence {(int)} -- the pin bitmask of each phase of one motor's step cycle
+        phases {[int]} -- how many phases ahead of the combined cycle each motor is
+
+    Returns:
+        (int) -- for each phase, a bitmask where bits 0 to 3 are the first motor's pins, bits 4 to 7 the second's, and
+            so on
+    """
+    count = len(sequence)
+    return tuple(
+        sum(sequence[(i + phase) % count] << (4 * side) for side, phase in enumerate(phases)) for i in range(count)
+    )
+
+
+class GangedStepperMotor(StepperMotor):
+    """
+    Several stepper motors driving one axis together, like the two sides of the Y gantry.
+
+    The sides step as one motor, with one scheduler callback and one GPIO write of all of their pins per step, so they
+    can not drift apart. Each side can still be moved on its own with correct, to square the axis after homing.
+    Anything that works with a StepperMotor's pins and step cycle, like compile_move, sees every side's pins at once.
+    """
+
+    def __init__(self, outs, sequence=HALF_STEP_SEQUENCE, home_offsets=None, **kwargs):
+        """
+        Arguments:
+            outs {[(int, int, int, int)]} -- the out1 through out4 GPIO.BCM channels of each side
+
+        Keyword Arguments:
+            sequence {(int)} -- the pin bitmask for each phase of one side's step cycle (default: {HALF_STEP_SEQUENCE})
+            home_offsets {(int)} -- how many steps to move each side on its own after homing, to square the axis
+                (default: no correction)
+
+        The other keyword arguments are the same as StepperMotor's.
+        """
+        self._sides = [tuple(side) for side in outs]
+        self._side_sequence = sequence
+        self._side_phases = [0] * len(self._sides)
+        self.home_offsets = tuple(home_offsets or (0,) * len(self._sides))
+        super().__init__(*self._sides[0], sequence=sequence, **kwargs)
+
+        self._outs = tuple(out for side in self._sides for out in side)
+        for out in self._outs[4:]:
+            self._gpio.setup(out, self._gpio.OUT)
+        self._update_sequence()
+
+    def side_outs(self, side):
+        """
+        Returns:
+            (int, int, int, int) -- the out1 through out4 channels of one side
+        """
+        return self._sides[side]
+
+    def side_phase(self, side):
+        """
+        Returns:
+            int -- where one side is in its own step cycle
+        """
+        return (self._i + self._side_phases[side]) % len(self._side_sequence)
+
+    def correct(self, steps, frequency):
+        """
+        Move some sides on their own without changing the axis's position, for example to square a gantry
+
+        Arguments:
+            steps {(int)} -- how many steps to move each side. Negative means reverse.
+            frequency {float} -- how fast to step the sides (Hz)
+
+        Returns:
+            Future -- resolves to the axis's position when the sides have moved, or is cancelled if a move replaces
+                the correction first
+
+        Raises:
+            RuntimeError -- if the axis is moving
+        """
+        if not self._is_complete:
+            raise RuntimeError('can not correct the sides of an axis while it is moving')
+        remaining = list(steps)
+        if not any(remaining):
+            return finished_future(self._pos)
+
+        period = 1 / frequency
+
+        def correct_step(deadline):
+            for side, count in enumerate(remaining):
+                if count:
+                    direction = 1 if count > 0 else -1
+                    self._side_phases[side] += direction
+                    remaining[side] -= direction
+            self._update_sequence()
+            self._gpio.output(self._outs, self._phase_levels[self._i])
+            self._last_update_time = self._scheduler.now()
+            if self._telemetry is not None:
+                self._telemetry.record(deadline, self._last_update_time)
+            if any(remaining):
+                return deadline + period
+
+            self._is_complete = True
+            if not self._move_future.done():
+                self._move_future.set_result(self._pos)
+            return None
+
+        self._is_complete = False
+        self._move_future = Future()
+        first_deadline = max(self._scheduler.now(), self._last_update_time + period)
+        self._scheduled_step = self._scheduler.schedule(correct_step, first_deadline,
+                                                        future=self._move_future)
+        return self._move_future
+
+    def _update_sequence(self):
+        """
+        Rebuild the combined step cycle after a side has moved on its own
+        """
+        self._sequence = ganged_sequence(self._side_sequence, self._side_phases)
+        self._phase_levels = phase_levels(self._sequence, self._gpio, pins=len(self._outs))
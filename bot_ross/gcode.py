@@ -0,0 +1,538 @@
+import argparse
+import curves
+import geometry
+import logging
+import queue
+import re
+import threading
+
+from collections import namedtuple
+from homing import HomingError
+
+logger = logging.getLogger(__name__)
+
+
+class GcodeError(ValueError):
+    pass
+
+
+def _error(line_number, message):
+    if line_number is None:
+        return GcodeError(message)
+    return GcodeError('line {}: {}'.format(line_number, message))
+
+
+# One parsed line: the command letter and number (like G and 1 for G1) and its parameters, like {'X': 1.0}
+GcodeCommand = namedtuple('GcodeCommand', ['line_number', 'letter', 'number', 'params'])
+
+# What a command asks the machine to do once the modal state has been applied. Positions are absolute, in mm, with
+# None for an axis that does not move, and feed rates are in mm/second, or None for as fast as the machine can go.
+Move = namedtuple('Move', ['line_number', 'x', 'y', 'z', 'feed_rate'])
+Home = namedtuple('Home', ['line_number'])
+ToolChange = namedtuple('ToolChange', ['line_number', 'tool'])
+PlaySound = namedtuple('PlaySound', ['line_number', 'sound_id'])
+
+
+def read_lines(path):
+    """
+    Read a G-code file one line at a time, without reading the whole file in
+
+    Arguments:
+        path {str} -- the file to read
+
+    Yields:
+        str -- each line, without its line ending
+    """
+    with open(path) as f:
+        for line in f:
+            yield line.rstrip('\r\n')
+
+
+def parse_line(line, line_number=None):
+    """
+    Parse a line of G-code
+
+    Arguments:
+        line {str} -- the line, like 'G1 X10 Y-2.5 F600 ; comment'
+
+    Keyword Arguments:
+        line_number {int} -- the line's number in its file, for error messages (default: {None})
+
+    Returns:
+        GcodeCommand -- the command, or None if the line is blank or only a comment
+
+    Raises:
+        GcodeError -- if the line can not be parsed
+    """
+    # Drop ; comments and (parenthesized) comments
+    line = line.split(';', 1)[0]
+    while '(' in line:
+        start = line.index('(')
+        end = line.find(')', start)
+        if end < 0:
+            raise _error(line_number, 'unclosed comment')
+        line = line[:start] + ' ' + line[end + 1:]
+
+    words = _words(line.upper(), line_number)
+    if not words:
+        return None
+    letter, number = words[0]
+    if letter == 'N':  # a line number
+        words = words[1:]
+        if not words:
+            return None
+        letter, number = words[0]
+    if letter not in 'GMT':
+        raise _error(line_number, 'expected a G, M, or T command but got {}'.format(letter))
+    return GcodeCommand(line_number, letter, int(number), dict(words[1:]))
+
+
+# An exponent after the digits of a number, with its sign if it has one
+_EXPONENT = re.compile(r'E([+-])?\d+')
+
+
+def _words(line, line_number):
+    """
+    Split a line into (letter, number) words. Spaces between words are optional, like 'G1X10Y20'.
+    """
+    words = []
+    i = 0
+    length = len(line)
+    while i < length:
+        letter = line[i]
+        if letter.isspace():
+            i += 1
+            continue
+        if not letter.isalpha():
+            raise _error(line_number, 'expected a letter at {!r}'.format(line[i:]))
+        start = i = i + 1
+        while i < length and (line[i].isdigit() or line[i] in '+-.'):
+            i += 1
+        exponent = _EXPONENT.match(line, i)
+        if exponent and i > start and line[i - 1].isdigit():
+            # Python writes small and large floats like 6.7e-05, so a signed exponent is part of the number. An
+            # unsigned one is only when it ends a word set off by spaces, since 'X1E5' run together is an E word.
+            end = exponent.end()
+            spaced = (start == 1 or line[start - 2].isspace()) and (end == length or line[end].isspace())
+            if exponent.group(1) or spaced:
+                i = end
+        try:
+            words.append((letter, float(line[start:i])))
+        except ValueError:
+            raise _error(line_number, 'bad number for {} at {!r}'.format(letter, line[start - 1:]))
+    return words
+
+
+def parse(lines):
+    """
+    Parse lines of G-code lazily
+
+    Arguments:
+        lines {iterable of str} -- the lines
+
+    Yields:
+        GcodeCommand -- each command, skipping blank and comment lines
+    """
+    for line_number, line in enumerate(lines, 1):
+        command = parse_line(line, line_number)
+        if command is not None:
+            yield command
+
+
+class Planner():
+    """
+    Turns commands into actions by applying G-code's modal state: absolute or relative positioning, inches or mm, and
+    the last feed rate. Curves (G2/G3 arcs and G5 cubic Bezier curves, in the XY plane) become straight moves.
+    """
+
+    def __init__(self, position=(0.0, 0.0, 0.0), tolerance=None):
+        """
+        Keyword Arguments:
+            position {(float, float, float)} -- where the machine is, in mm (default: {(0.0, 0.0, 0.0)})
+            tolerance {float} -- the most the straight moves of a curve may stray from it in mm
+                (default: {defines.ARC_TOLERANCE})
+        """
+        self.position = list(position)
+        self.tolerance = tolerance
+        self.absolute = True
+        self.scale = 1.0  # mm per G-code unit
+        self.feed_rate = None  # mm/second
+
+    def plan(self, commands):
+        """
+        Plan commands lazily
+
+        Arguments:
+            commands {iterable of GcodeCommand} -- the commands
+
+        Yields:
+            Move or Home or ToolChange or PlaySound -- each action, skipping commands that only change the state
+        """
+        for command in commands:
+            yield from self.plan_command(command)
+
+    def plan_command(self, command):
+        """
+        Apply one command to the state
+
+        Arguments:
+            command {GcodeCommand} -- the command
+
+        Returns:
+            [Move or Home or ToolChange or PlaySound] -- the actions to take, which is empty if there is nothing to do,
+                and has many moves for a curve
+
+        Raises:
+            GcodeError -- if the command is not supported
+        """
+        letter, number, params = command.letter, command.number, command.params
+        if letter == 'G' and number in (0, 1):
+            return [self._plan_move(command, rapid=number == 0)]
+        if letter == 'G' and number in (2, 3):
+            return self._plan_arc(command, clockwise=number == 2)
+        if letter == 'G' and number == 5:
+            return self._plan_bezier(command)
+        if letter == 'G' and number == 28:
+            self.position = [0.0, 0.0, 0.0]
+            return [Home(command.line_number)]
+        if letter == 'G' and number in (90, 91):
+            self.absolute = number == 90
+            return []
+        if letter == 'G' and number in (20, 21):
+            self.scale = geometry.mm_per_inch if number == 20 else 1.0
+            return []
+        if letter == 'T':
+            return [ToolChange(command.line_number, number)]
+        if letter == 'M' and number == 72:
+            return [PlaySound(command.line_number, int(params.get('P', 0)))]
+        raise _error(command.line_number, 'unsupported command {}{}'.format(letter, number))
+
+    def _plan_feed_rate(self, command):
+        params = command.params
+        if 'F' in params:
+            if params['F'] <= 0:
+                raise _error(command.line_number, 'feed rate must be positive')
+            self.feed_rate = params['F'] * self.scale / 60  # from units/minute
+
+    def _plan_move(self, command, rapid):
+        self._plan_feed_rate(command)
+        target = []
+        for i, axis in enumerate('XYZ'):
+            if axis not in command.params:
+                target.append(None)
+                continue
+            value = command.params[axis] * self.scale
+            self.position[i] = value if self.absolute else self.position[i] + value
+            target.append(self.position[i])
+        return Move(command.line_number, target[0], target[1], target[2], None if rapid else self.feed_rate)
+
+    def _plan_curve_end(self, command):
+        """
+        Find where a curve starts and ends, and move the position to its end
+        """
+        self._plan_feed_rate(command)
+        start = tuple(self.position)
+        for i, axis in enumerate('XYZ'):
+            if axis in command.params:
+                value = command.params[axis] * self.scale
+                self.position[i] = value if self.absolute else self.position[i] + value
+        return start, tuple(self.position)
+
+    def _plan_arc(self, command, clockwise):
+        params = command.params
+        start, end = self._plan_curve_end(command)
+        try:
+            if 'R' in params:
+                center = curves.center_from_radius(start, end, params['R'] * self.scale, clockwise)
+            elif 'I' in params or 'J' in params:
+                center = (params.get('I', 0) * self.scale, params.get('J', 0) * self.scale)
+            else:
+                raise ValueError('an arc needs a center (I and J) or a radius (R)')
+            points = curves.arc(start, end, center, clockwise, self.tolerance)
+        except ValueError as e:
+            raise _error(command.line_number, str(e))
+        return self._curve_moves(command, points)
+
+    def _plan_bezier(self, command):
+        params = command.params
+        start, end = self._plan_curve_end(command)
+        # Like RepRap's G5: I and J are the first control point relative to the start, and P and Q are the second
+        # relative to the end
+        control1 = (start[0] + params.get('I', 0) * self.scale, start[1] + params.get('J', 0) * self.scale)
+        control2 = (end[0] + params.get('P', 0) * self.scale, end[1] + params.get('Q', 0) * self.scale)
+        return self._curve_moves(command, curves.bezier(start, control1, control2, end, self.tolerance))
+
+    def _curve_moves(self, command, points):
+        return [Move(command.line_number, x, y, z, self.feed_rate) for x, y, z in points]
+
+
+def format_actions(actions):
+    """
+    Write planned actions back out as G-code, in absolute mm, so Planner.plan turns it back into the same actions
+
+    Arguments:
+        actions {iterable of Move or Home or ToolChange or PlaySound} -- the actions
+
+    Yields:
+        str -- each line
+    """
+    yield 'G21'
+    yield 'G90'
+    for action in actions:
+        if isinstance(action, Move):
+            words = ['G0' if action.feed_rate is None else 'G1']
+            for axis, value in zip('XYZ', (action.x, action.y, action.z)):
+                if value is not None:
+                    words.append(axis + _format_number(value))
+            if action.feed_rate is not None:
+                words.append('F' + _format_number(action.feed_rate * 60))  # to mm/minute
+            yield ' '.join(words)
+        elif isinstance(action, Home):
+            yield 'G28'
+        elif isinstance(action, ToolChange):
+            yield 'T{}'.format(action.tool)
+        elif isinstance(action, PlaySound):
+            yield 'M72 P{}'.format(action.sound_id)
+
+
+def _format_number(value):
+    text = '{:.4f}'.format(value).rstrip('0').rstrip('.')
+    return '0' if text == '-0' else text
+
+
+_DONE = object()
+
+
+def prefetch(iterable, size):
+    """
+    Run an iterator ahead on another thread, keeping up to size items ready
+
+    This lets reading and parsing a file overlap with the machine moving, without ever holding more than size items
+    in memory. An exception in the iterator is raised from this generator when it is reached. Closing this generator
+    waits for the other thread to stop, so nothing is taken from the iterator once it returns.
+
+    Arguments:
+        iterable {iterable} -- the items
+        size {int} -- the most items to hold at once
+
+    Yields:
+        the items of iterable, in order
+    """
+    items = queue.Queue(size)
+    stop = threading.Event()
+
+    def put(entry):
+        # Give up if the consumer stops early, rather than blocking on a full queue forever
+        while not stop.is_set():
+            try:
+                items.put(entry, timeout=.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put((item, None)):
+                    return
+        except Exception as e:
+            put((_DONE, e))
+        else:
+            put((_DONE, None))
+
+    producer = threading.Thread(target=produce, name='G-code prefetch', daemon=True)
+    producer.start()
+    try:
+        while True:
+            item, error = items.get()
+            if error is not None:
+                raise error
+            if item is _DONE:
+                return
+            yield item
+    finally:
+        stop.set()
+        producer.join()
+
+
+class GcodeExecutor():
+    """
+    Runs G-code on a BrushCNC without any other G-code library.
+
+    Jobs go through a lazy pipeline of generators: read_lines, parse, Planner.plan, and then execute, with prefetch
+    between planning and executing so the file is read ahead of the machine by a bounded number of actions. Memory
+    use is the same no matter how long the job is.
+
+    Supported commands: G0/G1 moves (E is ignored, since the brush has no extruder), G2/G3 arcs, G5 Bezier curves,
+    G20/G21 units, G28 home, G90/G91 absolute/relative positioning, T tool changes and M72 sounds. Tool changes and
+    sounds are passed to callbacks.
+    """
+
+    def __init__(self, cnc, tool_callback=None, sound_callback=None, buffer_size=64):
+        """
+        Arguments:
+            cnc {BrushCNC} -- the machine to run the G-code on
+
+        Keyword Arguments:
+            tool_callback {function} -- called with the tool number for T commands (default: {None})
+            sound_callback {function} -- called with the P number for M72 commands (default: {None})
+            buffer_size {int} -- how many planned actions run_file reads ahead of the machine (default: {64})
+        """
+        self._cnc = cnc
+        self._tool_callback = tool_callback
+        self._sound_callback = sound_callback
+        self._buffer_size = buffer_size
+        self.tool = 0
+        self.planner = Planner(tuple(geometry.steps_to_mm(p) for p in cnc.get_position()))
+        self._stopped = False
+
+    def run_file(self, path):
+        """
+        Run a G-code file, blocking until it is done
+
+        Arguments:
+            path {str} -- the file
+
+        Raises:
+            GcodeError -- if a line can not be parsed or run. The lines before it have already run.
+        """
+        self.run(read_lines(path))
+
+    def run(self, lines):
+        """
+        Run lines of G-code, blocking until they are done
+
+        Arguments:
+            lines {iterable of str} -- the lines, which are read lazily
+
+        Raises:
+            GcodeError -- if a line can not be parsed or run
+        """
+        self.run_commands(parse(lines))
+
+    def run_commands(self, commands):
+        """
+        Run parsed commands, blocking until they are done
+
+        Arguments:
+            commands {iterable of GcodeCommand} -- the commands, for example from parse or a GcodeTable
+
+        Raises:
+            GcodeError -- if a command can not be run
+        """
+        self.run_actions(self.planner.plan(commands))
+
+    def run_actions(self, actions):
+        """
+        Run planned actions, blocking until they are done
+
+        Arguments:
+            actions {iterable of Move or Home or ToolChange or PlaySound} -- the actions, for example from
+                self.planner.plan, which are read ahead of the machine by up to buffer_size actions
+
+        Raises:
+            GcodeError -- if an action can not be run
+        """
+        self._stopped = False
+        actions = prefetch(actions, self._buffer_size)
+        try:
+            for action in actions:
+                self.execute(action)
+        finally:
+            # The planner runs ahead of the machine on the prefetch thread, so stop it before planning the next job
+            # from where the machine really is
+            actions.close()
+            self._resync()
+
+    def do_line(self, line):
+        """
+        Run one line of G-code, like PyCNC's cnc.main.do_line. Suitable as the callback of XboxToGcode.
+
+        Arguments:
+            line {str} -- the line
+
+        Returns:
+            bool -- True iff the line ran
+        """
+        self._stopped = False
+        try:
+            command = parse_line(line)
+            for action in self.planner.plan_command(command) if command else []:
+                self.execute(action)
+        except GcodeError as e:
+            logger.error('%s: %s', line, e)
+            # A refused move never happened, so plan the next one from where the machine really is
+            self._resync()
+            return False
+        return True
+
+    def stop(self):
+        """
+        Stop the machine at once, from any thread. The line or job running fails, and the next one is planned from
+        wherever the machine stopped. Suitable as the kill_callback of XboxToGcode, JogSender or GcodeServer.
+        """
+        self._stopped = True
+        self._cnc.stop()
+
+    def _resync(self):
+        self.planner.position = [geometry.steps_to_mm(p) for p in self._cnc.get_position()]
+
+    def execute(self, action):
+        """
+        Make the machine do a planned action, blocking until it is done
+
+        Arguments:
+            action {Move or Home or ToolChange or PlaySound} -- the action
+
+        Raises:
+            GcodeError -- if the machine refuses the action, fails to home, or is stopped
+        """
+        if self._stopped:
+            raise _error(action.line_number, 'stopped')
+        if isinstance(action, Move):
+            try:
+                self._cnc.move_to_mm(action.x, action.y, action.z, feed_rate=action.feed_rate, wait=True)
+            except ValueError as e:
+                # A refused move never happened, so the planner's position is ahead of the machine
+                self._resync()
+                raise _error(action.line_number, str(e))
+            if self._stopped:
+                self._resync()
+                raise _error(action.line_number, 'stopped partway')
+        elif isinstance(action, Home):
+            try:
+                self._cnc.zeroing()
+            except HomingError as e:
+                # Homing gave up partway, so the planner's position is stale too
+                self._resync()
+                raise _error(action.line_number, str(e))
+        elif isinstance(action, ToolChange):
+            self.tool = action.tool
+            if self._tool_callback:
+                self._tool_callback(action.tool)
+        elif isinstance(action, PlaySound):
+            if self._sound_callback:
+                self._sound_callback(action.sound_id)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='paint a G-code file with BrushCNC')
+    parser.add_argument('path', help='the G-code file')
+    parser.add_argument('--no-home', action='store_true', help='start from where the machine is instead of homing')
+    parser.add_argument('--simplify', type=float, metavar='TOLERANCE',
+                        help='merge nearly collinear moves that stray less than this many mm')
+    args = parser.parse_args()
+
+    from brush_cnc import BrushCNC
+    from polyline_simplifier import PolylineSimplifier
+
+    cnc = BrushCNC()
+    if not args.no_home:
+        cnc.zeroing()
+    executor = GcodeExecutor(cnc)
+    if args.simplify is None:
+        executor.run_file(args.path)
+    else:
+        simplifier = PolylineSimplifier(args.simplify, executor.planner.position)
+        executor.run_actions(simplifier.simplify(executor.planner.plan(parse(read_lines(args.path)))))
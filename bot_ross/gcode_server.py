@@ -0,0 +1,206 @@
+import argparse
+import asyncio
+import logging
+
+from concurrent.futures import ThreadPoolExecutor
+from move_futures import running_loop
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PORT = 7272
+
+# An observer whose socket has more than this many bytes waiting to be sent is too slow, and is disconnected rather
+# than letting the buffer grow
+_MAX_OBSERVER_BACKLOG = 1 << 20
+
+# The G-code for an emergency stop, which skips the queue
+_KILL = 'M112'
+
+
+class GcodeServer():
+    """
+    Streams G-code from clients on a TCP or Unix socket to a callback, with the same contract as XboxToGcode's: it
+    takes a line, returns True iff it succeeded, and may block while the machine moves.
+
+    Clients send lines ending in newlines. The first client to send a line while nobody is in control takes control
+    until it disconnects, and the others are read-only observers. Lines from the controller wait in a queue of
+    queue_size lines for the machine, and each one is answered at once with:
+
+        ok -- it was queued
+        busy -- the queue is full, so it was dropped. Send it again after a line is done.
+
+    Lines from observers are answered with 'error: observer'. Blank lines are ignored. Every client is told
+    'done <line>' or 'failed <line>' as each line finishes, and 'dropped <line>' for each queued line cleared without
+    running. A failed line clears the queue, since the lines after it expected it to run. M112 clears the queue and
+    calls the kill callback at once, without waiting for the line the machine is running. Without a kill callback,
+    M112 is answered 'error: no kill' and changes nothing. Lines already queued keep running after the controller
+    disconnects.
+    """
+
+    def __init__(self, callback, kill_callback=None, queue_size=16):
+        """
+        Arguments:
+            callback {function} -- takes a line of G-code and returns True iff it succeeded, like
+                GcodeExecutor.do_line or PyCNC's cnc.main.do_line. It is called from one thread at a time.
+
+        Keyword Arguments:
+            kill_callback {function} -- stops the machine at once, for M112, like GcodeExecutor.stop
+                (default: {None})
+            queue_size {int} -- the most lines to queue for the machine before answering busy (default: {16})
+        """
+        self._callback = callback
+        self._kill_callback = kill_callback
+        self._queue_size = queue_size
+        self._executor = ThreadPoolExecutor(1)
+        self._queue = None
+        self._server = None
+        self._worker = None
+        self._clients = set()  # of StreamWriter
+        self._handlers = set()  # of Future, done when a client's handler returns
+        self._controller = None
+
+    async def start(self, host='127.0.0.1', port=DEFAULT_PORT, path=None):
+        """
+        Start serving
+
+        Keyword Arguments:
+            host {str} -- the address to listen on (default: {'127.0.0.1'})
+            port {int} -- the TCP port to listen on, or 0 for any free port (default: {DEFAULT_PORT})
+            path {str} -- a Unix socket to listen on instead of TCP (default: {None})
+        """
+        self._queue = asyncio.Queue(self._queue_size)
+        self._worker = asyncio.ensure_future(self._run())
+        if path is None:
+            self._server = await asyncio.start_server(self._handle, host, port)
+        else:
+            self._server = await asyncio.start_unix_server(self._handle, path)
+
+    @property
+    def address(self):
+        """
+        Returns:
+            the address the server listens on, like ('127.0.0.1', 7272) or a socket path
+        """
+        return self._server.sockets[0].getsockname()
+
+    @property
+    def depth(self):
+        """
+        Returns:
+            int -- how many lines are waiting for the machine
+        """
+        return self._queue.qsize()
+
+    async def close(self):
+        """
+        Stop serving and disconnect every client. The line the machine is running is left to finish.
+        """
+        self._server.close()
+        await self._server.wait_closed()
+        self._worker.cancel()
+        for writer in list(self._clients):
+            writer.close()
+        if self._handlers:
+            await asyncio.wait(list(self._handlers), timeout=1)
+        self._executor.shutdown(wait=False)
+
+    async def _handle(self, reader, writer):
+        handled = running_loop().create_future()
+        self._handlers.add(handled)
+        self._clients.add(writer)
+        try:
+            while True:
+                data = await reader.readline()
+                if not data:
+                    break
+                line = data.decode('utf-8', 'replace').strip()
+                if not line:
+                    continue
+                if self._controller is None:
+                    self._controller = writer
+                writer.write(self._accept(line, writer).encode('utf-8') + b'\n')
+                await writer.drain()
+        except (ConnectionError, ValueError) as e:  # ValueError for a line longer than the reader's limit
+            logger.warning('dropping client: %s', e)
+        finally:
+            self._clients.discard(writer)
+            if self._controller is writer:
+                self._controller = None
+            writer.close()
+            self._handlers.discard(handled)
+            handled.set_result(None)
+
+    def _accept(self, line, writer):
+        """
+        Returns:
+            str -- the answer to a line from a client
+        """
+        if writer is not self._controller:
+            return 'error: observer'
+        if line.split(';', 1)[0].strip().upper() == _KILL:
+            if self._kill_callback is None:
+                return 'error: no kill'
+            self._kill_callback()
+            # after the answer, which the caller writes as soon as this returns
+            running_loop().call_soon(self._clear)
+            return 'ok'
+        try:
+            self._queue.put_nowait(line)
+        except asyncio.QueueFull:
+            return 'busy'
+        return 'ok'
+
+    def _clear(self):
+        while not self._queue.empty():
+            self._broadcast('dropped {}\n'.format(self._queue.get_nowait()).encode('utf-8'))
+
+    async def _run(self):
+        loop = running_loop()
+        while True:
+            line = await self._queue.get()
+            try:
+                success = await loop.run_in_executor(self._executor, self._callback, line)
+            except Exception:
+                logger.exception('failed to run %s', line)
+                success = False
+            self._broadcast('{} {}\n'.format('done' if success else 'failed', line).encode('utf-8'))
+            if not success:
+                self._clear()
+
+    def _broadcast(self, message):
+        for writer in list(self._clients):
+            if writer is not self._controller and writer.transport.get_write_buffer_size() > _MAX_OBSERVER_BACKLOG:
+                logger.warning('dropping an observer that is not keeping up')
+                self._clients.discard(writer)
+                writer.close()
+                continue
+            writer.write(message)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='run G-code streamed over a socket')
+    parser.add_argument('--host', default='127.0.0.1', help='the address to listen on')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help='the TCP port to listen on')
+    parser.add_argument('--unix', metavar='PATH', help='listen on a Unix socket instead of TCP')
+    parser.add_argument('--queue', type=int, default=16, help='the most lines to queue before answering busy')
+    parser.add_argument('--simulate', action='store_true', help='run the G-code on a simulated machine')
+    args = parser.parse_args()
+
+    from gcode import GcodeExecutor
+    if args.simulate:
+        from simulated_hardware import SimulatedMachine
+        cnc = SimulatedMachine().cnc
+    else:
+        from brush_cnc import BrushCNC
+        cnc = BrushCNC()
+        cnc.zeroing()
+
+    executor = GcodeExecutor(cnc)
+    server = GcodeServer(executor.do_line, kill_callback=executor.stop, queue_size=args.queue)
+    loop = asyncio.get_event_loop()
+    loop.run_until_complete(server.start(args.host, args.port, args.unix))
+    print('listening on {}'.format(server.address))
+    try:
+        loop.run_forever()
+    finally:
+        loop.run_until_complete(server.close())
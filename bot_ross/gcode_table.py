@@ -0,0 +1,182 @@
+import math
+import mmap
+
+from array import array
+from gcode import GcodeCommand, parse_line
+
+# The parameters that get a column of their own. Any others are kept in GcodeTable.extra_params.
+COLUMNS = 'XYZEFP'
+
+_COLUMN_INDEX = {ord(letter): i for i, letter in enumerate(COLUMNS)}
+_COLUMN_INDEX.update({ord(letter.lower()): i for i, letter in enumerate(COLUMNS)})
+_COMMAND_LETTERS = {ord(c): ord(c.upper()) for c in 'GMTgmt'}
+
+
+class GcodeTable():
+    """
+    Parsed G-code stored as columns rather than one object per line.
+
+    Each command is a row: its letter (as a character code, like ord('G')), its number, and the line it came from,
+    plus one float column per parameter in COLUMNS, holding NaN where the command does not have that parameter. Every
+    column is an array, so a million moves take tens of megabytes rather than the hundreds that dicts would.
+    """
+
+    def __init__(self):
+        self.letters = array('B')
+        self.numbers = array('l')
+        self.line_numbers = array('l')
+        self.columns = {letter: array('d') for letter in COLUMNS}
+        self.extra_params = {}  # {row: {letter: float}} for parameters without a column, which are rare
+
+    def __len__(self):
+        return len(self.letters)
+
+    def command(self, row):
+        """
+        Get one row as a GcodeCommand, like parse_line would have returned
+
+        Arguments:
+            row {int} -- the row
+
+        Returns:
+            GcodeCommand -- the command
+        """
+        params = {}
+        for letter, column in self.columns.items():
+            value = column[row]
+            if not math.isnan(value):
+                params[letter] = value
+        params.update(self.extra_params.get(row, {}))
+        return GcodeCommand(self.line_numbers[row], chr(self.letters[row]), self.numbers[row], params)
+
+    def __iter__(self):
+        """
+        Yields:
+            GcodeCommand -- each command, so a table can be planned like the output of parse
+        """
+        for row in range(len(self)):
+            yield self.command(row)
+
+
+def tokenize(data):
+    """
+    Parse G-code into a GcodeTable in one pass
+
+    Lines in the usual 'G1 X1.5 Y2 F600' form, including everything XboxToGcode sends, are split on whitespace and
+    converted straight into the columns. Anything else, like comments in parentheses or words without spaces between
+    them, falls back to parse_line.
+
+    Arguments:
+        data {bytes or bytearray or mmap.mmap} -- the G-code
+
+    Returns:
+        GcodeTable -- the commands
+
+    Raises:
+        GcodeError -- if a line can not be parsed
+    """
+    table = GcodeTable()
+    letters = table.letters
+    numbers = table.numbers
+    line_numbers = table.line_numbers
+    extra_params = table.extra_params
+    column_index = _COLUMN_INDEX
+    command_letters = _COMMAND_LETTERS
+    nan = math.nan
+    width = len(COLUMNS)
+    empty_row = [nan] * width
+    values = array('d')  # row by row, split into columns at the end
+
+    line_number = 0
+    for line in _lines(data):
+        line_number += 1
+        comment = line.find(b';')
+        if comment >= 0:
+            line = line[:comment]
+        words = line.split()
+        if not words:
+            continue
+
+        letter = command_letters.get(words[0][0])
+        if letter is not None and b'(' not in line:
+            try:
+                number = int(float(words[0][1:]))
+                row = list(empty_row)
+                extra = None
+                for word in words[1:]:
+                    index = column_index.get(word[0])
+                    if index is not None:
+                        row[index] = float(word[1:])
+                    elif 65 <= word[0] <= 90 or 97 <= word[0] <= 122:
+                        extra = extra or {}
+                        extra[chr(word[0]).upper()] = float(word[1:])
+                    else:
+                        raise ValueError()
+            except ValueError:
+                pass  # not in the usual form, so leave it to the slow path
+            else:
+                if extra:
+                    extra_params[len(letters)] = extra
+                letters.append(letter)
+                numbers.append(number)
+                line_numbers.append(line_number)
+                values.extend(row)
+                continue
+
+        # The slow path, for line numbers, comments in parentheses, words run together, and errors
+        command = parse_line(line.decode('ascii', 'replace'), line_number)
+        if command is None:
+            continue
+        row = list(empty_row)
+        extra = {}
+        for key, value in command.params.items():
+            index = column_index.get(ord(key))
+            if index is None:
+                extra[key] = value
+            else:
+                row[index] = value
+        if extra:
+            extra_params[len(letters)] = extra
+        letters.append(ord(command.letter))
+        numbers.append(command.number)
+        line_numbers.append(line_number)
+        values.extend(row)
+
+    for i, letter in enumerate(COLUMNS):
+        table.columns[letter] = values[i::width]
+    return table
+
+
+def tokenize_file(path, use_mmap=True):
+    """
+    Parse a G-code file into a GcodeTable. See tokenize.
+
+    Arguments:
+        path {str} -- the file
+
+    Keyword Arguments:
+        use_mmap {bool} -- True to map the file into memory rather than reading it, so the OS pages it in as it is
+            parsed (default: {True})
+
+    Returns:
+        GcodeTable -- the commands
+    """
+    with open(path, 'rb') as f:
+        if not use_mmap:
+            return tokenize(f.read())
+        try:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # an empty file can not be mapped
+            return GcodeTable()
+        with mapped:
+            return tokenize(mapped)
+
+
+def _lines(data):
+    """
+    Iterate over the lines of a buffer. A memory-mapped file is read a line at a time, so it is never copied whole.
+    """
+    if isinstance(data, mmap.mmap):
+        data.seek(0)
+        return iter(data.readline, b'')
+    return data.splitlines()
@@ -1,2 +1,31 @@
 inch_per_rotation = 1.0/12
 ticks_per_rotation = 1.8/360
+
+mm_per_inch = 25.4
+
+
+def mm_to_steps(mm):
+    """
+    Convert a distance along an axis into stepper motor steps
+
+    Arguments:
+        mm {float} -- the distance in mm
+
+    Returns:
+        float -- the distance in steps, not rounded
+    """
+    rotations = mm / (inch_per_rotation * mm_per_inch)
+    return rotations / ticks_per_rotation
+
+
+def steps_to_mm(steps):
+    """
+    Convert stepper motor steps into a distance along an axis
+
+    Arguments:
+        steps {float} -- the distance in steps
+
+    Returns:
+        float -- the distance in mm
+    """
+    return steps * ticks_per_rotation * inch_per_rotation * mm_per_inch
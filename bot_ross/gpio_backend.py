@@ -0,0 +1,61 @@
+import defines
+import os
+import threading
+
+# The environment variable that picks the backend, overriding defines.GPIO_BACKEND
+ENVIRONMENT_VARIABLE = 'BOT_ROSS_GPIO'
+
+BACKENDS = ('rpi', 'gpiochip', 'simulated')
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def create(name):
+    """
+    Create a GPIO backend. Every backend has the parts of the RPi.GPIO interface that BotRoss uses: setmode, setup,
+    output (with a list of channels for a bulk write), input, add_event_detect, remove_event_detect, cleanup, and the
+    BCM, OUT, IN, HIGH, LOW, RISING, FALLING and BOTH constants.
+
+    Arguments:
+        name {str} -- 'rpi' for the RPi.GPIO library, 'gpiochip' for the Linux GPIO character device at
+            defines.GPIO_CHIP, or 'simulated' for a SimulatedGPIO
+
+    Returns:
+        module or GpiochipGPIO or SimulatedGPIO -- the backend
+
+    Raises:
+        ValueError -- if there is no backend with that name
+    """
+    if name == 'rpi':
+        import RPi.GPIO as GPIO
+        return GPIO
+    if name == 'gpiochip':
+        from gpiochip_gpio import GpiochipGPIO
+        return GpiochipGPIO(defines.GPIO_CHIP)
+    if name == 'simulated':
+        from simulated_gpio import SimulatedGPIO
+        return SimulatedGPIO()
+    raise ValueError('unknown GPIO backend {!r}, expected one of {}'.format(name, ', '.join(BACKENDS)))
+
+
+def default_name():
+    """
+    Returns:
+        str -- the name of the backend to use, from the BOT_ROSS_GPIO environment variable or defines.GPIO_BACKEND
+    """
+    return os.environ.get(ENVIRONMENT_VARIABLE) or defines.GPIO_BACKEND
+
+
+def default():
+    """
+    Get the backend shared by every driver that is not given one explicitly, creating it the first time
+
+    Returns:
+        module or GpiochipGPIO or SimulatedGPIO -- see create
+    """
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = create(default_name())
+        return _default
@@ -0,0 +1,265 @@
+import ctypes
+import fcntl
+import os
+import select
+import threading
+import time
+
+GPIOHANDLES_MAX = 64
+
+GPIOHANDLE_REQUEST_INPUT = 1 << 0
+GPIOHANDLE_REQUEST_OUTPUT = 1 << 1
+
+GPIOEVENT_REQUEST_RISING_EDGE = 1 << 0
+GPIOEVENT_REQUEST_FALLING_EDGE = 1 << 1
+GPIOEVENT_REQUEST_BOTH_EDGES = GPIOEVENT_REQUEST_RISING_EDGE | GPIOEVENT_REQUEST_FALLING_EDGE
+
+
+# The structs of the Linux GPIO character device's v1 ioctls, from linux/gpio.h
+class _HandleRequest(ctypes.Structure):
+    _fields_ = [
+        ('lineoffsets', ctypes.c_uint32 * GPIOHANDLES_MAX),
+        ('flags', ctypes.c_uint32),
+        ('default_values', ctypes.c_uint8 * GPIOHANDLES_MAX),
+        ('consumer_label', ctypes.c_char * 32),
+        ('lines', ctypes.c_uint32),
+        ('fd', ctypes.c_int)
+    ]
+
+
+class _HandleData(ctypes.Structure):
+    _fields_ = [('values', ctypes.c_uint8 * GPIOHANDLES_MAX)]
+
+
+class _EventRequest(ctypes.Structure):
+    _fields_ = [
+        ('lineoffset', ctypes.c_uint32),
+        ('handleflags', ctypes.c_uint32),
+        ('eventflags', ctypes.c_uint32),
+        ('consumer_label', ctypes.c_char * 32),
+        ('fd', ctypes.c_int)
+    ]
+
+
+class _EventData(ctypes.Structure):
+    _fields_ = [('timestamp', ctypes.c_uint64), ('id', ctypes.c_uint32)]
+
+
+def _iowr(number, struct):
+    return (3 << 30) | (ctypes.sizeof(struct) << 16) | (0xB4 << 8) | number
+
+
+GPIO_GET_LINEHANDLE_IOCTL = _iowr(0x03, _HandleRequest)
+GPIO_GET_LINEEVENT_IOCTL = _iowr(0x04, _EventRequest)
+GPIOHANDLE_GET_LINE_VALUES_IOCTL = _iowr(0x08, _HandleData)
+GPIOHANDLE_SET_LINE_VALUES_IOCTL = _iowr(0x09, _HandleData)
+
+
+class _LineHandle():
+    """
+    Lines requested together from the chip, which are read or written together with one ioctl
+    """
+
+    __slots__ = ('channels', 'fd', 'data')
+
+    def __init__(self, channels, fd):
+        self.channels = channels
+        self.fd = fd
+        self.data = _HandleData()
+
+
+class _EventWatch():
+    """
+    A line requested for edge events, and the thread that waits for them
+    """
+
+    def __init__(self, channel, fd, callback, bouncetime):
+        self.channel = channel
+        self.fd = fd
+        self._callback = callback
+        self._bouncetime = (bouncetime or 0) / 1000
+        self._wake_read, self._wake_write = os.pipe()
+        self._thread = threading.Thread(target=self._run, name='GPIO event {}'.format(channel), daemon=True)
+        self._thread.start()
+
+    def close(self):
+        os.write(self._wake_write, b'\0')
+        if threading.current_thread() is not self._thread:
+            self._thread.join()
+        for fd in (self.fd, self._wake_read, self._wake_write):
+            os.close(fd)
+
+    def _run(self):
+        size = ctypes.sizeof(_EventData)
+        last_time = None
+        while True:
+            ready, _, _ = select.select([self.fd, self._wake_read], [], [])
+            if self._wake_read in ready:
+                return
+            os.read(self.fd, size)
+            now = time.monotonic()
+            if last_time is not None and now - last_time < self._bouncetime:
+                continue
+            last_time = now
+            if self._callback:
+                self._callback(self.channel)
+
+
+class GpiochipGPIO():
+    """
+    The parts of RPi.GPIO that BotRoss uses, on top of the Linux GPIO character device (/dev/gpiochipN) rather than
+    /dev/mem or sysfs.
+
+    A list of channels passed to output is requested from the kernel as one line handle the first time it is used, so
+    after that every write to it, like a whole step of a motor, is a single ioctl. A channel can only belong to one
+    handle at a time, so using it in a different group gives up the handle it was in.
+
+    On a Raspberry Pi, the line offsets of gpiochip0 are the GPIO.BCM channel numbers, so only BCM mode is supported.
+    """
+
+    BCM = 11
+    BOARD = 10
+    OUT = 0
+    IN = 1
+    LOW = 0
+    HIGH = 1
+    FALLING = 32
+    RISING = 31
+    BOTH = 33
+
+    def __init__(self, path='/dev/gpiochip0', consumer='bot_ross'):
+        """
+        Keyword Arguments:
+            path {str} -- the GPIO chip's character device (default: {'/dev/gpiochip0'})
+            consumer {str} -- the label the lines are requested under, shown by tools like gpioinfo
+                (default: {'bot_ross'})
+        """
+        self._chip = os.open(path, os.O_RDWR | os.O_CLOEXEC)
+        self._consumer = consumer.encode()
+        self._directions = {}
+        self._levels = {}
+        self._handles = {}  # {(channel,): _LineHandle}, for each group of channels requested together
+        self._owners = {}  # {channel: _LineHandle or _EventWatch}
+        self._lock = threading.Lock()
+
+    def setmode(self, mode):
+        if mode != self.BCM:
+            raise ValueError('gpiochip lines are numbered like GPIO.BCM, so only GPIO.BCM mode is supported')
+
+    def setup(self, channel, direction):
+        with self._lock:
+            self._directions[channel] = direction
+            self._levels.setdefault(channel, self.LOW)
+            self._request((channel,))
+
+    def output(self, channels, values):
+        """
+        Set the level of one or more channels with one ioctl, mirroring RPi.GPIO.output
+
+        Arguments:
+            channels {int or [int]} -- the channel, or a list/tuple of channels
+            values {int or [int]} -- the level, or a list/tuple with one level per channel
+        """
+        if not isinstance(channels, (list, tuple)):
+            channels, values = (channels,), (values,)
+        channels = tuple(channels)
+
+        handle = self._handles.get(channels)
+        if handle is None:
+            with self._lock:
+                handle = self._request(channels)
+
+        data = handle.data
+        for i, (channel, value) in enumerate(zip(channels, values)):
+            level = self.HIGH if value else self.LOW
+            data.values[i] = level
+            self._levels[channel] = level
+        fcntl.ioctl(handle.fd, GPIOHANDLE_SET_LINE_VALUES_IOCTL, data)
+
+    def input(self, channel):
+        owner = self._owners.get(channel)
+        if owner is None:
+            with self._lock:
+                owner = self._request((channel,))
+
+        data = _HandleData()
+        fcntl.ioctl(owner.fd, GPIOHANDLE_GET_LINE_VALUES_IOCTL, data)
+        index = owner.channels.index(channel) if isinstance(owner, _LineHandle) else 0
+        return self.HIGH if data.values[index] else self.LOW
+
+    def add_event_detect(self, channel, edge, callback=None, bouncetime=None):
+        """
+        Call a function from a background thread when an input changes, mirroring RPi.GPIO.add_event_detect
+        """
+        flags = {
+            self.RISING: GPIOEVENT_REQUEST_RISING_EDGE,
+            self.FALLING: GPIOEVENT_REQUEST_FALLING_EDGE,
+            self.BOTH: GPIOEVENT_REQUEST_BOTH_EDGES
+        }[edge]
+        with self._lock:
+            self._release((channel,))
+            request = _EventRequest()
+            request.lineoffset = channel
+            request.handleflags = GPIOHANDLE_REQUEST_INPUT
+            request.eventflags = flags
+            request.consumer_label = self._consumer
+            fcntl.ioctl(self._chip, GPIO_GET_LINEEVENT_IOCTL, request)
+            self._owners[channel] = _EventWatch(channel, request.fd, callback, bouncetime)
+
+    def remove_event_detect(self, channel):
+        with self._lock:
+            if isinstance(self._owners.get(channel), _EventWatch):
+                self._release((channel,))
+
+    def cleanup(self):
+        with self._lock:
+            self._release(list(self._owners))
+            self._directions.clear()
+            self._levels.clear()
+
+    def _request(self, channels):
+        """
+        Request a group of lines as one handle, giving up any handles they were in. Call with the lock held.
+
+        Returns:
+            _LineHandle -- the new handle
+        """
+        if len(channels) > GPIOHANDLES_MAX:
+            raise ValueError('at most {} lines can be requested together'.format(GPIOHANDLES_MAX))
+        self._release(channels)
+
+        outputs = [self._directions.get(channel, self.OUT) == self.OUT for channel in channels]
+        if any(outputs) and not all(outputs):
+            raise ValueError('can not request inputs and outputs together: {}'.format(channels))
+
+        request = _HandleRequest()
+        for i, channel in enumerate(channels):
+            request.lineoffsets[i] = channel
+            request.default_values[i] = self._levels.get(channel, self.LOW)
+        request.flags = GPIOHANDLE_REQUEST_OUTPUT if all(outputs) else GPIOHANDLE_REQUEST_INPUT
+        request.consumer_label = self._consumer
+        request.lines = len(channels)
+        fcntl.ioctl(self._chip, GPIO_GET_LINEHANDLE_IOCTL, request)
+
+        handle = _LineHandle(channels, request.fd)
+        self._handles[channels] = handle
+        for channel in channels:
+            self._owners[channel] = handle
+        return handle
+
+    def _release(self, channels):
+        """
+        Give up every handle any of the channels belong to. Call with the lock held.
+        """
+        for channel in channels:
+            owner = self._owners.get(channel)
+            if owner is None:
+                continue
+            if isinstance(owner, _EventWatch):
+                del self._owners[channel]
+                owner.close()
+                continue
+            for other in owner.channels:
+                del self._owners[other]
+            del self._handles[owner.channels]
+            os.close(owner.fd)
@@ -0,0 +1,223 @@
+from collections import namedtuple
+from concurrent.futures import Future
+
+
+class HomingError(RuntimeError):
+    pass
+
+
+# The motors on one axis, the limit switch at its home end, its top speed in steps/second, and its length in steps
+HomingAxis = namedtuple('HomingAxis', ['name', 'motors', 'switch', 'max_hz', 'length'])
+
+# How long an axis took to home in seconds, and how many steps past the fast approach's trigger point the slow
+# re-approach found the switch
+AxisHomingResult = namedtuple('AxisHomingResult', ['name', 'time', 'offset'])
+
+
+class Homing():
+    """
+    Homes any number of axes in parallel, each in three phases: a fast approach until its switch is pressed, a short
+    back-off until it is released, and a slow re-approach so the switch is found at the same place every time.
+
+    Every axis runs its own phases as events on the scheduler, driven by its switch's callbacks and its motors' move
+    futures, so a quick axis never waits on a slow one and nothing polls while they travel.
+    """
+
+    def __init__(self, scheduler, axes, fast_fraction=1.0, slow_fraction=.1, backoff=40, timeout=None):
+        """
+        Arguments:
+            scheduler {StepScheduler} -- the scheduler the axes' motors step on
+            axes {[HomingAxis]} -- the axes to home
+
+        Keyword Arguments:
+            fast_fraction {float} -- the approach and back-off speed, as a fraction of each axis's max_hz
+                (default: {1.0})
+            slow_fraction {float} -- the re-approach speed, as a fraction of each axis's max_hz (default: {.1})
+            backoff {int} -- how many steps to back off the switch before re-approaching it (default: {40})
+            timeout {float} -- the most seconds each axis may take, or None for no limit (default: {None})
+        """
+        self._scheduler = scheduler
+        self._axes = axes
+        self._fast_fraction = fast_fraction
+        self._slow_fraction = slow_fraction
+        self._backoff = backoff
+        self._timeout = timeout
+
+    def run(self):
+        """
+        Home every axis, blocking until they are all done. Each axis is left stopped at its switch and zeroed.
+
+        Returns:
+            {str: AxisHomingResult} -- the result of each axis, by name
+
+        Raises:
+            HomingError -- if any axis failed to home, after the rest have finished
+        """
+        homings = [_AxisHoming(self, axis) for axis in self._axes]
+        for homing in homings:
+            homing.start()
+        for homing in homings:
+            self._scheduler.wait(homing.future)
+
+        errors = [str(homing.future.exception()) for homing in homings if homing.future.exception()]
+        if errors:
+            raise HomingError('; '.join(errors))
+        return {homing.axis.name: homing.future.result() for homing in homings}
+
+
+class _AxisHoming():
+    """
+    The state of one axis while it homes. Everything but start runs on the scheduler's thread, and each phase is
+    numbered so events left over from an earlier phase are ignored.
+    """
+
+    def __init__(self, homing, axis):
+        self.axis = axis
+        self.future = Future()
+        self._homing = homing
+        self._scheduler = homing._scheduler
+        self._phase = 0
+        self._start_time = None
+        self._timeout_handle = None
+        self._switch_callback = None
+
+    def start(self):
+        self._soon(self._begin)
+
+    def _begin(self):
+        self._start_time = self._scheduler.now()
+        if self._homing._timeout is not None:
+            self._timeout_handle = self._scheduler.schedule(self._on_timeout, self._start_time + self._homing._timeout,
+                                                            future=self.future)
+        travel = self.axis.length + self._homing._backoff
+        self._approach(self.axis.max_hz * self._homing._fast_fraction, travel, self._on_fast_hit)
+
+    def _approach(self, frequency, travel, on_hit):
+        """
+        Move towards the switch, stopping as soon as it is pressed
+
+        Arguments:
+            frequency {float} -- how fast to move, in steps/second
+            travel {int} -- the furthest to move before giving up, in steps
+            on_hit {function} -- called once the axis has stopped at the switch
+        """
+        self._next_phase()
+        switch = self.axis.switch
+        phase = self._phase
+
+        def hit(_):
+            switch.remove_callback(hit)
+            # After any steps already due now, so motors sharing an axis stop in step
+            self._soon(lambda: (self._stop(), on_hit()), phase)
+
+        switch.reset()
+        if switch.triggered:
+            on_hit()
+            return
+
+        self._move(frequency, -travel, lambda: self._fail('did not reach its limit switch in {} steps'.format(travel)))
+        self._switch_callback = hit
+        switch.add_callback(hit, state=True)
+
+        # If it was pressed before the callback was added, there will be no edge
+        if switch.get_state():
+            hit(True)
+
+    def _on_fast_hit(self):
+        for motor in self.axis.motors:
+            motor.zero()
+        self._next_phase()
+        self._move(self.axis.max_hz * self._homing._fast_fraction, self._homing._backoff, self._after_backoff)
+
+    def _after_backoff(self):
+        if self.axis.switch.get_state():
+            self._fail('was still at its limit switch after backing off {} steps'.format(self._homing._backoff))
+            return
+        self._approach(self.axis.max_hz * self._homing._slow_fraction, 2 * self._homing._backoff, self._on_slow_hit)
+
+    def _on_slow_hit(self):
+        offset = self.axis.motors[0]._pos
+        for motor in self.axis.motors:
+            motor.zero()
+
+        # Square up ganged motors, whose sides may need to stop a little apart for the axis to be straight
+        self._next_phase()
+        frequency = self.axis.max_hz * self._homing._slow_fraction
+        corrections = [motor.correct(motor.home_offsets, frequency)
+                       for motor in self.axis.motors if any(getattr(motor, 'home_offsets', ()))]
+        self._when_done(corrections, lambda: self._on_homed(offset))
+
+    def _on_homed(self, offset):
+        self._finish()
+        self.future.set_result(AxisHomingResult(self.axis.name, self._scheduler.now() - self._start_time, offset))
+
+    def _on_timeout(self, deadline):
+        if not self.future.done():
+            self._stop()
+            self._fail('did not home within {} seconds'.format(self._homing._timeout))
+        return None
+
+    def _move(self, frequency, steps, on_done):
+        """
+        Move every motor on the axis, calling on_done once they have all finished
+        """
+        self._when_done([motor.set_stepper(frequency, steps) for motor in self.axis.motors], on_done)
+
+    def _when_done(self, futures, on_done):
+        """
+        Call on_done once every future has a result, ignoring them if any are cancelled, and fail the axis if any
+        fail
+        """
+        if not futures:
+            on_done()
+            return
+
+        phase = self._phase
+        remaining = [len(futures)]
+
+        def done(future):
+            if future.cancelled():
+                return
+            if future.exception() is not None:
+                # The other motors on the axis may still be moving
+                message = 'failed to move: {}'.format(future.exception())
+                self._soon(lambda: (self._stop(), self._fail(message)), phase)
+                return
+            remaining[0] -= 1
+            if not remaining[0]:
+                self._soon(on_done, phase)
+
+        for future in futures:
+            future.add_done_callback(done)
+
+    def _stop(self):
+        for motor in self.axis.motors:
+            motor.set_stepper(0, 0)
+
+    def _fail(self, message):
+        self._finish()
+        self.future.set_exception(HomingError('the {} axis {}'.format(self.axis.name, message)))
+
+    def _finish(self):
+        self._next_phase()
+        if self._timeout_handle is not None:
+            self._scheduler.cancel(self._timeout_handle)
+
+    def _next_phase(self):
+        self._phase += 1
+        if self._switch_callback is not None:
+            self.axis.switch.remove_callback(self._switch_callback)
+            self._switch_callback = None
+
+    def _soon(self, function, phase=None):
+        """
+        Call a function on the scheduler's thread as soon as possible, unless the axis has moved on to another phase
+        """
+        phase = self._phase if phase is None else phase
+
+        def call(_):
+            if phase == self._phase and not self.future.done():
+                function()
+            return None
+
+        self._scheduler.schedule(call, self._scheduler.now(), future=self.future)
@@ -0,0 +1,308 @@
+import argparse
+import concurrent.futures
+import defines
+import itertools
+import os
+import random
+import re
+
+from collections import namedtuple
+from gcode import Move, ToolChange, format_actions
+
+# An RGB image, with pixels as bytes of R, G, B for each pixel, row by row from the top left
+Image = namedtuple('Image', ['width', 'height', 'pixels'])
+
+# A horizontal brush stroke in pixels, from column x0 to column x1 (inclusive) of row y, in the color of one tool
+PixelStroke = namedtuple('PixelStroke', ['tool', 'y', 'x0', 'x1'])
+
+_RUN = re.compile(rb'(.)\1*', re.DOTALL)
+
+
+def read_ppm(path):
+    """
+    Read a binary PPM (P6) or PGM (P5) image, which most image editors and ImageMagick's convert can write
+
+    Arguments:
+        path {str} -- the image file
+
+    Returns:
+        Image -- the image
+
+    Raises:
+        ValueError -- if the file is not a binary PPM or PGM with 8 bits per channel
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    fields = []
+    i = 0
+    while len(fields) < 4:
+        while i < len(data) and data[i:i + 1].isspace():
+            i += 1
+        if data[i:i + 1] == b'#':  # a comment
+            i = data.index(b'\n', i)
+            continue
+        start = i
+        while i < len(data) and not data[i:i + 1].isspace():
+            i += 1
+        if start == i:
+            raise ValueError('{} ends in its header'.format(path))
+        fields.append(data[start:i])
+    magic, width, height, maxval = fields[0], int(fields[1]), int(fields[2]), int(fields[3])
+    if magic not in (b'P5', b'P6') or maxval != 255:
+        raise ValueError('{} is not a binary PPM or PGM with 8 bits per channel'.format(path))
+    pixels = data[i + 1:]
+    channels = 3 if magic == b'P6' else 1
+    if len(pixels) < width * height * channels:
+        raise ValueError('{} is missing pixels'.format(path))
+    pixels = pixels[:width * height * channels]
+    if channels == 1:
+        pixels = bytes(value for gray in pixels for value in (gray, gray, gray))
+    return Image(width, height, pixels)
+
+
+def write_ppm(path, image):
+    """
+    Write an image as a binary PPM
+
+    Arguments:
+        path {str} -- the file to write
+        image {Image} -- the image
+    """
+    with open(path, 'wb') as f:
+        f.write('P6\n{} {}\n255\n'.format(image.width, image.height).encode())
+        f.write(image.pixels)
+
+
+def parse_color(text):
+    """
+    Parse a color written like ff8800 or #ff8800
+
+    Arguments:
+        text {str} -- the color
+
+    Returns:
+        (int, int, int) -- the color as RGB
+
+    Raises:
+        ValueError -- if text is not a color
+    """
+    text = text.lstrip('#')
+    if len(text) != 6:
+        raise ValueError('colors look like ff8800, not {}'.format(text))
+    return tuple(int(text[i:i + 2], 16) for i in (0, 2, 4))
+
+
+def choose_palette(image, count, iterations=10, sample=4096, seed=0):
+    """
+    Pick the colors that best represent an image with k-means, for when the paint colors are not known
+
+    Arguments:
+        image {Image} -- the image
+        count {int} -- how many colors to pick, like the number of extruders XboxToGcode gets in range_e
+
+    Keyword Arguments:
+        iterations {int} -- how many rounds of k-means to run (default: {10})
+        sample {int} -- how many pixels to sample (default: {4096})
+        seed {int} -- the random seed, so the same image always gets the same palette (default: {0})
+
+    Returns:
+        [(int, int, int)] -- the colors
+    """
+    rng = random.Random(seed)
+    pixel_count = image.width * image.height
+    pixels = [tuple(image.pixels[3 * p:3 * p + 3]) for p in (rng.randrange(pixel_count) for _ in range(sample))]
+    distinct = sorted(set(pixels))
+    centers = rng.sample(distinct, min(count, len(distinct)))
+    for _ in range(iterations):
+        clusters = [[] for _ in centers]
+        for pixel in pixels:
+            clusters[_nearest(pixel, centers)].append(pixel)
+        centers = [tuple(sum(channel) // len(cluster) for channel in zip(*cluster)) if cluster else center
+                   for cluster, center in zip(clusters, centers)]
+    return centers
+
+
+def _nearest(color, palette):
+    return min(range(len(palette)), key=lambda i: sum((a - b) ** 2 for a, b in zip(color, palette[i])))
+
+
+class _NearestColor(dict):
+    """
+    Maps an (R, G, B) tuple to the index of the nearest palette color, remembering every color it has seen
+    """
+
+    def __init__(self, palette):
+        super().__init__()
+        self._palette = palette
+
+    def __missing__(self, color):
+        index = self[color] = _nearest(color, self._palette)
+        return index
+
+
+def quantize_row(row, nearest):
+    """
+    Quantize a row of pixels to palette indices
+
+    Arguments:
+        row {bytes} -- the row's R, G, B bytes
+        nearest {_NearestColor} -- the palette lookup
+
+    Returns:
+        bytes -- the palette index of each pixel
+    """
+    # map and zip walk the row in C, so the only Python per pixel is a dict lookup for colors not seen yet
+    return bytes(map(nearest.__getitem__, zip(row[0::3], row[1::3], row[2::3])))
+
+
+def _hatch_tile(tile):
+    """
+    Quantize some rows of an image and find the runs of each color on them. Run in a worker process.
+
+    Arguments:
+        tile {([(int, bytes)], [(int, int, int)], int, int)} -- the rows as (y, R, G, B bytes), the palette, the
+            index of the background color or -1, and the shortest run to keep in pixels
+
+    Returns:
+        [PixelStroke] -- the runs
+    """
+    rows, palette, background, min_run = tile
+    nearest = _NearestColor(palette)
+    strokes = []
+    for y, row in rows:
+        for run in _RUN.finditer(quantize_row(row, nearest)):
+            tool = run.group()[0]
+            if tool != background and run.end() - run.start() >= min_run:
+                strokes.append(PixelStroke(tool, y, run.start(), run.end() - 1))
+    return strokes
+
+
+class ToolpathGenerator():
+    """
+    Turns an image into brush strokes, one paint color per extruder.
+
+    Each pixel is quantized to the nearest paint color, and every color's regions are filled with horizontal hatch
+    lines a brush width apart. The rows are split into tiles that are quantized and hatched in parallel on a process
+    pool, so a large canvas plans in seconds.
+
+    The image covers the canvas from (0, 0) to (width, height * width / image width) in mm, with its top row at the
+    far end of Y.
+    """
+
+    def __init__(self, palette, width, background=(255, 255, 255), brush_width=None, paint_z=None, travel_z=None,
+                 feed_rate=None, min_length=None, tile_rows=16, workers=None):
+        """
+        Arguments:
+            palette {[(int, int, int)]} -- the RGB color of the paint on each extruder, in the order of their T numbers
+            width {float} -- how wide to paint the image in mm
+
+        Keyword Arguments:
+            background {(int, int, int)} -- the color of the canvas, which is left unpainted, or None to paint
+                everything (default: {(255, 255, 255)})
+            brush_width {float} -- the distance in mm between hatch lines (default: {defines.BRUSH_WIDTH})
+            paint_z {float} -- the height in mm the brush paints at (default: {defines.PAINT_Z})
+            travel_z {float} -- the height in mm the brush travels at (default: {defines.TRAVEL_Z})
+            feed_rate {float} -- the painting speed in mm/second (default: {defines.PAINT_FEED_RATE})
+            min_length {float} -- the shortest stroke to paint in mm (default: {half of brush_width})
+            tile_rows {int} -- how many hatch lines each tile has (default: {16})
+            workers {int} -- how many processes to use, or 1 to work in this one (default: {the number of CPUs})
+        """
+        self._palette = [tuple(color) for color in palette]
+        self._width = width
+        self._background = None if background is None else tuple(background)
+        self._brush_width = defines.BRUSH_WIDTH if brush_width is None else brush_width
+        self._paint_z = defines.PAINT_Z if paint_z is None else paint_z
+        self._travel_z = defines.TRAVEL_Z if travel_z is None else travel_z
+        self._feed_rate = defines.PAINT_FEED_RATE if feed_rate is None else feed_rate
+        self._min_length = self._brush_width / 2 if min_length is None else min_length
+        self._tile_rows = tile_rows
+        self._workers = workers
+
+    def strokes(self, image):
+        """
+        Find the brush strokes for an image
+
+        Arguments:
+            image {Image} -- the image
+
+        Returns:
+            [PixelStroke] -- the strokes, by tool, then from the top of the image down, then from left to right
+        """
+        mm_per_pixel = self._width / image.width
+        spacing = max(1.0, self._brush_width / mm_per_pixel)
+        min_run = max(1, int(round(self._min_length / mm_per_pixel)))
+
+        # The background is quantized like any other color, so pixels closer to it than to any paint stay bare
+        palette = list(self._palette)
+        background = -1
+        if self._background is not None:
+            background = len(palette)
+            palette.append(self._background)
+
+        stride = 3 * image.width
+        hatch_rows = [int(spacing * (k + .5)) for k in range(int(image.height / spacing))] or [image.height // 2]
+        tiles = []
+        for first in range(0, len(hatch_rows), self._tile_rows):
+            rows = [(y, image.pixels[y * stride:(y + 1) * stride]) for y in hatch_rows[first:first + self._tile_rows]]
+            tiles.append((rows, palette, background, min_run))
+
+        workers = min(self._workers or os.cpu_count() or 1, len(tiles))
+        if workers <= 1:
+            results = map(_hatch_tile, tiles)
+        else:
+            with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+                results = list(pool.map(_hatch_tile, tiles))
+        strokes = [stroke for tile in results for stroke in tile]
+        strokes.sort()
+        return strokes
+
+    def actions(self, image):
+        """
+        Plan the painting of an image
+
+        Arguments:
+            image {Image} -- the image
+
+        Returns:
+            [Move or ToolChange] -- the actions, which paint one color at a time, alternating the direction of the
+                hatch lines so the brush zigzags down the canvas
+        """
+        mm_per_pixel = self._width / image.width
+        actions = []
+        for tool, strokes in itertools.groupby(self.strokes(image), key=lambda stroke: stroke.tool):
+            actions.append(ToolChange(None, tool))
+            for row, (y, line) in enumerate(itertools.groupby(strokes, key=lambda stroke: stroke.y)):
+                y = (image.height - .5 - y) * mm_per_pixel
+                spans = [((s.x0 + .5) * mm_per_pixel, (s.x1 + .5) * mm_per_pixel) for s in line]
+                if row % 2:
+                    spans = [(x1, x0) for x0, x1 in reversed(spans)]
+                for x0, x1 in spans:
+                    actions.append(Move(None, None, None, self._travel_z, None))
+                    actions.append(Move(None, x0, y, None, None))
+                    actions.append(Move(None, None, None, self._paint_z, self._feed_rate))
+                    actions.append(Move(None, x1, y, None, self._feed_rate))
+        actions.append(Move(None, None, None, self._travel_z, None))
+        return actions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='turn a PPM image into G-code for painting it')
+    parser.add_argument('image', help='the image, as a binary PPM or PGM')
+    parser.add_argument('output', help='where to write the G-code')
+    parser.add_argument('--width', type=float, required=True, help='how wide to paint the image in mm')
+    colors = parser.add_mutually_exclusive_group(required=True)
+    colors.add_argument('--colors', type=parse_color, nargs='+', help='the paint on each extruder, like ff0000')
+    colors.add_argument('--extruders', type=int, help='how many extruders there are, to pick the colors for them')
+    parser.add_argument('--optimize', action='store_true', help='reorder the strokes to travel less')
+    args = parser.parse_args()
+
+    image = read_ppm(args.image)
+    palette = args.colors or choose_palette(image, args.extruders)
+    actions = ToolpathGenerator(palette, args.width).actions(image)
+    if args.optimize:
+        from toolpath_optimizer import ToolpathOptimizer
+        actions = ToolpathOptimizer().optimize(actions).actions
+    with open(args.output, 'w') as f:
+        for line in format_actions(actions):
+            f.write(line + '\n')
+    print('palette: {}'.format(' '.join('{:02x}{:02x}{:02x}'.format(*color) for color in palette)))
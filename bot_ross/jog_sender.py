@@ -0,0 +1,203 @@
+import defines
+import logging
+import math
+import threading
+
+from collections import deque
+from gcode import GcodeError, parse_line
+
+logger = logging.getLogger(__name__)
+
+# Jog moves whose speeds differ by less than this fraction, and whose directions are closer than this cosine, are the
+# same motion, so they are merged into one longer move
+_SPEED_EPSILON = .02
+_DIRECTION_COSINE = .999
+
+
+class _Jog():
+    """
+    A relative move, like XboxToGcode sends: how far each of X, Y, Z and E goes in mm, and the feed rate in mm/minute
+    """
+
+    def __init__(self, deltas, feed_rate):
+        self.deltas = deltas
+        self.feed_rate = feed_rate
+
+    @property
+    def length(self):
+        return math.sqrt(sum(d * d for d in self.deltas))
+
+    @property
+    def duration(self):
+        return self.length / (self.feed_rate / 60) if self.feed_rate else 0.0
+
+    def same_motion(self, other):
+        length = self.length * other.length
+        if not length or abs(self.feed_rate - other.feed_rate) > _SPEED_EPSILON * max(self.feed_rate, other.feed_rate):
+            return False
+        return sum(a * b for a, b in zip(self.deltas, other.deltas)) / length >= _DIRECTION_COSINE
+
+    def limited(self, max_duration):
+        """
+        Returns:
+            _Jog -- this move, shortened if it would take longer than max_duration seconds
+        """
+        duration = self.duration
+        if duration <= max_duration:
+            return self
+        scale = max_duration / duration
+        return _Jog([d * scale for d in self.deltas], self.feed_rate)
+
+    def gcode(self):
+        return 'G1 X{:.4f} Y{:.4f} Z{:.4f} E{:.4f} F{:.4f}'.format(*(self.deltas + [self.feed_rate]))
+
+
+class JogSender():
+    """
+    Sends G-code to a callback that blocks while the machine moves, like PyCNC's do_line, from a thread of its own.
+
+    XboxToGcode can then hand over its lines without waiting on the machine. Lines wait in a bounded queue, and jog
+    moves (relative G1 moves) that have not started yet never pile up: a new jog move replaces the queued ones, or is
+    merged with them if it is the same motion. No jog move is longer than max_latency seconds, so a new command never
+    waits longer than that for the machine to start on it, and the machine stops within max_latency of the stick
+    being released. Kills skip the queue.
+
+    Use send as XboxToGcode's callback and kill as its kill_callback.
+    """
+
+    def __init__(self, callback, kill_callback=None, max_latency=None, size=16, trace=None):
+        """
+        Arguments:
+            callback {function} -- takes a line of G-code and returns True iff it succeeded. It may block.
+
+        Keyword Arguments:
+            kill_callback {function} -- stops the machine at once, like PyCNC's hal.disable_steppers (default: {None})
+            max_latency {float} -- the most seconds of jogging to queue, and the longest any jog move may take
+                (default: {defines.JOG_MAX_LATENCY})
+            size {int} -- the most lines to queue. send blocks while the queue is full. (default: {16})
+            trace {JogTrace} -- the trace XboxToGcode stamps its lines in, to tell it when each one starts running,
+                or None to not trace (default: {None})
+        """
+        self._callback = callback
+        self._kill_callback = kill_callback
+        self._max_latency = defines.JOG_MAX_LATENCY if max_latency is None else max_latency
+        self._size = size
+        self._queue = deque()  # of [(line or _Jog, the trace's ID for the line)]
+        self._trace = trace
+        self._condition = threading.Condition()
+        self._relative = False
+        self._stopped = False
+        self._failed = False
+        self._busy = False
+        self.merged = 0  # how many jog moves were merged into or replaced by newer ones
+        self._thread = threading.Thread(target=self._run, name='jog sender', daemon=True)
+        self._thread.start()
+
+    def send(self, line):
+        """
+        Queue a line of G-code
+
+        Arguments:
+            line {str} -- the line
+
+        Returns:
+            bool -- False iff the sender has been stopped or killed, or the callback failed, so no more lines should
+                be sent
+        """
+        with self._condition:
+            jog = self._parse_jog(line)
+            if jog is None:
+                while len(self._queue) >= self._size and not self._stopped:
+                    self._condition.wait()
+            if self._stopped or self._failed:
+                return False
+
+            # XboxToGcode traces a line just before sending it
+            command_id = None if self._trace is None else self._trace.latest
+            if jog is None:
+                self._queue.append((line, command_id))
+            else:
+                self._queue_jog(jog, command_id)
+            self._condition.notify_all()
+            return True
+
+    def _parse_jog(self, line):
+        """
+        Returns:
+            _Jog -- the line as a jog move, or None if it is something else
+        """
+        try:
+            command = parse_line(line)
+        except GcodeError:
+            return None
+        if command is None or command.letter != 'G':
+            return None
+        if command.number in (90, 91):
+            # the queue keeps the order of lines, so this applies to jog moves sent after it
+            self._relative = command.number == 91
+        if command.number != 1 or not self._relative or 'F' not in command.params:
+            return None
+        return _Jog([command.params.get(axis, 0.0) for axis in 'XYZE'], command.params['F'])
+
+    def _queue_jog(self, jog, command_id):
+        # Jog moves that have not started are stale. Merge the latest one if it is the same motion, and drop the rest.
+        stale = [item for item, _ in self._queue if isinstance(item, _Jog)]
+        if stale:
+            self.merged += len(stale)
+            self._queue = deque(entry for entry in self._queue if not isinstance(entry[0], _Jog))
+            if stale[-1].same_motion(jog):
+                jog = _Jog([a + b for a, b in zip(stale[-1].deltas, jog.deltas)], jog.feed_rate)
+        self._queue.append((jog.limited(self._max_latency), command_id))
+
+    def kill(self):
+        """
+        Stop the machine at once, skipping the queue, and stop sending
+        """
+        with self._condition:
+            self._stopped = True
+            self._queue.clear()
+            self._condition.notify_all()
+        if self._kill_callback:
+            self._kill_callback()
+
+    def stop(self, timeout=None):
+        """
+        Stop sending once the queued lines have been sent
+
+        Keyword Arguments:
+            timeout {float} -- the most seconds to wait for them (default: {None})
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: not self._queue and not self._busy or self._failed or self._stopped,
+                                     timeout)
+            self._stopped = True
+            self._condition.notify_all()
+        self._thread.join(timeout)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._queue or self._stopped)
+                if self._stopped:
+                    return
+                item, command_id = self._queue.popleft()
+                self._busy = True
+                self._condition.notify_all()  # there is room in the queue
+
+            line = item.gcode() if isinstance(item, _Jog) else item
+            if command_id is not None:
+                self._trace.running(command_id)
+            try:
+                succeeded = self._callback(line)
+            except Exception:
+                logger.exception('failed to send %s', line)
+                succeeded = False
+
+            with self._condition:
+                self._busy = False
+                if not succeeded:
+                    self._failed = True
+                    self._queue.clear()
+                self._condition.notify_all()
+                if self._failed:
+                    return
@@ -0,0 +1,155 @@
+import math
+import time
+
+from array import array
+from collections import namedtuple
+from step_telemetry import percentile
+
+# Percentiles of one latency, in seconds
+LatencyPercentiles = namedtuple('LatencyPercentiles', ['p50', 'p95', 'p99', 'max'])
+
+JogTraceSnapshot = namedtuple('JogTraceSnapshot', [
+    'commands',  # every command traced since the trace was created
+    'moved',  # how many of the commands still in the ring reached a step or servo write
+    'command_rate',  # commands/second over the commands still in the ring
+    'input',  # from the controller event to the G-code for it
+    'send',  # from the G-code to the send callback returning
+    'motion',  # from the G-code to the first step or servo write for it
+    'total'  # from the controller event to the first step or servo write
+])
+
+
+def latency_percentiles(values):
+    """
+    Returns:
+        LatencyPercentiles -- the percentiles of some latencies, or zeros if there are none
+    """
+    values = sorted(values)
+    return LatencyPercentiles(percentile(values, .5), percentile(values, .95), percentile(values, .99),
+                              values[-1] if values else 0.0)
+
+
+class JogTrace():
+    """
+    Traces jog commands from the stick to the motors.
+
+    Each line of G-code XboxToGcode sends is a command with an ID, and the trace timestamps the controller event
+    behind it, the G-code being made, the send callback returning, and the first step or servo write while the machine
+    runs it. Commands made while the sticks are held still have no event.
+
+    Like StepTelemetry, the stamps go into preallocated rings of the last capacity commands, nothing takes a lock,
+    and snapshot does the summarizing on the caller's thread. step is called on every step, so it is an attribute
+    compare unless it is the first step of a command.
+
+    The machine runs the latest command as soon as it is made, unless a JogSender queues them, in which case the
+    sender says when each one starts with running.
+    """
+
+    def __init__(self, capacity=1024, clock=time.monotonic):
+        """
+        Keyword Arguments:
+            capacity {int} -- how many of the most recent commands to keep (default: {1024})
+            clock {function} -- returns the time in seconds, on a clock every thread shares (default: {time.monotonic})
+        """
+        self._capacity = capacity
+        self._clock = clock
+        nans = array('d', [math.nan]) * capacity
+        self._event = nans[:]
+        self._gcode = nans[:]
+        self._sent = nans[:]
+        self._step = nans[:]
+        self._commands = 0
+        self._pending_event = None  # the first event since the last command
+        self._queued = False
+        self._running = None  # the ID of the command the machine is running
+        self._stepped = None  # the ID of the last command a step was stamped for
+
+    @property
+    def latest(self):
+        """
+        Returns:
+            int -- the ID of the last command made, or None if there are none
+        """
+        return self._commands - 1 if self._commands else None
+
+    def event(self):
+        """
+        Stamp a controller event. Called from the controller's callbacks.
+        """
+        if self._pending_event is None:
+            self._pending_event = self._clock()
+
+    def command(self):
+        """
+        Stamp a line of G-code being made for the controller's state
+
+        Returns:
+            int -- the command's ID
+        """
+        now = self._clock()
+        command_id = self._commands
+        index = command_id % self._capacity
+        event, self._pending_event = self._pending_event, None
+        self._event[index] = math.nan if event is None else event
+        self._gcode[index] = now
+        self._sent[index] = math.nan
+        self._step[index] = math.nan
+        self._commands = command_id + 1
+        if not self._queued:
+            self._running = command_id
+        return command_id
+
+    def sent(self, command_id):
+        """
+        Stamp the send callback returning for a command
+        """
+        self._sent[command_id % self._capacity] = self._clock()
+
+    def running(self, command_id):
+        """
+        Say the machine is starting on a command that was queued. Once this is called, commands only run when it says.
+        """
+        self._queued = True
+        self._running = command_id
+
+    def step(self):
+        """
+        Stamp a step or servo write. Called from the stepping thread.
+        """
+        command_id = self._running
+        if command_id != self._stepped and command_id is not None:
+            self._stepped = command_id
+            self._step[command_id % self._capacity] = self._clock()
+
+    def snapshot(self):
+        """
+        Summarize the commands traced so far
+
+        Returns:
+            JogTraceSnapshot -- the counters, the rate, and percentiles of each latency over the commands in the ring
+        """
+        commands = self._commands
+        count = min(commands, self._capacity)
+        event, gcode, sent, step = self._event[:], self._gcode[:], self._sent[:], self._step[:]
+        if count < self._capacity:
+            event, gcode, sent, step = event[:count], gcode[:count], sent[:count], step[:count]
+
+        def latencies(starts, ends):
+            # NaN stamps are missing, and a NaN difference fails the comparison
+            return [end - start for start, end in zip(starts, ends) if end - start >= 0]
+
+        command_rate = 0.0
+        if count > 1:
+            elapsed = max(gcode) - min(gcode)
+            if elapsed > 0:
+                command_rate = (count - 1) / elapsed
+
+        return JogTraceSnapshot(
+            commands=commands,
+            moved=sum(1 for stamp in step if stamp == stamp),
+            command_rate=command_rate,
+            input=latency_percentiles(latencies(event, gcode)),
+            send=latency_percentiles(latencies(gcode, sent)),
+            motion=latency_percentiles(latencies(gcode, step)),
+            total=latency_percentiles(latencies(event, step))
+        )
@@ -0,0 +1,163 @@
+import math
+import motion_profile
+
+from concurrent.futures import Future
+from move_futures import finished_future, wait_async, wait_for_latest
+from stepper_motor import StepperMotorDirection
+
+
+class LinearInterpolator():
+    """
+    Move several axes along a straight line at once.
+
+    Every axis is stepped from one scheduler callback using a DDA (Bresenham-style) interpolator: the axis with the
+    most steps to go steps on every tick, and the others step whenever their accumulated error crosses a whole step,
+    so all axes start and finish together and the path never strays more than half a step from the line.
+    """
+
+    def __init__(self, scheduler, telemetry=None):
+        """
+        Arguments:
+            scheduler {StepScheduler} -- the scheduler that times the ticks
+
+        Keyword Arguments:
+            telemetry {StepTelemetry} -- records how late each tick is, or None to not record (default: {None})
+        """
+        self._scheduler = scheduler
+        self._telemetry = telemetry
+        self._scheduled_tick = None
+        self._move_future = finished_future()
+
+        # The move in progress
+        self._axes = []  # [([StepperMotor], StepperMotorDirection, steps, error)] for each axis that moves
+        self._major_steps = 0
+        self._current_tick = 0
+        self._period = 0
+        self._intervals = None
+
+    def move(self, axes, frequency, wait=False, acceleration=None, jerk=None):
+        """
+        Start a coordinated move. Any move in progress is stopped first.
+
+        Arguments:
+            axes {[([StepperMotor], int)]} -- for each axis, the motors that drive it and the number of steps it should
+                move (negative means reverse). Every motor in an axis gets the same steps.
+            frequency {float} -- the step frequency of the axis that moves the furthest (Hz)
+
+        Keyword Arguments:
+            wait {bool} -- True iff the calling thread should wait until the move is done (default: {False})
+            acceleration {float} -- steps/second^2 for the axis that moves the furthest, or None or <= 0 to step at
+                frequency for the whole move (default: {None})
+            jerk {float} -- steps/second^3, or None or <= 0 for trapezoidal acceleration (default: {None})
+
+        Returns:
+            Future -- resolves to None when the move finishes, or is cancelled if it is replaced or stopped first
+        """
+        self.stop()
+        future = self._move_future = Future()
+
+        self._axes = []
+        self._major_steps = max([abs(steps) for _, steps in axes] + [0])
+        for motors, steps in axes:
+            if steps == 0:
+                continue
+            for motor in motors:
+                # The motors are stepped from here now, so they must not also be running a move of their own
+                motor.set_stepper(0, 0)
+            direction = StepperMotorDirection.FORWARD if steps > 0 else StepperMotorDirection.REVERSE
+            self._axes.append([motors, direction, abs(steps), self._major_steps // 2])
+
+        if self._major_steps == 0 or frequency == 0:
+            future.set_result(None)
+            return future
+
+        self._current_tick = 0
+        self._period = 1 / frequency
+        if acceleration and acceleration > 0:
+            self._intervals = motion_profile.step_intervals(self._major_steps, frequency, acceleration, jerk)
+        else:
+            self._intervals = None
+
+        self._scheduled_tick = self._scheduler.schedule(self._tick, self._scheduler.now(), future=future)
+
+        if wait:
+            self.wait_until_complete()
+        return future
+
+    async def move_async(self, axes, frequency, acceleration=None, jerk=None):
+        """
+        Start a coordinated move and wait for it from an event loop. See move.
+
+        Raises:
+            asyncio.CancelledError -- if the move is replaced or stopped before it finishes
+        """
+        await wait_async(self.move(axes, frequency, acceleration=acceleration, jerk=jerk))
+
+    def stop(self):
+        """
+        Stop the move in progress, leaving the motors wherever they are
+        """
+        if self._scheduled_tick:
+            self._scheduler.cancel(self._scheduled_tick)
+            self._scheduled_tick = None
+        self._move_future.cancel()
+
+    def is_complete(self):
+        return self._move_future.done()
+
+    def wait_until_complete(self, timeout=None):
+        """
+        Block until the current move has finished or been stopped
+
+        Keyword Arguments:
+            timeout {float} -- the most seconds to wait, or None to wait forever (default: {None})
+        """
+        wait_for_latest(lambda: self._move_future, self._scheduler, timeout)
+
+    def _tick(self, deadline):
+        """
+        Step every axis that is due for a step. Called by the scheduler.
+
+        Arguments:
+            deadline {float} -- the time this tick was scheduled for
+
+        Returns:
+            float -- the time the next tick is due, or None if the move is done
+        """
+        for axis in self._axes:
+            motors, direction, steps, error = axis
+            error -= steps
+            if error < 0:
+                error += self._major_steps
+                for motor in motors:
+                    motor.advance(direction)
+            axis[3] = error
+        if self._telemetry is not None:
+            self._telemetry.record(deadline, self._scheduler.now())
+
+        self._current_tick += 1
+        if self._current_tick < self._major_steps:
+            if self._intervals is None:
+                return deadline + self._period
+            return deadline + self._intervals[self._current_tick - 1]
+
+        self._move_future.set_result(None)
+        return None
+
+
+def path_frequency(deltas, feed_rate):
+    """
+    Get the step frequency of the axis that moves the furthest such that the move travels along its path at a feed
+    rate
+
+    Arguments:
+        deltas {[float]} -- the distance moved in each axis
+        feed_rate {float} -- the speed along the path, in the same distance units per second
+
+    Returns:
+        float -- the frequency of the furthest-moving axis, in its distance units per second
+    """
+    length = math.sqrt(sum(d * d for d in deltas))
+    if length == 0:
+        return 0
+    return feed_rate * max(abs(d) for d in deltas) / length
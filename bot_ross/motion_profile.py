@@ -0,0 +1,118 @@
+import math
+
+from array import array
+
+
+def _ramp_times_trapezoidal(max_velocity, acceleration):
+    """
+    Get the time of each step while accelerating from rest at a constant rate
+
+    Arguments:
+        max_velocity {float} -- the velocity to accelerate to (steps/second)
+        acceleration {float} -- steps/second^2
+
+    Returns:
+        [float] -- the time of the k-th step (starting from 1) since the start of the ramp
+    """
+    ramp_steps = int(max_velocity * max_velocity / (2 * acceleration))
+    return [math.sqrt(2 * k / acceleration) for k in range(1, ramp_steps + 1)]
+
+
+def _ramp_times_s_curve(max_velocity, acceleration, jerk):
+    """
+    Get the time of each step while accelerating from rest with limited jerk. The acceleration ramps up at the jerk
+    limit, holds at the acceleration limit if there is time, then ramps back down to reach max_velocity smoothly.
+
+    Arguments:
+        max_velocity {float} -- the velocity to accelerate to (steps/second)
+        acceleration {float} -- steps/second^2
+        jerk {float} -- steps/second^3
+
+    Returns:
+        [float] -- the time of the k-th step (starting from 1) since the start of the ramp
+    """
+    if max_velocity >= acceleration * acceleration / jerk:
+        jerk_time = acceleration / jerk
+        constant_time = (max_velocity - acceleration * acceleration / jerk) / acceleration
+    else:
+        # max_velocity is reached before the acceleration limit is
+        jerk_time = math.sqrt(max_velocity / jerk)
+        constant_time = 0.0
+    peak_acceleration = jerk * jerk_time
+
+    # Velocity and position at the end of the first two phases
+    v1 = jerk * jerk_time ** 2 / 2
+    p1 = jerk * jerk_time ** 3 / 6
+    v2 = v1 + peak_acceleration * constant_time
+    p2 = p1 + v1 * constant_time + peak_acceleration * constant_time ** 2 / 2
+    ramp_time = 2 * jerk_time + constant_time
+
+    def position(t):
+        if t <= jerk_time:
+            return jerk * t ** 3 / 6
+        t -= jerk_time
+        if t <= constant_time:
+            return p1 + v1 * t + peak_acceleration * t ** 2 / 2
+        t -= constant_time
+        return p2 + v2 * t + peak_acceleration * t ** 2 / 2 - jerk * t ** 3 / 6
+
+    times = []
+    low = 0.0
+    for k in range(1, int(position(ramp_time)) + 1):
+        # position is increasing, so bisect for the time it reaches each step. Steps are in order, so each search can
+        # start from the previous step's time.
+        high = ramp_time
+        for _ in range(48):
+            mid = (low + high) / 2
+            if position(mid) < k:
+                low = mid
+            else:
+                high = mid
+        times.append(high)
+        low = high
+    return times
+
+
+def step_intervals(steps, max_velocity, acceleration, jerk=None):
+    """
+    Precompute the time between each step of a move that starts and ends at rest.
+
+    The move accelerates up to max_velocity, cruises, then decelerates symmetrically. Short moves that cannot reach
+    max_velocity accelerate for half of the move and decelerate for the other half. With a jerk limit the ramps are
+    S-curves, otherwise they are trapezoidal.
+
+    Arguments:
+        steps {int} -- the number of steps in the move (the sign is ignored)
+        max_velocity {float} -- steps/second
+        acceleration {float} -- steps/second^2
+
+    Keyword Arguments:
+        jerk {float} -- steps/second^3, or None or <= 0 for a trapezoidal profile (default: {None})
+
+    Returns:
+        array -- an array of doubles holding the steps - 1 intervals between consecutive steps, in seconds
+    """
+    steps = abs(steps)
+    if steps < 2:
+        return array('d')
+
+    if jerk and jerk > 0:
+        ramp_times = _ramp_times_s_curve(max_velocity, acceleration, jerk)
+    else:
+        ramp_times = _ramp_times_trapezoidal(max_velocity, acceleration)
+
+    ramp_steps = min(len(ramp_times), steps // 2)
+    if ramp_steps == 0:
+        return array('d', [1 / max_velocity]) * (steps - 1)
+
+    ramp = array('d', (ramp_times[k] - ramp_times[k - 1] for k in range(1, ramp_steps)))
+    if ramp_steps < len(ramp_times):
+        cruise_interval = ramp_times[ramp_steps] - ramp_times[ramp_steps - 1]
+    else:
+        cruise_interval = 1 / max_velocity
+    cruise = array('d', [cruise_interval]) * (steps - 2 * ramp_steps + 1)
+
+    intervals = ramp + cruise
+    ramp.reverse()
+    intervals.extend(ramp)
+    return intervals
@@ -0,0 +1,71 @@
+import asyncio
+
+from concurrent.futures import Future, TimeoutError
+
+
+def finished_future(result=None):
+    """
+    Make a future that is already done, for moves that finish as soon as they start
+
+    Keyword Arguments:
+        result -- the result of the future (default: {None})
+
+    Returns:
+        Future -- the finished future
+    """
+    future = Future()
+    future.set_result(result)
+    return future
+
+
+def wait_for_latest(get_future, scheduler, timeout=None):
+    """
+    Wait for a move to finish or be stopped. A move that is replaced by another is cancelled, in which case this goes
+    on to wait for the replacement, so the caller does not return while the motor is still moving.
+
+    Arguments:
+        get_future {function} -- returns the future of the move in progress
+        scheduler {StepScheduler} -- the scheduler running the move, whose clock and wait are used
+
+    Keyword Arguments:
+        timeout {float} -- the most seconds to wait, or None to wait forever (default: {None})
+
+    Raises:
+        concurrent.futures.TimeoutError -- if the timeout passes first
+    """
+    deadline = None if timeout is None else scheduler.now() + timeout
+    while True:
+        future = get_future()
+        remaining = None if deadline is None else max(0, deadline - scheduler.now())
+        if not scheduler.wait(future, remaining):
+            raise TimeoutError()
+        if future is get_future():
+            return
+
+
+def running_loop():
+    """
+    Get the event loop running the calling coroutine
+
+    Returns:
+        asyncio.AbstractEventLoop -- the loop. Before Python 3.7 there is no asyncio.get_running_loop, but
+            get_event_loop returns the running loop when called from a coroutine.
+    """
+    get_running_loop = getattr(asyncio, 'get_running_loop', None)
+    return get_running_loop() if get_running_loop else asyncio.get_event_loop()
+
+
+async def wait_async(future):
+    """
+    Await a move's future from an event loop
+
+    Arguments:
+        future {Future} -- the future returned when starting the move
+
+    Returns:
+        the result of the future
+
+    Raises:
+        asyncio.CancelledError -- if the move is replaced before it finishes
+    """
+    return await asyncio.wrap_future(future, loop=running_loop())
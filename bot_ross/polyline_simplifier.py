@@ -0,0 +1,188 @@
+import argparse
+import defines
+import logging
+import math
+
+from gcode import Home, Move, Planner, format_actions, parse, read_lines
+
+logger = logging.getLogger(__name__)
+
+
+def simplify_points(points, tolerance):
+    """
+    Find which points of a polyline to keep so that no dropped point is further than tolerance from the simplified
+    polyline, using the Ramer-Douglas-Peucker algorithm
+
+    Arguments:
+        points {[(float, float, float)]} -- the polyline
+        tolerance {float} -- the most a dropped point may be from the simplified polyline
+
+    Returns:
+        [int] -- the indices of the points to keep, in order, always including the first and the last
+    """
+    if len(points) < 3:
+        return list(range(len(points)))
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        # All of the points between the ends are measured at once, as one batch
+        distances = _distances(points[first + 1:last], points[first], points[last])
+        farthest = max(range(len(distances)), key=distances.__getitem__)
+        if distances[farthest] > tolerance:
+            middle = first + 1 + farthest
+            keep[middle] = True
+            stack.append((first, middle))
+            stack.append((middle, last))
+    return [i for i, kept in enumerate(keep) if kept]
+
+
+def _distances(points, start, end):
+    """
+    Measure how far each point is from the segment from start to end
+    """
+    direction = [e - s for s, e in zip(start, end)]
+    length_squared = sum(d * d for d in direction)
+    if length_squared == 0:
+        return [math.sqrt(sum((p - s) ** 2 for p, s in zip(point, start))) for point in points]
+    distances = []
+    for point in points:
+        offset = [p - s for p, s in zip(point, start)]
+        t = min(1.0, max(0.0, sum(o * d for o, d in zip(offset, direction)) / length_squared))
+        distances.append(math.sqrt(sum((o - t * d) ** 2 for o, d in zip(offset, direction))))
+    return distances
+
+
+class PolylineSimplifier():
+    """
+    Merges runs of short, nearly collinear moves into fewer, longer ones, and drops moves that go nowhere.
+
+    Consecutive moves with the same feed rate are gathered into a polyline, which is simplified with simplify_points
+    when something else comes along or when window moves have been gathered. So it works on a whole job and on a live
+    stream alike, never holding more than window moves back. Every point the original moves went through is within
+    tolerance of the merged path, and the merged path ends exactly where the original one did.
+
+    moves_in and moves_out count the moves that went in and came out, to see how much it helped.
+    """
+
+    def __init__(self, tolerance=None, position=(0.0, 0.0, 0.0), window=256):
+        """
+        Keyword Arguments:
+            tolerance {float} -- how far in mm the merged path may be from any point the original one went through
+                (default: {defines.SIMPLIFY_TOLERANCE})
+            position {(float, float, float)} -- where the machine is before the first move, in mm
+                (default: {(0.0, 0.0, 0.0)})
+            window {int} -- the most moves to hold back before simplifying what has been gathered (default: {256})
+        """
+        self._tolerance = defines.SIMPLIFY_TOLERANCE if tolerance is None else tolerance
+        self._window = max(2, window)
+        self._position = tuple(position)
+        self._anchor = self._position  # where the gathered run starts
+        self._run = []  # [((x, y, z), line_number)] for the gathered moves
+        self._feed_rate = None
+        self.moves_in = 0
+        self.moves_out = 0
+
+    @property
+    def reduction(self):
+        """
+        Returns:
+            float -- the fraction of moves that were merged away or dropped so far
+        """
+        return 1 - self.moves_out / self.moves_in if self.moves_in else 0.0
+
+    def simplify(self, actions):
+        """
+        Simplify a stream of actions lazily
+
+        Arguments:
+            actions {iterable of Move or Home or ToolChange or PlaySound} -- the actions, like the output of
+                Planner.plan
+
+        Yields:
+            Move or Home or ToolChange or PlaySound -- the simplified actions
+        """
+        for action in actions:
+            yield from self.feed(action)
+        yield from self.flush()
+        logger.info('simplified %d moves into %d (%.0f%% fewer)', self.moves_in, self.moves_out, 100 * self.reduction)
+
+    def feed(self, action):
+        """
+        Add one action
+
+        Arguments:
+            action {Move or Home or ToolChange or PlaySound} -- the action
+
+        Returns:
+            [Move or Home or ToolChange or PlaySound] -- the actions that are ready to run, which may be none
+        """
+        if not isinstance(action, Move):
+            ready = self.flush()
+            ready.append(action)
+            if isinstance(action, Home):
+                self._position = self._anchor = (0.0, 0.0, 0.0)
+            return ready
+
+        self.moves_in += 1
+        target = tuple(p if m is None else m for m, p in zip((action.x, action.y, action.z), self._position))
+        if target == self._position:
+            return []  # a move that goes nowhere
+        self._position = target
+
+        ready = []
+        if self._run and action.feed_rate != self._feed_rate:
+            ready = self.flush()
+        self._feed_rate = action.feed_rate
+        self._run.append((target, action.line_number))
+        if len(self._run) >= self._window:
+            ready.extend(self._simplify_run(partial=True))
+        return ready
+
+    def flush(self):
+        """
+        Simplify and hand out every move that has been gathered, like at the end of a stream or before a pause
+
+        Returns:
+            [Move] -- the moves
+        """
+        return self._simplify_run(partial=False)
+
+    def _simplify_run(self, partial):
+        """
+        Simplify the gathered run. A partial run keeps its last segment back, since the moves still to come may
+        extend it.
+        """
+        if not self._run:
+            return []
+        points = [self._anchor] + [point for point, _ in self._run]
+        kept = simplify_points(points, self._tolerance)[1:]
+        if partial and len(kept) > 1:
+            kept = kept[:-1]
+
+        moves = []
+        for i in kept:
+            point, line_number = self._run[i - 1]
+            moves.append(Move(line_number, point[0], point[1], point[2], self._feed_rate))
+        self._anchor = self._run[kept[-1] - 1][0]
+        del self._run[:kept[-1]]
+        self.moves_out += len(moves)
+        return moves
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='merge the short, nearly collinear moves of a G-code file')
+    parser.add_argument('path', help='the G-code file')
+    parser.add_argument('output', help='where to write the simplified G-code')
+    parser.add_argument('--tolerance', type=float, default=None, help='how far in mm moves may stray')
+    args = parser.parse_args()
+
+    simplifier = PolylineSimplifier(args.tolerance)
+    with open(args.output, 'w') as f:
+        for line in format_actions(simplifier.simplify(Planner().plan(parse(read_lines(args.path))))):
+            f.write(line + '\n')
+    print('{} moves became {} ({:.0f}% fewer)'.format(simplifier.moves_in, simplifier.moves_out,
+                                                      100 * simplifier.reduction))
@@ -0,0 +1,642 @@
+import argparse
+import defines
+import itertools
+import math
+import time
+
+from array import array
+from collections import Counter, namedtuple
+from math import floor
+from operator import add
+from gcode import Home, Move, Planner, ToolChange
+from gcode_table import tokenize_file
+from image_to_toolpath import Image, parse_color, write_ppm
+from toolpath_optimizer import estimate_time, paints
+
+# The color of the paint on each tool, for when they are not given
+DEFAULT_PALETTE = [
+    (20, 20, 20), (200, 30, 30), (30, 70, 200), (240, 200, 30),
+    (40, 150, 60), (240, 120, 20), (120, 40, 160), (120, 80, 40)
+]
+
+# A brush narrower than this radius in pixels paints just the pixels along the middle of a line, since every one of
+# them is within this distance of the line and a thinner outline would leave gaps between them
+_THIN = math.sqrt(.5)
+
+# The size in pixels of the square blocks the canvas is split into to skip paint that later paint covers
+_BLOCK = 16
+
+# A line crossing more rows than this is long enough to be worth the setup of counting its rows in C and checking
+# which of its rows are hidden before painting them
+_LONG = 32
+
+# The rendered painting, how often the brush passed over each pixel while painting and while travelling, the
+# estimated seconds the job takes, and how far in mm the brush paints and travels
+Preview = namedtuple('Preview', ['image', 'paint_heatmap', 'travel_heatmap', 'time', 'paint_length',
+                                 'travel_length'])
+
+
+def bounds(actions, position=(0.0, 0.0, 0.0)):
+    """
+    Find the area a job moves over
+
+    Arguments:
+        actions {iterable of Move or Home or ToolChange or PlaySound} -- the job
+
+    Keyword Arguments:
+        position {(float, float, float)} -- where the machine starts, in mm (default: {(0.0, 0.0, 0.0)})
+
+    Returns:
+        (float, float, float, float) -- the least x, least y, greatest x and greatest y in mm
+    """
+    x, y = position[0], position[1]
+    low_x = high_x = x
+    low_y = high_y = y
+    for action in actions:
+        if isinstance(action, Move):
+            if action.x is not None:
+                x = action.x
+                low_x, high_x = min(low_x, x), max(high_x, x)
+            if action.y is not None:
+                y = action.y
+                low_y, high_y = min(low_y, y), max(high_y, y)
+        elif isinstance(action, Home):
+            x = y = 0.0
+            low_x, high_x, low_y, high_y = min(low_x, 0.0), max(high_x, 0.0), min(low_y, 0.0), max(high_y, 0.0)
+    return low_x, low_y, high_x, high_y
+
+
+def heatmap_image(width, height, counts):
+    """
+    Color pass counts from black through red and yellow to white, scaled so the busiest pixel is white
+
+    Arguments:
+        width {int} -- the width in pixels
+        height {int} -- the height in pixels
+        counts {array} -- the count for each pixel, row by row from the top left
+
+    Returns:
+        Image -- the heatmap
+    """
+    most = max(counts) if counts else 0
+    if not most:
+        return Image(width, height, bytes(3 * width * height))
+    # A logarithmic scale, so a few busy pixels do not wash out the rest
+    scale = 767 / math.log1p(most)
+    colors = {}
+    for count in set(counts):
+        level = int(math.log1p(count) * scale)
+        colors[count] = bytes((min(level, 255), min(max(level - 256, 0), 255), min(max(level - 512, 0), 255)))
+    return Image(width, height, b''.join(map(colors.__getitem__, counts)))
+
+
+class PreviewRenderer():
+    """
+    Draws what a job will paint, without running it.
+
+    Moves with the brush down, from and to at least the paint height (see toolpath_optimizer.paints), paint with the
+    current tool's color and the brush's width, with later paint covering earlier paint. Other moves travel with the
+    brush up, whether they are feed (G1) or rapid (G0) moves. Heatmaps count how often the brush passes over each
+    pixel, and the time is estimated with the machine's speed limits, like toolpath_optimizer.estimate_time.
+
+    Painting costs a little for each move and for each row of pixels it paints that no later move paints over, and a
+    long move hidden by later paint is skipped after a search for each band of 16 rows it crosses, so painting over
+    the canvas many times costs little more than painting it once. Without heatmaps, on one laptop
+    core, 1M moves of a fifth of a pixel render in about 4.5 s, 200k random moves about 250 pixels long in about
+    5.5 s, and 1M of those in about 30 s. Heatmaps count every pixel along every move, which costs a few operations
+    for each row of pixels a move crosses: little for tiny moves, but over half a minute for the 200k long moves.
+    """
+
+    def __init__(self, palette=None, pixels_per_mm=1.0, brush_width=None, background=(255, 255, 255),
+                 travel_color=None, position=(0.0, 0.0, 0.0), tool=0, paint_z=None, heatmaps=True):
+        """
+        Keyword Arguments:
+            palette {[(int, int, int)]} -- the RGB color of each tool (default: {DEFAULT_PALETTE})
+            pixels_per_mm {float} -- the scale of the images (default: {1.0})
+            brush_width {float} -- the width of the painted lines in mm (default: {defines.BRUSH_WIDTH})
+            background {(int, int, int)} -- the color of the canvas (default: {(255, 255, 255)})
+            travel_color {(int, int, int)} -- the color to draw travel in where nothing has been painted yet, or None
+                to leave it out (default: {None})
+            position {(float, float, float)} -- where the machine starts, in mm (default: {(0.0, 0.0, 0.0)})
+            tool {int} -- the tool the machine starts with (default: {0})
+            paint_z {float} -- the height in mm the brush touches the canvas at (default: {defines.PAINT_Z})
+            heatmaps {bool} -- True iff the heatmaps should be drawn. Counting costs a little for every row of
+                pixels every move crosses, so leave them out to preview jobs that paint over the canvas many times
+                quickly. (default: {True})
+        """
+        self._palette = [bytes(color) for color in (palette or DEFAULT_PALETTE)]
+        self._pixels_per_mm = pixels_per_mm
+        self._brush_width = defines.BRUSH_WIDTH if brush_width is None else brush_width
+        self._background = bytes(background)
+        self._travel_color = None if travel_color is None else bytes(travel_color)
+        self._position = tuple(position)
+        self._tool = tool
+        self._paint_z = defines.PAINT_Z if paint_z is None else paint_z
+        self._heatmaps = heatmaps
+
+    def render(self, actions, area=None):
+        """
+        Render a job
+
+        Arguments:
+            actions {iterable of Move or Home or ToolChange or PlaySound} -- the job. It is read twice if area is
+                None, so pass a list or give the area.
+
+        Keyword Arguments:
+            area {(float, float, float, float)} -- the least x, least y, greatest x and greatest y to draw, in mm
+                (default: {the job's bounds, plus the brush})
+
+        Returns:
+            Preview -- the images, time and lengths. The heatmaps are None if they were left out.
+        """
+        if area is None:
+            actions = actions if isinstance(actions, (list, tuple)) else list(actions)
+            radius = self._brush_width / 2
+            low_x, low_y, high_x, high_y = bounds(actions, self._position)
+            area = (low_x - radius, low_y - radius, high_x + radius, high_y + radius)
+        scale = self._pixels_per_mm
+        left, bottom = area[0], area[1]
+        width = max(1, int(math.ceil((area[2] - area[0]) * scale)))
+        height = max(1, int(math.ceil((area[3] - area[1]) * scale)))
+
+        drawing = _Drawing(width, height, self._background, self._brush_width * scale, counting=self._heatmaps)
+        palette = self._palette
+        travel_color = self._travel_color
+        paint_z = self._paint_z
+
+        def draw(actions):
+            # estimate_time reads the actions through this, so they are drawn and timed in one pass
+            position = self._position
+            drawing.set_color(palette[self._tool % len(palette)])
+            for action in actions:
+                if isinstance(action, ToolChange):
+                    drawing.set_color(palette[action.tool % len(palette)])
+                elif isinstance(action, (Move, Home)):
+                    if isinstance(action, Home):
+                        target, painting = (0.0, 0.0, 0.0), False
+                    else:
+                        target = (position[0] if action.x is None else action.x,
+                                  position[1] if action.y is None else action.y,
+                                  position[2] if action.z is None else action.z)
+                        painting = paints(position[2], target[2], paint_z)
+                    start = ((position[0] - left) * scale, (position[1] - bottom) * scale)
+                    end = ((target[0] - left) * scale, (target[1] - bottom) * scale)
+                    if painting:
+                        drawing.paint(start, end)
+                    else:
+                        drawing.travel(start, end, travel_color)
+                    position = target
+                yield action
+
+        seconds = estimate_time(draw(actions), self._position, self._tool)
+        drawing.finish()
+        return Preview(Image(width, height, bytes(drawing.canvas)),
+                       heatmap_image(width, height, drawing.paint_counts) if self._heatmaps else None,
+                       heatmap_image(width, height, drawing.travel_counts) if self._heatmaps else None,
+                       seconds, drawing.paint_length / scale, drawing.travel_length / scale)
+
+
+class _Drawing():
+    """
+    A canvas and heatmap counts, drawn on in pixels, with the origin at the bottom left.
+
+    A line runs between the pixels its ends are in. The columns it or a brush stroke covers in each row are worked out
+    for the whole move at once, with integer ranges and list comprehensions. The counts along a line's middle go into
+    a difference array, two entries a row, and are summed up at the end. A long line's entries are counted by
+    Counter.update, in C, rather than one at a time.
+
+    Paint is drawn by finish, last move first, onto only the pixels no later move has painted, so every pixel is
+    painted once however often the job paints over it. A long move first looks for the rows of _BLOCK by _BLOCK
+    pixel blocks along it that later paint has not filled, and works out its outline only in those, so a hidden move
+    costs a search for each row of blocks it crosses.
+    """
+
+    def __init__(self, width, height, background, brush_width, counting=True):
+        self.width = width
+        self.height = height
+        self.canvas = bytearray(background * (width * height))
+        self.background = background
+        self.paint_length = 0.0
+        self.travel_length = 0.0
+        self._counting = counting
+        self._radius = radius = max(0.0, brush_width / 2 - .5)
+        # The rows of a disc the width of the brush, as (row offset, first column offset, last column offset), for
+        # stamping the brush on one pixel
+        reach = int(radius)
+        self._disc = [(dy, -int(math.sqrt(radius * radius - dy * dy)), int(math.sqrt(radius * radius - dy * dy)))
+                      for dy in range(-reach, reach + 1)]
+        # A row of canvas in each color painted so far, and the one being painted in
+        self._rows = []
+        self._colors = {}
+        self._color = None
+        # The paint moves, six numbers each: the pixels they start and end at, the color, and 1 iff the brush is
+        # stamped on the start of a move too short for an outline. finish draws them.
+        self._strokes = array('i')
+        # The counts of each row as the change from the pixel before, with a spare entry at the end of the row for
+        # the change after its last pixel. Long lines add to the Counters instead: the first for the entries that
+        # go up, the second for the ones that go down.
+        self._paint_changes = array('i', [0]) * ((width + 1) * height) if counting else None
+        self._travel_changes = array('i', [0]) * ((width + 1) * height) if counting else None
+        self._paint_spans = (Counter(), Counter())
+        self._travel_spans = (Counter(), Counter())
+        # The last pixel painted and travelled over, so a line continuing from the one before does not count the
+        # pixel they share twice. Jobs of tiny moves mostly stay on one pixel, so this skips most of the drawing.
+        self._last_painted = None
+        self._last_travelled = None
+
+    @property
+    def paint_counts(self):
+        return _sum_rows(self._paint_changes, self._paint_spans, self.width, self.height)
+
+    @property
+    def travel_counts(self):
+        return _sum_rows(self._travel_changes, self._travel_spans, self.width, self.height)
+
+    def set_color(self, color):
+        if color not in self._colors:
+            self._colors[color] = len(self._rows)
+            self._rows.append(color * self.width)
+        self._color = self._colors[color]
+        self._last_painted = None
+
+    def _inside(self, rows, firsts, lasts):
+        """
+        Returns:
+            bool -- True iff every row and column is on the canvas
+        """
+        return (0 <= min(rows[0], rows[-1]) and max(rows[0], rows[-1]) < self.height and
+                0 <= min(firsts) and max(lasts) < self.width)
+
+    def _count(self, changes, spans, start, end, last):
+        """
+        Count the pixels along the middle of a line, apart from last if the line starts there
+        """
+        width, top = self.width, self.height - 1
+        stride = width + 1
+        if start[1] == end[1] and abs(end[0] - start[0]) <= 1:
+            rows = ((start[1], min(start[0], end[0]), max(start[0], end[0])),)
+        elif abs(end[1] - start[1]) == 1 and abs(end[0] - start[0]) <= 1:
+            rows = ((start[1], start[0], start[0]), (end[1], end[0], end[0]))
+        else:
+            rows, firsts, lasts = _line(start, end)
+            if len(rows) > _LONG and self._inside(rows, firsts, lasts):
+                offset = (top - rows[0]) * stride
+                step = -rows.step * stride
+                ups, downs = spans
+                ups.update(map(add, range(offset, offset + step * len(rows), step), firsts))
+                downs.update(map(add, range(offset + 1, offset + 1 + step * len(rows), step), lasts))
+                rows = ()
+            else:
+                rows = zip(rows, firsts, lasts)
+        for row, first, final in rows:
+            if 0 <= row <= top:
+                first = first if first > 0 else 0
+                final = final if final < width - 1 else width - 1
+                if first <= final:
+                    offset = (top - row) * stride
+                    changes[offset + first] += 1
+                    changes[offset + final + 1] -= 1
+        if start == last and 0 <= start[0] < width and 0 <= start[1] <= top:
+            offset = (top - start[1]) * stride + start[0]
+            changes[offset] -= 1
+            changes[offset + 1] += 1
+
+    def paint(self, start, end):
+        self.paint_length += math.hypot(end[0] - start[0], end[1] - start[1])
+        self._last_travelled = None
+        start, end = (floor(start[0]), floor(start[1])), (floor(end[0]), floor(end[1]))
+        last_painted = self._last_painted
+        if start == end == last_painted:
+            return
+        if self._counting:
+            self._count(self._paint_changes, self._paint_spans, start, end, last_painted)
+        self._last_painted = end
+        self._strokes.extend((start[0], start[1], end[0], end[1], self._color,
+                              start != end and start != last_painted))
+
+    def travel(self, start, end, color):
+        self.travel_length += math.hypot(end[0] - start[0], end[1] - start[1])
+        self._last_painted = None
+        start, end = (floor(start[0]), floor(start[1])), (floor(end[0]), floor(end[1]))
+        if start == end == self._last_travelled:
+            return
+        if self._counting:
+            self._count(self._travel_changes, self._travel_spans, start, end, self._last_travelled)
+        self._last_travelled = end
+        if not color:
+            return
+        # Paint is drawn at the end, over the travel, so this only has to draw over the background and earlier travel
+        width, top, canvas = self.width, self.height - 1, self.canvas
+        for row, first, last in zip(*_line(start, end)):
+            if 0 <= row <= top:
+                first = first if first > 0 else 0
+                last = last if last < width - 1 else width - 1
+                if first <= last:
+                    offset = 3 * ((top - row) * width + first)
+                    canvas[offset:offset + 3 * (last - first + 1)] = color * (last - first + 1)
+
+    def finish(self):
+        """
+        Draw the paint, last move first, leaving each pixel the color of the last move to paint it
+        """
+        width, height, canvas, strokes, rows = self.width, self.height, self.canvas, self._strokes, self._rows
+        top = height - 1
+        reach = int(self._radius)
+        thin = self._radius < _THIN
+        # Which pixels have been painted, by rows from the top, and which blocks of them are known to be full
+        cover = _Cover(width, height)
+        done = cover.done
+        ones = b'\x01' * width
+        for k in range(len(strokes) - 6, -1, -6):
+            x0, y0, x1, y1, color, stamp = strokes[k:k + 6]
+            # A short move is cheaper to paint, skipping the pixels already painted, than to check for first
+            long = abs(y1 - y0) > _LONG
+            bands = cover.uncovered(x0, top - y0, x1, top - y1, reach) if long else None
+            if long and not bands:
+                continue
+            if abs(x1 - x0) <= 1 and abs(y1 - y0) <= 1:
+                spans = [(y1 + dy, x1 + first, x1 + last) for dy, first, last in self._disc]
+                if stamp:
+                    spans += [(y0 + dy, x0 + first, x0 + last) for dy, first, last in self._disc]
+            elif thin:
+                spans = zip(*_line((x0, y0), (x1, y1)))
+            elif not long:
+                spans = zip(*_stroke((x0, y0), (x1, y1), self._radius))
+            else:
+                # Only the rows of blocks that are not full yet, since the stroke is hidden everywhere else
+                spans = itertools.chain.from_iterable(
+                    zip(*_stroke((x0, y0), (x1, y1), self._radius, top - lower, top - upper))
+                    for upper, lower in _runs(bands))
+            row_bytes = rows[color]
+            for row, first, last in spans:
+                row = top - row
+                if not 0 <= row <= top:
+                    continue
+                first = first if first > 0 else 0
+                last = last if last < width - 1 else width - 1
+                if first > last:
+                    continue
+                offset = row * width
+                end = offset + last + 1
+                # Paint each run of pixels in the span that no later move has painted
+                i = done.find(0, offset + first, end)
+                while i != -1:
+                    j = done.find(1, i, end)
+                    j = end if j == -1 else j
+                    canvas[3 * i:3 * j] = row_bytes[3 * (i - offset):3 * (j - offset)]
+                    done[i:j] = ones[:j - i]
+                    i = done.find(0, j, end) if j < end else -1
+        self._strokes = array('i')
+
+
+class _Cover():
+    """
+    Which pixels of a canvas have been painted, and which blocks of _BLOCK by _BLOCK pixels are all painted, all by
+    rows from the top. Whether a block is full is only worked out when something asks, and remembered once it is, so
+    painting a pixel costs nothing more than marking it.
+    """
+
+    def __init__(self, width, height):
+        self.done = bytearray(width * height)
+        self._width = width
+        self._height = height
+        self._columns = -(-width // _BLOCK)
+        self._full = bytearray(self._columns * -(-height // _BLOCK))
+
+    def _full_between(self, block, left, right):
+        """
+        Returns:
+            bool -- True iff the blocks from column left to right in a row of blocks are all painted
+        """
+        full, done, width = self._full, self.done, self._width
+        start = block * self._columns
+        index = full.find(0, start + left, start + right + 1)
+        while index != -1:
+            first = (index - start) * _BLOCK
+            last = min(width, first + _BLOCK)
+            for row in range(block * _BLOCK, min(self._height, block * _BLOCK + _BLOCK)):
+                if done.find(0, row * width + first, row * width + last) != -1:
+                    return False
+            full[index] = 1
+            index = full.find(0, index + 1, start + right + 1)
+        return True
+
+    def uncovered(self, x0, y0, x1, y1, reach):
+        """
+        Find the rows of blocks a move could paint that are not full yet, from the line along its middle
+
+        Returns:
+            [int] -- the rows of blocks with a block within reach + 1 of the line that is not full
+        """
+        width, height = self._width, self._height
+        reach += 1
+        low, high = max(0, min(y0, y1) - reach), min(height - 1, max(y0, y1) + reach)
+        # Most moves are hidden by then, which the blocks around the whole move known to be full show for one
+        # search a row of blocks, so the columns the line can paint are only worked out for the other rows
+        left = max(0, min(x0, x1) - reach) // _BLOCK
+        right = min(width - 1, max(x0, x1) + reach) // _BLOCK
+        if left > right:
+            return []
+        full, columns = self._full, self._columns
+        # The line's column in a row, and the rows it runs between
+        slope = (x1 - x0) / (y1 - y0) if y1 != y0 else 0.0
+        upper, lower = min(y0, y1), max(y0, y1)
+        bands = []
+        for block in range(low // _BLOCK, high // _BLOCK + 1):
+            if full.find(0, block * columns + left, block * columns + right + 1) == -1:
+                continue
+            # The part of the line that can paint this block's rows, and the blocks it can paint there
+            if y0 == y1:
+                near, far = (x0, x1) if x0 < x1 else (x1, x0)
+            else:
+                first, last = block * _BLOCK - reach, block * _BLOCK + _BLOCK - 1 + reach
+                near = x0 + ((first if first > upper else upper) - y0) * slope
+                far = x0 + ((last if last < lower else lower) - y0) * slope
+                near, far = (near, far) if near < far else (far, near)
+            first = max(0, floor(near) - reach) // _BLOCK
+            last = min(width - 1, math.ceil(far) + reach) // _BLOCK
+            if first <= last and not self._full_between(block, first, last):
+                bands.append(block)
+        return bands
+
+
+def _runs(bands):
+    """
+    Yields:
+        (int, int) -- the first and last row of pixels, from the top, of each run of consecutive rows of blocks
+    """
+    first = previous = bands[0]
+    for band in bands[1:]:
+        if band != previous + 1:
+            yield first * _BLOCK, previous * _BLOCK + _BLOCK - 1
+            first = band
+        previous = band
+    yield first * _BLOCK, previous * _BLOCK + _BLOCK - 1
+
+
+def _sum_rows(changes, spans, width, height):
+    """
+    Returns:
+        array -- the count of each pixel, row by row from the top left, summed from the changes along each row and
+            the changes counted in spans
+    """
+    changes = array('i', changes)
+    ups, downs = spans
+    for index, count in ups.items():
+        changes[index] += count
+    for index, count in downs.items():
+        changes[index] -= count
+    counts = array('I')
+    stride = width + 1
+    for offset in range(0, stride * height, stride):
+        counts.extend(itertools.accumulate(changes[offset:offset + width]))
+    return counts
+
+
+def _line(start, end):
+    """
+    Find the pixels along the middle of a line between two pixels, one in each row or column it crosses, whichever
+    it crosses more of
+
+    Returns:
+        (range, [int], [int]) -- the rows the line crosses, from start to end, and the first and last column it
+            crosses in each
+    """
+    (x0, y0), (x1, y1) = start, end
+    dx, dy = x1 - x0, y1 - y0
+    rows = abs(dy)
+    if not rows:
+        return range(y0, y0 + 1), [min(x0, x1)], [max(x0, x1)]
+    row_step = 1 if dy > 0 else -1
+    span = range(y0, y1 + row_step, row_step)
+    # Worked out in integers, as multiples of 1 / (2 * rows), so the rounding is exact and the Python work is a
+    # floor division a row
+    twice = 2 * rows
+    if rows >= abs(dx):
+        # The column x0 + floor(dx * k / rows + 1 / 2) in row k
+        columns = [n // twice for n in range(twice * x0 + rows, twice * x0 + rows + 2 * dx * (rows + 1), 2 * dx)] \
+            if dx else [x0] * (rows + 1)
+        return span, columns, columns
+    # Row k runs along columns x0 + ceil((k - 1 / 2) * run) to x0 + ceil((k + 1 / 2) * run) - 1 away from x0, where
+    # run = |dx| / rows, so the columns where it crosses into each row after the first are (2 k - 1) |dx| / (2 rows)
+    run = abs(dx)
+    crossings = range(-run, -run - 2 * run * rows, -2 * run)
+    if dx > 0:
+        lows = [x0] + [x0 - n // twice for n in crossings]
+        return span, lows, [low - 1 for low in lows[1:]] + [x1]
+    highs = [x0] + [x0 + n // twice for n in crossings]
+    return span, [high + 1 for high in highs[1:]] + [x1], highs
+
+
+def _stroke(start, end, radius, low=None, high=None):
+    """
+    Find the pixels within radius of a line between two pixels
+
+    Keyword Arguments:
+        low {int} -- the lowest row to find the pixels in, or None for every row (default: {None})
+        high {int} -- the highest row to find the pixels in, or None for every row (default: {None})
+
+    Returns:
+        (range, [int], [int]) -- the rows the stroke covers, from the bottom, and the first and last column it covers
+            in each. The last column of a row the stroke misses is before its first.
+    """
+    (x0, y0), (x1, y1) = start, end
+    dx, dy = x1 - x0, y1 - y0
+    reach = int(radius)
+    bottom, top = min(y0, y1) - reach, max(y0, y1) + reach
+    bottom, top = bottom if low is None else max(bottom, low), top if high is None else min(top, high)
+    # The rows, as offsets from y0, at least margin of the line from either end, where the stroke is just the band
+    # along the line, since the discs at its ends lie inside it
+    band = range(0)
+    if dy:
+        slope = dx / dy
+        half_width = radius * math.hypot(dx, dy) / abs(dy)
+        margin = radius * abs(dx) / math.hypot(dx, dy) / abs(dy)
+        if margin <= .5:
+            near, far = sorted((margin * dy, (1 - margin) * dy))
+            band = range(max(math.ceil(near), bottom - y0), min(math.floor(far), top - y0) + 1)
+
+    firsts, lasts = [], []
+
+    def outline(offsets):
+        for offset in offsets:
+            low, high = _stroke_row(x0, y0, x1, y1, y0 + offset, radius)
+            if low > high:
+                firsts.append(1)
+                lasts.append(0)
+            else:
+                firsts.append(math.ceil(low - 1e-9))
+                lasts.append(math.floor(high + 1e-9))
+
+    if not band:
+        outline(range(bottom - y0, top - y0 + 1))
+        return range(bottom, top + 1), firsts, lasts
+    outline(range(bottom - y0, band.start))
+    low, high = x0 - half_width - 1e-9, x0 + half_width + 1e-9
+    firsts += [math.ceil(low + k * slope) for k in band]
+    lasts += [math.floor(high + k * slope) for k in band]
+    outline(range(band.stop, top - y0 + 1))
+    return range(bottom, top + 1), firsts, lasts
+
+
+def _stroke_row(x0, y0, x1, y1, row, radius):
+    """
+    Returns:
+        (float, float) -- the least and greatest x within radius of a line in a row, or (inf, -inf) if there are none
+    """
+    low, high = math.inf, -math.inf
+    for x, y in ((x0, y0), (x1, y1)):
+        reach = radius * radius - (row - y) ** 2
+        if reach >= 0:
+            reach = math.sqrt(reach)
+            low, high = min(low, x - reach), max(high, x + reach)
+
+    # The band between the discs, of points within radius of the line and between its ends
+    dx, dy, offset = x1 - x0, y1 - y0, row - y0
+    squared = dx * dx + dy * dy
+    if not squared:
+        return low, high
+    if dy:
+        half_width = radius * math.sqrt(squared) / abs(dy)
+        middle = x0 + offset * dx / dy
+        band_low, band_high = middle - half_width, middle + half_width
+    elif abs(offset) <= radius:
+        band_low, band_high = -math.inf, math.inf
+    else:
+        return low, high
+    if dx:
+        ends = sorted((x0 - offset * dy / dx, x0 + (squared - offset * dy) / dx))
+        band_low, band_high = max(band_low, ends[0]), min(band_high, ends[1])
+    elif not 0 <= offset * dy <= squared:
+        return low, high
+    if band_low <= band_high:
+        low, high = min(low, band_low), max(high, band_high)
+    return low, high
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='draw what a G-code file will paint')
+    parser.add_argument('path', help='the G-code file')
+    parser.add_argument('output', help='where to write the preview, as a PPM')
+    parser.add_argument('--pixels-per-mm', type=float, default=1.0, help='the scale of the preview')
+    parser.add_argument('--colors', type=parse_color, nargs='+', help='the paint on each extruder, like ff0000')
+    parser.add_argument('--heatmaps', metavar='PREFIX', help='also write PREFIX-paint.ppm and PREFIX-travel.ppm')
+    parser.add_argument('--travel', action='store_true', help='draw travel moves in gray')
+    parser.add_argument('--paint-z', type=float, help='the height in mm the brush paints at (default: PAINT_Z)')
+    args = parser.parse_args()
+
+    start_time = time.perf_counter()
+    table = tokenize_file(args.path)
+    renderer = PreviewRenderer(args.colors, args.pixels_per_mm, travel_color=(190, 190, 190) if args.travel else None,
+                               paint_z=args.paint_z, heatmaps=bool(args.heatmaps))
+    # The table is planned twice, once to find the job's bounds and once to draw it, rather than holding every move
+    radius = renderer._brush_width / 2
+    low_x, low_y, high_x, high_y = bounds(Planner().plan(table))
+    result = renderer.render(Planner().plan(table), (low_x - radius, low_y - radius, high_x + radius, high_y + radius))
+    write_ppm(args.output, result.image)
+    if args.heatmaps:
+        write_ppm(args.heatmaps + '-paint.ppm', result.paint_heatmap)
+        write_ppm(args.heatmaps + '-travel.ppm', result.travel_heatmap)
+    print('{} commands rendered in {:.1f} s'.format(len(table), time.perf_counter() - start_time))
+    print('painting {:.0f} mm and travelling {:.0f} mm takes about {:.0f} minutes'.format(
+        result.paint_length, result.travel_length, result.time / 60))
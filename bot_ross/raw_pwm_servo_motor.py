@@ -1,15 +1,23 @@
-import RPi.GPIO as GPIO
+import gpio_backend
 import time
 import sys
 
 
 class RawPWMServoMotor():
-    def __init__(self, pin):
+    def __init__(self, pin, gpio=None):
+        """
+        Arguments:
+            pin {int} -- the GPIO.BCM channel the servo's signal is wired to
+
+        Keyword Arguments:
+            gpio {module} -- the GPIO backend to drive the pin with (default: {gpio_backend.default()})
+        """
         self._pin = pin
         self._speed = 0
         self._step = 0
-        GPIO.setmode(GPIO.BCM)
-        GPIO.setup(pin, GPIO.OUT)
+        self._gpio = gpio or gpio_backend.default()
+        self._gpio.setmode(self._gpio.BCM)
+        self._gpio.setup(pin, self._gpio.OUT)
 
     def set_speed(self, val):
         self._speed = val
@@ -23,9 +31,9 @@ class RawPWMServoMotor():
         on_time = (self._speed + 1) * MS
         off_time = period - on_time
 
-        GPIO.output(self._pin, GPIO.HIGH)
+        self._gpio.output(self._pin, self._gpio.HIGH)
         time.sleep(on_time)
-        GPIO.output(self._pin, GPIO.LOW)
+        self._gpio.output(self._pin, self._gpio.LOW)
         time.sleep(off_time)
 
 
@@ -44,4 +52,4 @@ if __name__ == '__main__':
         while True:
             motor.update()
     except KeyboardInterrupt:
-        GPIO.cleanup()
+        motor._gpio.cleanup()
@@ -9,9 +9,18 @@ class ServoMotor():
     - Software guide: https://learn.sparkfun.com/tutorials/pi-servo-hat-hookup-guide#software---python
     """
 
-    def __init__(self, bus, addr):
+    def __init__(self, bus, addr, trace=None):
+        """
+        Arguments:
+            bus {SMBus} -- the i2c bus the HAT is on
+            addr {int} -- the HAT's address on the bus
+
+        Keyword Arguments:
+            trace {JogTrace} -- stamps the first write for each jog command, or None to not trace (default: {None})
+        """
         self._bus = bus
         self.addr = addr
+        self._trace = trace
         self._configure()
 
     def _configure(self):
@@ -50,6 +59,8 @@ class ServoMotor():
 
         self._bus.write_word_data(self.addr, on_addr, on_time)  # Set the ON time
         self._bus.write_word_data(self.addr, off_addr, off_time)  # Set the OFF time
+        if self._trace is not None:
+            self._trace.step()
 
     def set_duty_cycle(self, channel, duty_cycle):
         """
@@ -0,0 +1,407 @@
+import argparse
+import struct
+import threading
+import time
+
+from collections import namedtuple
+from jog_trace import JogTrace, latency_percentiles
+
+# A session log is this header, then records of a kind byte and the microseconds since the last record, each
+# followed by the kind's payload. Controller states are sticks and triggers as fractions of 32767, the hat, and a
+# bitmask of the buttons held. G-code lines are a length and UTF-8 text.
+_MAGIC = b'BRSL'
+_VERSION = 1
+_HEADER = struct.Struct('<4sB')
+_RECORD = struct.Struct('<BI')
+_STATE = struct.Struct('<6h2bH')
+_LENGTH = struct.Struct('<H')
+_KIND_STATE = 1
+_KIND_GCODE = 2
+
+_FULL_SCALE = 32767
+_MAX_DELTA = 2 ** 32 - 1  # microseconds, a little over an hour
+_FLUSH_SIZE = 1 << 16  # bytes
+
+# The buttons in the bitmask, from the lowest bit
+BUTTONS = ['button_a', 'button_b', 'button_x', 'button_y', 'button_trigger_l', 'button_trigger_r',
+           'button_select', 'button_start', 'button_mode', 'button_thumb_l', 'button_thumb_r']
+
+# What the controller read at a time, in seconds since the recording started
+ControllerState = namedtuple('ControllerState', ['time', 'axis_l_x', 'axis_l_y', 'axis_r_x', 'axis_r_y',
+                                                 'trigger_l', 'trigger_r', 'hat_x', 'hat_y', 'buttons'])
+
+# A line of G-code sent at a time, in seconds since the recording started
+GcodeLine = namedtuple('GcodeLine', ['time', 'line'])
+
+# How a replay went: the lines sent and whether the callback refused one, how long it took in seconds, the lines sent
+# a second, and percentiles of how late each line was sent and how long the callback took for it
+ReplayResult = namedtuple('ReplayResult', ['lines', 'failed', 'elapsed', 'lines_per_second', 'lateness',
+                                           'callback'])
+
+
+def _scale(value):
+    return max(-_FULL_SCALE, min(_FULL_SCALE, int(round(value * _FULL_SCALE))))
+
+
+class SessionRecorder():
+    """
+    Records an XboxToGcode session, the controller's states and the G-code sent, into a compact binary log.
+
+    Records are packed into a buffer and written out in blocks, so recording costs XboxToGcode a struct pack and a
+    lock rather than a write. A state the same as the last one recorded is skipped.
+    """
+
+    def __init__(self, file, clock=time.monotonic):
+        """
+        Arguments:
+            file {file} -- where to write the log, opened in binary mode
+
+        Keyword Arguments:
+            clock {function} -- returns the time in seconds (default: {time.monotonic})
+        """
+        self._file = file
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._buffer = bytearray(_HEADER.pack(_MAGIC, _VERSION))
+        self._last_time = clock()
+        self._last_state = None
+        self.records = 0
+
+    def _append(self, kind, payload):
+        # Called with the lock held
+        now = self._clock()
+        delta = min(_MAX_DELTA, max(0, int(round((now - self._last_time) * 1e6))))
+        self._last_time += delta / 1e6
+        self._buffer += _RECORD.pack(kind, delta)
+        self._buffer += payload
+        self.records += 1
+        if len(self._buffer) >= _FLUSH_SIZE:
+            self._file.write(self._buffer)
+            del self._buffer[:]
+
+    def record_state(self, controller):
+        """
+        Record what a controller reads now
+
+        Arguments:
+            controller {Xbox360Controller} -- the controller
+        """
+        buttons = 0
+        for bit, name in enumerate(BUTTONS):
+            button = getattr(controller, name, None)
+            if button is not None and button.is_pressed:
+                buttons |= 1 << bit
+        payload = _STATE.pack(_scale(controller.axis_l.x), _scale(controller.axis_l.y),
+                              _scale(controller.axis_r.x), _scale(controller.axis_r.y),
+                              _scale(controller.trigger_l.value), _scale(controller.trigger_r.value),
+                              int(controller.hat.x), int(controller.hat.y), buttons)
+        with self._lock:
+            if payload != self._last_state:
+                self._last_state = payload
+                self._append(_KIND_STATE, payload)
+
+    def record_gcode(self, line):
+        """
+        Record a line of G-code being sent
+
+        Arguments:
+            line {str} -- the line
+        """
+        text = line.encode('utf-8')
+        with self._lock:
+            self._append(_KIND_GCODE, _LENGTH.pack(len(text)) + text)
+
+    def flush(self):
+        """
+        Write out the records buffered so far
+        """
+        with self._lock:
+            self._file.write(self._buffer)
+            del self._buffer[:]
+        self._file.flush()
+
+    def close(self):
+        """
+        Write out the records buffered so far and close the file
+        """
+        self.flush()
+        self._file.close()
+
+
+def read_session(file):
+    """
+    Read a session log
+
+    Arguments:
+        file {file} -- the log, opened in binary mode
+
+    Returns:
+        [ControllerState or GcodeLine] -- the records in the order they were recorded
+
+    Raises:
+        ValueError -- if the file is not a session log, or is cut short
+    """
+    data = file.read()
+    if len(data) < _HEADER.size:
+        raise ValueError('not a session log')
+    magic, version = _HEADER.unpack_from(data)
+    if magic != _MAGIC or version != _VERSION:
+        raise ValueError('not a version {} session log'.format(_VERSION))
+
+    records = []
+    offset = _HEADER.size
+    microseconds = 0
+    try:
+        while offset < len(data):
+            kind, delta = _RECORD.unpack_from(data, offset)
+            offset += _RECORD.size
+            microseconds += delta
+            seconds = microseconds / 1e6
+            if kind == _KIND_STATE:
+                values = _STATE.unpack_from(data, offset)
+                offset += _STATE.size
+                records.append(ControllerState(seconds, *([v / _FULL_SCALE for v in values[:6]] + list(values[6:]))))
+            elif kind == _KIND_GCODE:
+                length, = _LENGTH.unpack_from(data, offset)
+                offset += _LENGTH.size
+                if offset + length > len(data):
+                    raise struct.error('line cut short')
+                records.append(GcodeLine(seconds, data[offset:offset + length].decode('utf-8')))
+                offset += length
+            else:
+                raise ValueError('unknown record kind {} at byte {}'.format(kind, offset - _RECORD.size))
+    except struct.error:
+        raise ValueError('session log cut short at byte {}'.format(offset))
+    return records
+
+
+def replay(records, callback, speed=1.0, trace=None, clock=time.perf_counter, sleep=time.sleep):
+    """
+    Send a session's G-code to a callback again, with the timing it was recorded with
+
+    Arguments:
+        records {iterable of ControllerState or GcodeLine} -- the session, for example from read_session. Only the
+            lines are sent: see replay_controller to play the controller's states instead.
+        callback {function} -- takes a line of G-code and returns True iff it succeeded, like XboxToGcode's callback
+
+    Keyword Arguments:
+        speed {float} -- how many times faster than recorded to send the lines, or None to send them as fast as the
+            callback takes them (default: {1.0})
+        trace {JogTrace} -- stamps each line as a command, like XboxToGcode does, or None to not trace
+            (default: {None})
+        clock {function} -- returns the time in seconds (default: {time.perf_counter})
+        sleep {function} -- sleeps for a number of seconds (default: {time.sleep})
+
+    Returns:
+        ReplayResult -- how the replay went. It stops at the first line the callback refuses.
+
+    Raises:
+        ValueError -- if speed is not positive
+    """
+    if speed is not None and speed <= 0:
+        raise ValueError('speed must be positive, or None for as fast as possible')
+    lateness = []
+    durations = []
+    failed = False
+    start = clock()
+    for record in records:
+        if not isinstance(record, GcodeLine):
+            continue
+        if speed is not None:
+            due = start + record.time / speed
+            wait = due - clock()
+            if wait > 0:
+                sleep(wait)
+            lateness.append(max(0.0, clock() - due))
+
+        sent = clock()
+        command_id = None if trace is None else trace.command()
+        success = callback(record.line)
+        if trace is not None:
+            trace.sent(command_id)
+        durations.append(clock() - sent)
+        if not success:
+            failed = True
+            break
+
+    elapsed = clock() - start
+    return ReplayResult(len(durations), failed, elapsed, len(durations) / elapsed if elapsed > 0 else 0.0,
+                        latency_percentiles(lateness), latency_percentiles(durations))
+
+
+class _Control():
+    """
+    A stick, trigger, hat or button of a ReplayController, with the attributes of xbox360controller's
+    """
+
+    def __init__(self):
+        self.x = self.y = 0
+        self.value = 0
+        self.is_pressed = False
+        self.when_moved = self.when_pressed = self.when_released = None
+
+
+class ReplayController():
+    """
+    Stands in for an Xbox360Controller, so XboxToGcode can read a recorded session's controller states as if someone
+    were holding the controller again.
+    """
+
+    def __init__(self):
+        self.axis_l = _Control()
+        self.axis_r = _Control()
+        self.trigger_l = _Control()
+        self.trigger_r = _Control()
+        self.hat = _Control()
+        for name in BUTTONS:
+            setattr(self, name, _Control())
+        self.led = None
+
+    def set_led(self, mode):
+        self.led = mode
+
+    def close(self):
+        pass
+
+    def apply(self, state):
+        """
+        Move the sticks and buttons to a recorded state, calling the callbacks of the ones that changed, as the
+        controller's own thread would
+
+        Arguments:
+            state {ControllerState} -- the state
+        """
+        changed = []
+        for control, x, y in ((self.axis_l, state.axis_l_x, state.axis_l_y), (self.axis_r, state.axis_r_x,
+                              state.axis_r_y), (self.hat, state.hat_x, state.hat_y)):
+            if (control.x, control.y) != (x, y):
+                control.x, control.y = x, y
+                changed.append((control, control.when_moved))
+        for control, value in ((self.trigger_l, state.trigger_l), (self.trigger_r, state.trigger_r)):
+            if control.value != value:
+                control.value = value
+                changed.append((control, control.when_moved))
+        for bit, name in enumerate(BUTTONS):
+            button = getattr(self, name)
+            pressed = bool(state.buttons >> bit & 1)
+            if button.is_pressed != pressed:
+                button.is_pressed = pressed
+                changed.append((button, button.when_pressed if pressed else button.when_released))
+        for control, callback in changed:
+            if callback is not None:
+                callback(control)
+
+
+def replay_controller(records, callback, speed=1.0, trace=None, **options):
+    """
+    Play a session's controller states through XboxToGcode again, with the timing they were recorded with, so the
+    G-code sent comes from XboxToGcode's input path rather than the log. XboxToGcode runs in real time, so this does
+    too.
+
+    Arguments:
+        records {iterable of ControllerState or GcodeLine} -- the session, for example from read_session. Only the
+            states are played.
+        callback {function} -- takes a line of G-code and returns True iff it succeeded, like XboxToGcode's callback
+
+    Keyword Arguments:
+        speed {float} -- how many times faster than recorded to play the states (default: {1.0})
+        trace {JogTrace} -- passed to XboxToGcode, to stamp each state and line, or None to not trace
+            (default: {None})
+        options -- passed to XboxToGcode, like rate and event_driven
+
+    Returns:
+        ReplayResult -- how the replay went, with how late each state was played as the lateness. It stops at the
+            first line the callback refuses, or once the last state has been played.
+
+    Raises:
+        ValueError -- if speed is not positive
+    """
+    if speed is None or speed <= 0:
+        raise ValueError('speed must be positive')
+    from xbox_to_gcode import XboxToGcode  # needs the xbox360controller package
+
+    durations = []
+    failed = []
+    started = threading.Event()
+    stopped = threading.Event()
+
+    def send(line):
+        sent = time.perf_counter()
+        success = callback(line)
+        durations.append(time.perf_counter() - sent)
+        if not success:
+            failed.append(line)
+        started.set()
+        return success
+
+    controller = ReplayController()
+    generator = XboxToGcode(send, controller=controller, trace=trace, **options)
+
+    def run():
+        try:
+            generator.run()
+        finally:
+            started.set()
+            stopped.set()
+
+    thread = threading.Thread(target=run, name='session replay', daemon=True)
+    thread.start()
+    # XboxToGcode sends its first line once it is listening to the controller
+    started.wait()
+    lateness = []
+    start = time.perf_counter()
+    for record in records:
+        if not isinstance(record, ControllerState):
+            continue
+        due = start + record.time / speed
+        # XboxToGcode stops by itself when a line is refused
+        if stopped.wait(max(0.0, due - time.perf_counter())):
+            break
+        lateness.append(max(0.0, time.perf_counter() - due))
+        controller.apply(record)
+    generator.stop()
+    thread.join()
+
+    elapsed = time.perf_counter() - start
+    return ReplayResult(len(durations), bool(failed), elapsed, len(durations) / elapsed if elapsed > 0 else 0.0,
+                        latency_percentiles(lateness), latency_percentiles(durations))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='replay a recorded jog session as a benchmark')
+    parser.add_argument('path', help='the session log, recorded with xbox_to_gcode.py --record')
+    speed = parser.add_mutually_exclusive_group()
+    speed.add_argument('--speed', type=float, default=1.0, help='how many times faster than recorded to replay')
+    speed.add_argument('--fast', action='store_true', help='replay as fast as the machine takes the lines')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='only time the replay itself, instead of running the lines on a simulated machine')
+    parser.add_argument('--controller', action='store_true',
+                        help='play the controller states through XboxToGcode instead of sending the recorded lines')
+    parser.add_argument('--event-driven', action='store_true', help='with --controller, run XboxToGcode event-driven')
+    args = parser.parse_args()
+    if args.speed <= 0:
+        parser.error('--speed must be positive')
+    if args.controller and args.fast:
+        parser.error('--controller plays the states in time, so it takes --speed rather than --fast')
+
+    with open(args.path, 'rb') as f:
+        session = read_session(f)
+    trace = JogTrace(capacity=max(1, len(session)))
+    if args.dry_run:
+        def do_line(line):
+            return True
+    else:
+        from gcode import GcodeExecutor
+        from simulated_hardware import SimulatedMachine
+        do_line = GcodeExecutor(SimulatedMachine(trace=trace).cnc).do_line
+
+    if args.controller:
+        result = replay_controller(session, do_line, args.speed, trace=trace, event_driven=args.event_driven)
+    else:
+        result = replay(session, do_line, None if args.fast else args.speed, trace=trace)
+    print('{} lines in {:.2f} s, {:.0f} lines/second{}'.format(
+        result.lines, result.elapsed, result.lines_per_second, ' (stopped at a refused line)' if result.failed else ''))
+    for name, latency in (('late', result.lateness), ('callback', result.callback),
+                          ('to first step', trace.snapshot().motion)):
+        print('{:<14} p50 {:8.3f} ms  p95 {:8.3f} ms  p99 {:8.3f} ms  max {:8.3f} ms'.format(
+            name, *(1000 * value for value in latency)))
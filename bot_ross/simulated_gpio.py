@@ -0,0 +1,194 @@
+from array import array
+
+
+class SimulatedShaft():
+    """
+    The physical position of a simulated stepper motor, worked out from the phases written to its pins. Unlike
+    StepperMotor._pos, it is not reset by zeroing, so it can drive limit switches.
+    """
+
+    def __init__(self, pins, sequence, position=0, phase=None):
+        """
+        Arguments:
+            pins {(int, int, int, int)} -- the motor's out1 through out4 channels
+            sequence {(int)} -- the pin bitmask of each phase of the motor's step cycle
+
+        Keyword Arguments:
+            position {int} -- where the shaft starts, in steps (default: {0})
+            phase {int} -- the phase the shaft starts in, or None to start counting from the first write
+                (default: {None})
+        """
+        self.pins = pins
+        self.position = position
+        self._phases = {mask: i for i, mask in enumerate(sequence)}
+        self._phase = phase
+
+    def update(self, levels):
+        """
+        Follow a write to the pins
+
+        Arguments:
+            levels {dict} -- the level of every channel after the write
+        """
+        mask = 0
+        for bit, pin in enumerate(self.pins):
+            if levels.get(pin):
+                mask |= 1 << bit
+        phase = self._phases.get(mask)
+        if phase is None:
+            return
+        if self._phase is not None:
+            # Take the shortest way around the cycle, which is the only way a real motor can follow
+            count = len(self._phases)
+            self.position += (phase - self._phase + count // 2) % count - count // 2
+        self._phase = phase
+
+
+class SimulatedGPIO():
+    """
+    A stand-in for the parts of RPi.GPIO that BotRoss uses, for running drivers off of a Raspberry Pi.
+
+    Output levels are kept per channel and every call to output counts as one write, so benchmarks can compare how
+    many GPIO calls each code path makes. Given a clock, every change in level is also recorded compactly as parallel
+    arrays of time, channel, and level, skipping writes that leave a channel unchanged.
+
+    Inputs can be wired to limit switches that close based on the position of a simulated stepper motor shaft.
+    Event detection callbacks run synchronously on the thread that caused the edge, either by moving a shaft or by
+    calling set_input.
+    """
+
+    BCM = 11
+    BOARD = 10
+    OUT = 0
+    IN = 1
+    LOW = 0
+    HIGH = 1
+    FALLING = 32
+    RISING = 31
+    BOTH = 33
+
+    def __init__(self, clock=None):
+        """
+        Keyword Arguments:
+            clock {function} -- returns the current time, for recording changes in level. If None, changes are not
+                recorded. (default: {None})
+        """
+        self.mode = None
+        self.levels = {}
+        self.writes = 0
+        self._clock = clock
+        self.change_times = array('d')
+        self.change_channels = array('h')
+        self.change_levels = array('B')
+        self._shafts = []
+        self._switches = {}
+        self._event_callbacks = {}  # {channel: (edge, callback, last level)}
+
+    def setmode(self, mode):
+        self.mode = mode
+
+    def setup(self, channel, direction):
+        self.levels.setdefault(channel, self.LOW)
+
+    def output(self, channels, values):
+        """
+        Set the level of one or more channels, mirroring RPi.GPIO.output
+
+        Arguments:
+            channels {int or [int]} -- the channel, or a list/tuple of channels
+            values {int or [int]} -- the level, or a list/tuple with one level per channel
+        """
+        self.writes += 1
+        if not isinstance(channels, (list, tuple)):
+            channels, values = (channels,), (values,)
+
+        levels = self.levels
+        for channel, value in zip(channels, values):
+            if self._clock and levels.get(channel) != value:
+                self.change_times.append(self._clock())
+                self.change_channels.append(channel)
+                self.change_levels.append(value)
+            levels[channel] = value
+
+        moved = False
+        for shaft in self._shafts:
+            if any(channel in shaft.pins for channel in channels):
+                shaft.update(levels)
+                moved = True
+        if moved and self._event_callbacks:
+            self._detect_events()
+
+    def input(self, channel):
+        if channel in self._switches:
+            return self.HIGH if self._switches[channel]() else self.LOW
+        return self.levels.get(channel, self.LOW)
+
+    def set_input(self, channel, level):
+        """
+        Drive an input that is not wired to a limit switch, as though something outside had changed it
+        """
+        self.levels[channel] = level
+        self._detect_events()
+
+    def add_event_detect(self, channel, edge, callback=None, bouncetime=None):
+        """
+        Call a function when an input changes, mirroring RPi.GPIO.add_event_detect. bouncetime is accepted but not
+        simulated, since simulated inputs do not bounce.
+        """
+        self._event_callbacks[channel] = (edge, callback, self.input(channel))
+
+    def remove_event_detect(self, channel):
+        self._event_callbacks.pop(channel, None)
+
+    def _detect_events(self):
+        for channel, (edge, callback, last_level) in list(self._event_callbacks.items()):
+            level = self.input(channel)
+            if level == last_level:
+                continue
+            self._event_callbacks[channel] = (edge, callback, level)
+            if edge == self.BOTH or (edge == self.RISING) == (level == self.HIGH):
+                callback(channel)
+
+    def cleanup(self):
+        self.levels.clear()
+        self._event_callbacks.clear()
+
+    def add_shaft(self, pins, sequence, position=0, phase=None):
+        """
+        Simulate the shaft of a stepper motor wired to some pins
+
+        Arguments:
+            pins {(int, int, int, int)} -- the motor's out1 through out4 channels
+            sequence {(int)} -- the pin bitmask of each phase of the motor's step cycle
+
+        Keyword Arguments:
+            position {int} -- where the shaft starts, in steps (default: {0})
+            phase {int} -- the phase the shaft starts in (default: {None})
+
+        Returns:
+            SimulatedShaft -- the shaft, whose position follows what is written to the pins
+        """
+        shaft = SimulatedShaft(pins, sequence, position, phase)
+        self._shafts.append(shaft)
+        return shaft
+
+    def add_limit_switch(self, channel, is_pressed):
+        """
+        Wire an input to a simulated switch
+
+        Arguments:
+            channel {int} -- the input channel
+            is_pressed {function} -- returns True iff the switch is pressed, for example
+                lambda: shaft.position <= 0
+        """
+        self._switches[channel] = is_pressed
+
+    def transitions(self, channel):
+        """
+        Get the recorded changes in level of a channel
+
+        Returns:
+            [(float, int)] -- the time and new level of each change
+        """
+        return [(t, level) for t, c, level in zip(self.change_times, self.change_channels, self.change_levels)
+                if c == channel]
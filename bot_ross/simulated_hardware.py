@@ -0,0 +1,134 @@
+import defines
+import heapq
+
+from brush_cnc import BrushCNC
+from simulated_gpio import SimulatedGPIO
+from step_scheduler import ScheduledCallback, StepScheduler
+
+
+class VirtualClock():
+    """
+    A clock that only moves when told to. Call it to get the time, like time.monotonic.
+    """
+
+    def __init__(self, start=0.0):
+        self.time = start
+
+    def __call__(self):
+        return self.time
+
+    def advance_to(self, time):
+        self.time = max(self.time, time)
+
+
+class SimulatedStepScheduler(StepScheduler):
+    """
+    A StepScheduler that runs on a VirtualClock without a thread.
+
+    Nothing happens in the background: callbacks run when the calling thread sleeps or waits on this scheduler, and
+    the clock jumps straight to each deadline instead of waiting for it, so motion runs as fast as Python can step.
+    Because of that, waiting on a move must go through wait (as StepperMotor.wait_until_complete does) rather than
+    asyncio or a second thread.
+    """
+
+    def __init__(self, clock=None):
+        """
+        Keyword Arguments:
+            clock {VirtualClock} -- the clock to advance (default: a new VirtualClock starting at 0)
+        """
+        self.clock = clock or VirtualClock()
+        super().__init__(self.clock)
+
+    def schedule(self, callback, deadline, future=None):
+        handle = ScheduledCallback(callback, future)
+        self._push(deadline, handle)
+        return handle
+
+    def cancel(self, handle):
+        handle.cancelled = True
+
+    def sleep(self, seconds):
+        end = self.now() + seconds
+        while self._run_next(end):
+            pass
+        self.clock.advance_to(end)
+
+    def wait(self, future, timeout=None):
+        end = None if timeout is None else self.now() + timeout
+        while not future.done() and self._run_next(end):
+            pass
+        if not future.done() and end is not None:
+            self.clock.advance_to(end)
+        return future.done()
+
+    def run_until_idle(self):
+        """
+        Run callbacks until none are left
+        """
+        while self._run_next(None):
+            pass
+
+    def _run_next(self, end):
+        """
+        Run the earliest callback, moving the clock up to its deadline
+
+        Arguments:
+            end {float} -- don't run callbacks due after this time, or None for no limit
+
+        Returns:
+            bool -- True iff a callback ran
+        """
+        while self._queue and self._queue[0][2].cancelled:
+            heapq.heappop(self._queue)
+        if not self._queue or (end is not None and self._queue[0][0] > end):
+            return False
+
+        deadline, _, handle = heapq.heappop(self._queue)
+        self.clock.advance_to(deadline)
+        next_deadline = self._call(handle, deadline)
+        if next_deadline is not None and not handle.cancelled:
+            self._push(next_deadline, handle)
+        return True
+
+
+class SimulatedMachine():
+    """
+    A BrushCNC wired to simulated hardware: a SimulatedGPIO recording every pin change on a virtual clock, a shaft for
+    each motor, and limit switches that close when an axis reaches its physical home at shaft position 0.
+    """
+
+    def __init__(self, start_position=(0, 0, 0), trace=None, telemetry=None):
+        """
+        Keyword Arguments:
+            start_position {(int, int, int)} -- where the x, y and z shafts start, in steps from home
+                (default: {(0, 0, 0)})
+            trace {JogTrace} -- stamps the first step of each jog command, or None to not trace (default: {None})
+            telemetry {StepTelemetry} -- records how late each step is, or None to not record (default: {None})
+        """
+        self.scheduler = SimulatedStepScheduler()
+        self.clock = self.scheduler.clock
+        self.gpio = SimulatedGPIO(clock=self.clock)
+        self.cnc = BrushCNC(gpio=self.gpio, scheduler=self.scheduler, trace=trace, telemetry=telemetry)
+
+        x, y, z = start_position
+        self.shaft_x = self._add_shaft(self.cnc._stepper_x, x)
+        stepper_y = self.cnc._stepper_y
+        self.shaft_y_left = self.gpio.add_shaft(stepper_y.side_outs(0), stepper_y._side_sequence, y,
+                                                phase=stepper_y.side_phase(0))
+        self.shaft_y_right = self.gpio.add_shaft(stepper_y.side_outs(1), stepper_y._side_sequence, y,
+                                                 phase=stepper_y.side_phase(1))
+        self.shaft_z = self._add_shaft(self.cnc._stepper_z, z)
+
+        self.gpio.add_limit_switch(defines.SWITCH_RESET_X, lambda: self.shaft_x.position <= 0)
+        self.gpio.add_limit_switch(defines.SWITCH_RESET_Y, lambda: self.shaft_y_left.position <= 0)
+        self.gpio.add_limit_switch(defines.SWITCH_RESET_Z, lambda: self.shaft_z.position <= 0)
+
+    def _add_shaft(self, motor, position):
+        return self.gpio.add_shaft(motor._outs, motor._sequence, position, phase=motor._i)
+
+    def physical_position(self):
+        """
+        Returns:
+            (int, int, int) -- where the x, y and z shafts actually are, in steps from home
+        """
+        return self.shaft_x.position, self.shaft_y_left.position, self.shaft_z.position
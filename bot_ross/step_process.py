@@ -0,0 +1,375 @@
+import ctypes
+import logging
+import multiprocessing
+import os
+import threading
+import time
+
+from concurrent import futures
+from move_futures import finished_future, wait_for_latest
+from step_scheduler import StepScheduler
+from stepper_motor import StepperMotor
+
+
+logger = logging.getLogger(__name__)
+
+# Command kinds
+_MOVE = 1
+_MOVE_ABSOLUTE = 2
+_ZERO = 3
+_EXIT = 4
+
+# How long each side sleeps between polls of the shared memory
+_POLL_INTERVAL = .0005  # seconds
+
+
+class _Command(ctypes.Structure):
+    _fields_ = [
+        ('seq', ctypes.c_uint64),  # written last, so the reader can tell the record is complete
+        ('kind', ctypes.c_int32),
+        ('motor', ctypes.c_int32),
+        ('move_id', ctypes.c_uint64),
+        ('frequency', ctypes.c_double),
+        ('goal', ctypes.c_int64),
+        ('acceleration', ctypes.c_double),
+        ('jerk', ctypes.c_double)
+    ]
+
+
+class CommandRing():
+    """
+    A single-producer, single-consumer ring buffer of commands in shared memory.
+
+    There are no locks: only the producer writes head and only the consumer writes tail. CPython gives no memory
+    ordering guarantees between processes, so each record also carries a sequence number that is written after the rest
+    of the record, and the consumer does not read a slot until its sequence number matches.
+    """
+
+    def __init__(self, capacity=64):
+        self._capacity = capacity
+        self._records = multiprocessing.RawArray(_Command, capacity)
+        self._head = multiprocessing.RawValue(ctypes.c_uint64, 0)  # number of records ever pushed
+        self._tail = multiprocessing.RawValue(ctypes.c_uint64, 0)  # number of records ever popped
+
+    def push(self, kind, motor=0, move_id=0, frequency=0.0, goal=0, acceleration=0.0, jerk=0.0):
+        """
+        Add a command, waiting for space if the ring is full. Only call this from the producer.
+        """
+        head = self._head.value
+        while head - self._tail.value >= self._capacity:
+            time.sleep(_POLL_INTERVAL)
+
+        record = self._records[head % self._capacity]
+        record.kind = kind
+        record.motor = motor
+        record.move_id = move_id
+        record.frequency = frequency
+        record.goal = goal
+        record.acceleration = acceleration
+        record.jerk = jerk
+        record.seq = head + 1
+        self._head.value = head + 1
+
+    def pop(self):
+        """
+        Take the oldest command. Only call this from the consumer.
+
+        Returns:
+            _Command -- a copy of the command, or None if the ring is empty
+        """
+        tail = self._tail.value
+        if tail == self._head.value:
+            return None
+        record = self._records[tail % self._capacity]
+        if record.seq != tail + 1:
+            return None
+        command = _Command.from_buffer_copy(record)
+        self._tail.value = tail + 1
+        return command
+
+
+def _set_realtime(cpu, priority):
+    """
+    Pin the current process to a core and give it real-time scheduling priority, as far as the OS allows
+
+    Arguments:
+        cpu {int} -- the core to pin to, or None to leave it alone
+        priority {int} -- the SCHED_FIFO priority, or None to leave it alone
+
+    Returns:
+        (bool, bool) -- whether pinning and real-time priority succeeded
+    """
+    pinned = False
+    if cpu is not None:
+        try:
+            os.sched_setaffinity(0, {cpu})
+            pinned = True
+        except (AttributeError, OSError) as e:
+            logger.warning('could not pin the step generator to cpu %s: %s', cpu, e)
+
+    prioritized = False
+    if priority is not None:
+        try:
+            os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(priority))
+            prioritized = True
+        except (AttributeError, OSError) as e:
+            logger.warning('could not give the step generator real-time priority: %s', e)
+
+    return pinned, prioritized
+
+
+def _run_step_generator(motor_pins, commands, positions, completed, taken, realtime, gpio_factory, cpu, priority):
+    """
+    The body of the step generator process. Runs the motors until told to exit.
+    """
+    realtime[0], realtime[1] = _set_realtime(cpu, priority)
+
+    gpio = gpio_factory() if gpio_factory else None
+    scheduler = StepScheduler()
+    motors = [StepperMotor(*pins, scheduler=scheduler, gpio=gpio) for pins in motor_pins]
+    move_ids = [0] * len(motors)
+    last_taken = 0
+
+    while True:
+        command = commands.pop()
+        while command:
+            if command.kind == _EXIT:
+                for motor in motors:
+                    motor.set_stepper(0, 0)
+                return
+
+            motor = motors[command.motor]
+            if command.kind == _MOVE:
+                motor.set_stepper(command.frequency, command.goal, acceleration=command.acceleration,
+                                  jerk=command.jerk)
+            elif command.kind == _MOVE_ABSOLUTE:
+                motor.set_stepper_absolute(command.frequency, command.goal, acceleration=command.acceleration,
+                                           jerk=command.jerk)
+            elif command.kind == _ZERO:
+                motor.zero()
+            # Like StepperMotor.zero, zeroing does not stop the motor's move, so the move is still the one to finish
+            if command.kind != _ZERO:
+                move_ids[command.motor] = command.move_id
+            last_taken = command.move_id
+            command = commands.pop()
+
+        for i, motor in enumerate(motors):
+            positions[i] = motor._pos
+            if motor._is_complete:
+                completed[i] = move_ids[i]
+        taken.value = last_taken
+        time.sleep(_POLL_INTERVAL)
+
+
+class StepGeneratorProcess():
+    """
+    Run stepper motors from a child process, so the rest of the program's garbage collection and callbacks holding the
+    GIL do not delay steps.
+
+    Commands go to the child through a CommandRing, and the child publishes each motor's position, the id of the last
+    move it finished for each motor, and the id of the last command it took into shared memory. The child is
+    optionally pinned to a core and given SCHED_FIFO priority; if the OS refuses, it logs a warning and runs normally.
+
+    While any command is unfinished, a thread in this process watches the shared memory and finishes each command's
+    future. If the child dies, the futures of the unfinished commands fail with a RuntimeError.
+    """
+
+    def __init__(self, motor_pins, gpio_factory=None, cpu=None, priority=None, capacity=64):
+        """
+        Arguments:
+            motor_pins {[(int, int, int, int)]} -- the four GPIO.BCM channels of each motor
+
+        Keyword Arguments:
+            gpio_factory {function} -- creates the GPIO module in the child process, for example SimulatedGPIO. It must
+                be picklable. (default: the child's gpio_backend.default())
+            cpu {int} -- the core to pin the child to (default: {None})
+            priority {int} -- the SCHED_FIFO priority for the child, from 1 to 99 (default: {None})
+            capacity {int} -- the number of commands that can be queued (default: {64})
+        """
+        self._commands = CommandRing(capacity)
+        self._positions = multiprocessing.RawArray(ctypes.c_int64, len(motor_pins))
+        self._completed = multiprocessing.RawArray(ctypes.c_uint64, len(motor_pins))
+        self._taken = multiprocessing.RawValue(ctypes.c_uint64, 0)
+        self._realtime = multiprocessing.RawArray(ctypes.c_bool, 2)
+        self._submitted = [0] * len(motor_pins)
+        self._next_move_id = 1
+        self._futures = [finished_future(0) for _ in motor_pins]  # of each motor's last move
+        self._zeros = []  # of (command id, motor, future) for the zero commands the child has not taken yet
+        self._condition = threading.Condition()  # guards the futures, and wakes the watcher when one is added
+        self._stopping = False
+        self._watcher = threading.Thread(target=self._watch, name='StepGeneratorWatcher', daemon=True)
+        self._process = multiprocessing.Process(
+            target=_run_step_generator,
+            args=(motor_pins, self._commands, self._positions, self._completed, self._taken, self._realtime,
+                  gpio_factory, cpu, priority),
+            name='StepGenerator',
+            daemon=True
+        )
+        self.motors = [RemoteStepperMotor(self, i) for i in range(len(motor_pins))]
+
+    def start(self):
+        self._process.start()
+        self._watcher.start()
+
+    def stop(self):
+        """
+        Stop every motor and wait for the child process to exit. Unfinished moves are cancelled.
+        """
+        self._stopping = True
+        self._commands.push(_EXIT)
+        self._process.join()
+        with self._condition:
+            self._condition.notify()
+        self._watcher.join()
+
+    def is_pinned(self):
+        return self._realtime[0]
+
+    def is_realtime(self):
+        return self._realtime[1]
+
+    # Scheduler-like methods, for wait_for_latest
+    def now(self):
+        return time.monotonic()
+
+    def wait(self, future, timeout=None):
+        futures.wait([future], timeout)
+        return future.done()
+
+    def _submit(self, kind, motor, frequency=0.0, goal=0, acceleration=None, jerk=None):
+        """
+        Returns:
+            Future -- resolves to the motor's position when the child has run the command, is cancelled if another
+                move for the motor replaces it first, or fails with a RuntimeError if the child dies first. A zero
+                command is run as soon as the child takes it, and does not replace the motor's move.
+        """
+        move_id = self._next_move_id
+        self._next_move_id += 1
+        future = futures.Future()
+        with self._condition:
+            if kind == _ZERO:
+                self._zeros.append((move_id, motor, future))
+            else:
+                self._futures[motor].cancel()
+                self._futures[motor] = future
+                self._submitted[motor] = move_id
+            self._condition.notify()
+        if self._process.exitcode is not None:
+            # Nothing would ever take the command, and pushing it could wait forever for room in the ring
+            future.set_exception(self._exited())
+            return future
+        self._commands.push(kind, motor, move_id, frequency, goal, acceleration or 0.0, jerk or 0.0)
+        return future
+
+    def _exited(self):
+        return RuntimeError('the step generator process exited with code {}'.format(self._process.exitcode))
+
+    def _future(self, motor):
+        return self._futures[motor]
+
+    def _position(self, motor):
+        return self._positions[motor]
+
+    def _is_complete(self, motor):
+        return self._completed[motor] >= self._submitted[motor]
+
+    def _watch(self):
+        """
+        Finish the futures of the moves the child finishes and the zero commands it takes, until it exits. Runs on
+        the watcher thread.
+        """
+        while True:
+            # Check that the child is alive before reading what it finished, so nothing it finished before dying is
+            # counted as failed
+            alive = self._process.is_alive()
+            with self._condition:
+                taken = self._taken.value
+                for move_id, motor, future in self._zeros:
+                    if future.done():
+                        continue
+                    if move_id <= taken:
+                        future.set_result(self._positions[motor])
+                    elif not alive and self._stopping:
+                        future.cancel()
+                    elif not alive:
+                        future.set_exception(self._exited())
+                self._zeros = [zero for zero in self._zeros if not zero[2].done()]
+                pending = bool(self._zeros)
+                for motor, future in enumerate(self._futures):
+                    if future.done():
+                        continue
+                    if self._is_complete(motor):
+                        future.set_result(self._positions[motor])
+                    elif not alive and self._stopping:
+                        future.cancel()
+                    elif not alive:
+                        future.set_exception(self._exited())
+                    else:
+                        pending = True
+                if not alive:
+                    return
+                if not pending and not self._stopping:
+                    self._condition.wait()
+                    continue
+            time.sleep(_POLL_INTERVAL)
+
+
+class RemoteStepperMotor():
+    """
+    A stand-in for a StepperMotor that runs in a StepGeneratorProcess. It has the same methods for moving and waiting,
+    and its moves return futures in the same way.
+    """
+
+    def __init__(self, process, index):
+        self._process = process
+        self._index = index
+
+    @property
+    def _pos(self):
+        # Named like StepperMotor's attribute so this can be used in its place
+        return self._process._position(self._index)
+
+    def set_stepper(self, frequency, goal, wait=False, acceleration=None, jerk=None):
+        """
+        See StepperMotor.set_stepper. The future also fails with a RuntimeError if the child process dies first.
+        """
+        future = self._process._submit(_MOVE, self._index, frequency, goal, acceleration, jerk)
+        if wait:
+            self.wait_until_complete()
+        return future
+
+    def set_stepper_absolute(self, frequency, setpoint, wait=False, acceleration=None, jerk=None):
+        """
+        See StepperMotor.set_stepper_absolute. The position is read in the child process, so it is not stale.
+        """
+        future = self._process._submit(_MOVE_ABSOLUTE, self._index, frequency, setpoint, acceleration, jerk)
+        if wait:
+            self.wait_until_complete()
+        return future
+
+    def zero(self):
+        """
+        See StepperMotor.zero. Like it, this does not stop the move the motor is running.
+
+        Raises:
+            RuntimeError -- if the child process died before zeroing the motor
+        """
+        future = self._process._submit(_ZERO, self._index)
+        self._process.wait(future)
+        future.result()
+
+    def wait_until_complete(self, timeout=None):
+        """
+        Block until the current move has finished or been stopped
+
+        Keyword Arguments:
+            timeout {float} -- the most seconds to wait, or None to wait forever (default: {None})
+
+        Raises:
+            concurrent.futures.TimeoutError -- if the timeout passes first
+            RuntimeError -- if the child process died before finishing the move
+        """
+        wait_for_latest(lambda: self._process._future(self._index), self._process, timeout)
+        future = self._process._future(self._index)
+        if not future.cancelled() and future.exception() is not None:
+            raise future.exception()
@@ -0,0 +1,176 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+
+from concurrent import futures
+
+logger = logging.getLogger(__name__)
+
+
+class ScheduledCallback():
+    """
+    A handle to a callback registered with a StepScheduler, used to cancel it
+    """
+
+    __slots__ = ('callback', 'cancelled', 'future')
+
+    def __init__(self, callback, future=None):
+        self.callback = callback
+        self.cancelled = False
+        self.future = future
+
+
+class StepScheduler():
+    """
+    Runs the steps of any number of stepper motors from one long-lived thread.
+
+    Callbacks are kept in a priority queue ordered by absolute deadline on a monotonic clock. Each callback is called
+    with the deadline it was scheduled for and returns the absolute deadline of its next call (or None to stop), so
+    periods are measured from when a step should have happened rather than from when it did, and lateness does not
+    accumulate into drift.
+
+    A callback that raises is logged and dropped, and the future it was scheduled with fails with the exception, so
+    the other callbacks keep running and whoever waits on the failed one wakes up.
+    """
+
+    _default = None
+    _default_lock = threading.Lock()
+
+    def __init__(self, clock=time.monotonic):
+        """
+        Keyword Arguments:
+            clock {function} -- returns the current time in seconds and never goes backwards
+                (default: {time.monotonic})
+        """
+        self._clock = clock
+        self._queue = []
+        self._counter = itertools.count()  # breaks ties between equal deadlines in the order they were scheduled
+        self._condition = threading.Condition()
+        self._dispatch_lock = threading.RLock()  # held while a callback runs so cancel can wait for it
+        self._thread = None
+
+    @classmethod
+    def default(cls):
+        """
+        Get the scheduler shared by every motor that is not given one explicitly
+        """
+        with cls._default_lock:
+            if cls._default is None:
+                cls._default = cls()
+            return cls._default
+
+    def now(self):
+        return self._clock()
+
+    def sleep(self, seconds):
+        """
+        Block the calling thread for a while, on this scheduler's clock
+        """
+        time.sleep(seconds)
+
+    def wait(self, future, timeout=None):
+        """
+        Block the calling thread until a future is done, on this scheduler's clock
+
+        Arguments:
+            future {Future} -- the future to wait for
+
+        Keyword Arguments:
+            timeout {float} -- the most seconds to wait, or None to wait forever (default: {None})
+
+        Returns:
+            bool -- True iff the future is done
+        """
+        futures.wait([future], timeout)
+        return future.done()
+
+    def schedule(self, callback, deadline, future=None):
+        """
+        Register a callback to be called at an absolute time
+
+        Arguments:
+            callback {function} -- called with the deadline it was scheduled for. Returns the absolute time it should
+                be called next, or None if it is done.
+            deadline {float} -- when to first call the callback, on this scheduler's clock
+
+        Keyword Arguments:
+            future {Future} -- fails with the exception if the callback raises one, like the future of the move the
+                callback steps (default: {None})
+
+        Returns:
+            ScheduledCallback -- a handle that can be passed to cancel
+        """
+        handle = ScheduledCallback(callback, future)
+        with self._condition:
+            self._push(deadline, handle)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='StepScheduler', daemon=True)
+                self._thread.start()
+            self._condition.notify()
+        return handle
+
+    def cancel(self, handle):
+        """
+        Stop calling a callback. If the callback is running on another thread, this waits for it to return, so no
+        more calls can happen once this returns.
+
+        Arguments:
+            handle {ScheduledCallback} -- the handle returned by schedule
+        """
+        with self._dispatch_lock:
+            handle.cancelled = True
+
+    def _push(self, deadline, handle):
+        heapq.heappush(self._queue, (deadline, next(self._counter), handle))
+
+    def _pop_due(self):
+        """
+        Block until the earliest callback is due, then remove it from the queue
+
+        Returns:
+            (float, ScheduledCallback) -- the deadline the callback was due at and its handle
+        """
+        with self._condition:
+            while True:
+                while self._queue and self._queue[0][2].cancelled:
+                    heapq.heappop(self._queue)
+                if not self._queue:
+                    self._condition.wait()
+                    continue
+
+                deadline = self._queue[0][0]
+                delay = deadline - self._clock()
+                if delay <= 0:
+                    _, _, handle = heapq.heappop(self._queue)
+                    return deadline, handle
+                self._condition.wait(delay)
+
+    def _call(self, handle, deadline):
+        """
+        Call a callback, dropping it if it raises
+
+        Returns:
+            float -- when to call it next, or None if it is done or failed
+        """
+        try:
+            return handle.callback(deadline)
+        except Exception as e:
+            logger.exception('dropping a step callback that failed')
+            handle.cancelled = True
+            if handle.future is not None and not handle.future.done():
+                handle.future.set_exception(e)
+            return None
+
+    def _run(self):
+        while True:
+            deadline, handle = self._pop_due()
+            with self._dispatch_lock:
+                if handle.cancelled:
+                    continue
+                next_deadline = self._call(handle, deadline)
+                if next_deadline is None or handle.cancelled:
+                    continue
+            with self._condition:
+                self._push(next_deadline, handle)
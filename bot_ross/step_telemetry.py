@@ -0,0 +1,103 @@
+from array import array
+from collections import namedtuple
+
+
+TelemetrySnapshot = namedtuple('TelemetrySnapshot', [
+    'steps',  # every step recorded since the telemetry was created
+    'missed_deadlines',  # how many of those were later than the late threshold
+    'step_rate',  # steps/second achieved over the steps still in the ring
+    'jitter_p50',  # seconds late, over the steps still in the ring
+    'jitter_p95',
+    'jitter_p99',
+    'jitter_max'
+])
+
+
+def percentile(sorted_values, fraction):
+    """
+    Get a percentile by the nearest-rank method
+
+    Arguments:
+        sorted_values {[float]} -- the values, in ascending order
+        fraction {float} -- the percentile as a fraction from 0 to 1
+
+    Returns:
+        float -- the value at that percentile, or 0 if there are no values
+    """
+    if not sorted_values:
+        return 0.0
+    rank = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[rank]
+
+
+class StepTelemetry():
+    """
+    Records when steps were scheduled and when they actually happened.
+
+    The stepping thread only writes into preallocated rings of the last capacity steps and bumps two counters, and
+    snapshot does all of the work of summarizing on the caller's thread without any locks. A snapshot taken while the
+    motor is stepping may include one step that is being overwritten.
+    """
+
+    def __init__(self, capacity=1024, late_threshold=.0005):
+        """
+        Keyword Arguments:
+            capacity {int} -- how many of the most recent steps to keep (default: {1024})
+            late_threshold {float} -- how many seconds after its deadline a step counts as a missed deadline
+                (default: {.0005})
+        """
+        self._capacity = capacity
+        self._late_threshold = late_threshold
+        self._scheduled = array('d', [0.0]) * capacity
+        self._actual = array('d', [0.0]) * capacity
+        self._steps = 0
+        self._missed_deadlines = 0
+
+    def record(self, scheduled, actual):
+        """
+        Record a step. Called from the stepping thread.
+
+        Arguments:
+            scheduled {float} -- when the step was due
+            actual {float} -- when it happened, on the same clock
+        """
+        index = self._steps % self._capacity
+        self._scheduled[index] = scheduled
+        self._actual[index] = actual
+        if actual - scheduled > self._late_threshold:
+            self._missed_deadlines += 1
+        self._steps += 1
+
+    def snapshot(self):
+        """
+        Summarize the steps recorded so far
+
+        Returns:
+            TelemetrySnapshot -- the counters, and the rate and jitter percentiles of the steps in the ring
+        """
+        steps = self._steps
+        missed_deadlines = self._missed_deadlines
+        scheduled = self._scheduled[:]
+        actual = self._actual[:]
+
+        count = min(steps, self._capacity)
+        if count < self._capacity:
+            scheduled = scheduled[:count]
+            actual = actual[:count]
+
+        jitters = sorted(a - s for s, a in zip(scheduled, actual))
+        step_rate = 0.0
+        if count > 1:
+            elapsed = max(actual) - min(actual)
+            if elapsed > 0:
+                step_rate = (count - 1) / elapsed
+
+        return TelemetrySnapshot(
+            steps=steps,
+            missed_deadlines=missed_deadlines,
+            step_rate=step_rate,
+            jitter_p50=percentile(jitters, .5),
+            jitter_p95=percentile(jitters, .95),
+            jitter_p99=percentile(jitters, .99),
+            jitter_max=jitters[-1] if jitters else 0.0
+        )
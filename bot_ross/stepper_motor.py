@@ -1,11 +1,18 @@
 import argparse
 import defines
-import RPi.GPIO as GPIO
-import time
-import threading
+import gpio_backend
 import math
+import motion_profile
 
+from concurrent.futures import Future
 from enum import Enum
+from move_futures import finished_future, wait_async, wait_for_latest
+from step_scheduler import StepScheduler
+
+
+# Pin states for each phase of the step cycle, as bitmasks where bit 0 is out1 and bit 3 is out4
+HALF_STEP_SEQUENCE = (0b0001, 0b0011, 0b0010, 0b0110, 0b0100, 0b1100, 0b1000, 0b1001)
+FULL_STEP_SEQUENCE = (0b0011, 0b0110, 0b1100, 0b1001)
 
 
 class StepperMotorDirection(Enum):
@@ -16,26 +23,77 @@ class StepperMotorDirection(Enum):
         return self.value
 
 
+def phase_levels(sequence, gpio=None, pins=4):
+    """
+    Convert a sequence of pin bitmasks into the GPIO levels to write for each phase
+
+    Arguments:
+        sequence {(int)} -- one bitmask per phase, where bit 0 is out1 and bit 3 is out4
+
+    Keyword Arguments:
+        gpio {module} -- the GPIO backend whose HIGH and LOW to use (default: {gpio_backend.default()})
+        pins {int} -- how many pins each bitmask covers (default: {4})
+
+    Returns:
+        [(int)] -- for each phase, a tuple of GPIO.HIGH/GPIO.LOW for out1 through out4
+    """
+    gpio = gpio or gpio_backend.default()
+    return [tuple(gpio.HIGH if mask & (1 << bit) else gpio.LOW for bit in range(pins)) for mask in sequence]
+
+
 class StepperMotor:
-    def __init__(self, out1, out2, out3, out4):
+    def __init__(self, out1, out2, out3, out4, sequence=HALF_STEP_SEQUENCE, scheduler=None, acceleration=None,
+                 jerk=None, gpio=None, telemetry=None, trace=None):
+        """
+        Arguments:
+            out1 {int} -- the GPIO.BCM channel for the first coil input
+            out2 {int} -- the GPIO.BCM channel for the second coil input
+            out3 {int} -- the GPIO.BCM channel for the third coil input
+            out4 {int} -- the GPIO.BCM channel for the fourth coil input
+
+        Keyword Arguments:
+            sequence {(int)} -- the pin bitmask for each phase of the step cycle (default: {HALF_STEP_SEQUENCE})
+            scheduler {StepScheduler} -- the scheduler that times this motor's steps (default: the shared
+                StepScheduler.default())
+            acceleration {float} -- the default acceleration for moves in steps/second^2, or None or <= 0 to jump
+                straight to the requested frequency (default: {None})
+            jerk {float} -- the default jerk for moves in steps/second^3, or None or <= 0 for trapezoidal instead of
+                S-curve acceleration (default: {None})
+            gpio {module} -- the GPIO backend to drive the pins with, for example a SimulatedGPIO
+                (default: {gpio_backend.default()})
+            telemetry {StepTelemetry} -- records how late each scheduled step is, or None to not record
+                (default: {None})
+            trace {JogTrace} -- stamps the first step of each jog command, or None to not trace (default: {None})
+        """
         self._i = 0  # The current position in step cycle
 
-        self._timer = None
+        self._scheduler = scheduler or StepScheduler.default()
+        self._scheduled_step = None
         self._is_complete = True
-        self._last_update_time = 0
+        self._move_future = finished_future(0)
+        self._last_update_time = -math.inf
+        self._acceleration = acceleration
+        self._jerk = jerk
+        self._telemetry = telemetry
+        self._trace = trace
+
+        # The move in progress
+        self._period = 0
+        self._intervals = None  # the time between each step, if the move accelerates
+        self._current_step = 0
+        self._goal = 0
+        self._direction = StepperMotorDirection.FORWARD
         self._pos = 0  # where we at
 
-        self._out1 = out1
-        self._out2 = out2
-        self._out3 = out3
-        self._out4 = out4
-        GPIO.setmode(GPIO.BCM)
-        GPIO.setup(self._out1, GPIO.OUT)
-        GPIO.setup(self._out2, GPIO.OUT)
-        GPIO.setup(self._out3, GPIO.OUT)
-        GPIO.setup(self._out4, GPIO.OUT)
+        self._gpio = gpio or gpio_backend.default()
+        self._outs = (out1, out2, out3, out4)
+        self._sequence = sequence
+        self._phase_levels = phase_levels(sequence, self._gpio)
+        self._gpio.setmode(self._gpio.BCM)
+        for out in self._outs:
+            self._gpio.setup(out, self._gpio.OUT)
 
-    def set_stepper_absolute(self, frequency, setpoint, wait=False):
+    def set_stepper_absolute(self, frequency, setpoint, wait=False, acceleration=None, jerk=None):
         """
         Set the stepper motor's frequency (speed) and desired position
 
@@ -46,48 +104,99 @@ class StepperMotor:
         Keyword Arguments:
             wait {bool} -- True iff the calling thread should wait until the stepper motor has reached the input goal
                 (default: {False})
+            acceleration {float} -- see set_stepper
+            jerk {float} -- see set_stepper
+
+        Returns:
+            Future -- see set_stepper
         """
         diff = setpoint - self._pos
-        self.set_stepper(frequency, diff, wait=wait)
+        return self.set_stepper(frequency, diff, wait=wait, acceleration=acceleration, jerk=jerk)
 
-    def set_stepper(self, frequency, goal, wait=False):
+    def set_stepper(self, frequency, goal, wait=False, acceleration=None, jerk=None):
         """
         Sets the frequency of steps and number of steps to be taken, and then starts the stepper
             motor
 
         Arguments:
-            frequency {float} -- The frequency at which the stepper motor should step (Hz)
+            frequency {float} -- The frequency at which the stepper motor should step (Hz). When accelerating, this is
+                the maximum frequency.
             goal {int} -- The number of steps desired. Negative means reverse.
 
         Keyword Arguments:
             wait {bool} -- True iff the calling thread should wait until the stepper motor has reached the input goal
                 (default: {False})
+            acceleration {float} -- steps/second^2 to ramp up to frequency at and back down before the goal, or <= 0 to
+                step at frequency for the whole move (default: the motor's default acceleration)
+            jerk {float} -- steps/second^3 for an S-curve ramp, or <= 0 for a trapezoidal one (default: the motor's
+                default jerk)
+
+        Returns:
+            Future -- resolves to the motor's position when the move finishes, or is cancelled if the move is replaced
+                or stopped first
         """
+        # Stop the current move. Once cancel returns, the scheduler will not step this motor again.
+        if self._scheduled_step:
+            self._scheduler.cancel(self._scheduled_step)
+            self._scheduled_step = None
+
+        self._move_future.cancel()
+
         # If stopping, mark complete
         self._is_complete = frequency == 0 or goal == 0
 
-        # Stop the current timer
-        if self._timer:
-            self._timer.cancel()
-
         # If the motor is going to move, call _start_stepper
-        if not self._is_complete:
-            self._start_stepper(frequency, goal)
+        if self._is_complete:
+            self._move_future = finished_future(self._pos)
+        else:
+            self._start_stepper(frequency, goal, acceleration, jerk)
+        future = self._move_future
 
         if wait:
             self.wait_until_complete()
+        return future
+
+    async def set_stepper_async(self, frequency, goal, acceleration=None, jerk=None):
+        """
+        Start a move and wait for it from an event loop. See set_stepper.
+
+        Returns:
+            int -- the motor's position once the move is done
+
+        Raises:
+            asyncio.CancelledError -- if the move is replaced or stopped before it finishes
+        """
+        return await wait_async(self.set_stepper(frequency, goal, acceleration=acceleration, jerk=jerk))
 
-    def wait_until_complete(self):
-        while self._timer and not self._is_complete:
-            self._timer.join()
+    async def set_stepper_absolute_async(self, frequency, setpoint, acceleration=None, jerk=None):
+        """
+        Start a move to an absolute position and wait for it from an event loop. See set_stepper_absolute.
+        """
+        return await wait_async(self.set_stepper_absolute(frequency, setpoint, acceleration=acceleration, jerk=jerk))
+
+    def wait_until_complete(self, timeout=None):
+        """
+        Block until the current move has finished or been stopped
+
+        Keyword Arguments:
+            timeout {float} -- the most seconds to wait, or None to wait forever (default: {None})
 
-    def _start_stepper(self, frequency, goal):
+        Raises:
+            concurrent.futures.TimeoutError -- if the timeout passes first
+        """
+        wait_for_latest(lambda: self._move_future, self._scheduler, timeout)
+
+    def _start_stepper(self, frequency, goal, acceleration=None, jerk=None):
         """
         Starts the stepping feedback loop
 
         Arguments:
             frequency {float} -- The frequency at which the stepper motor should step (Hz)
             goal {int} -- The number of steps desired
+
+        Keyword Arguments:
+            acceleration {float} -- see set_stepper
+            jerk {float} -- see set_stepper
         """
         # For scope and such
         direction = None
@@ -96,41 +205,64 @@ class StepperMotor:
         else:
             direction = StepperMotorDirection.REVERSE
 
-        period = 1 / frequency
+        if acceleration is None:
+            acceleration = self._acceleration
+        if jerk is None:
+            jerk = self._jerk
 
-        # Set up the new repeating timer and step if appropriate
-        time_since_last_update = time.time() - self._last_update_time
-        if time_since_last_update >= period:
-            # If it has not stepped for a period longer than the new update period, step and start the repeating timer
-            self._step_and_reset_timer(period, 0, goal, direction)
+        self._period = 1 / frequency
+        if acceleration and acceleration > 0:
+            # Work out the whole ramp now so stepping only has to look up the next interval
+            self._intervals = motion_profile.step_intervals(goal, frequency, acceleration, jerk)
         else:
-            # If it's not time to step yet, set the timer to wait for the remaining time then repeat for the regular
-            # period
-            self._timer = threading.Timer(period - time_since_last_update,
-                                          self._step_and_reset_timer, args=(period, 0, goal, direction))
-            self._timer.start()
-
-    def _step_and_reset_timer(self, period, current_step, goal, direction):
+            self._intervals = None
+        self._current_step = 0
+        self._goal = goal
+        self._direction = direction
+        self._move_future = Future()
+
+        # Step right away if it has not stepped for longer than the new period, otherwise wait out the remainder
+        first_deadline = max(self._scheduler.now(), self._last_update_time + self._period)
+        self._scheduled_step = self._scheduler.schedule(self._step_and_reschedule, first_deadline,
+                                                        future=self._move_future)
+
+    def _step_and_reschedule(self, deadline):
         """
-        Step the motor once and set a timer to call this function again
+        Step the motor once. Called by the scheduler.
 
         Arguments:
-            period {float} -- the time between steps
+            deadline {float} -- the time this step was scheduled for
 
-        Keyword Arguments:
+        Returns:
+            float -- the time the next step is due, or None if the goal has been reached
+        """
+        self.advance(self._direction)
+        if self._telemetry is not None:
+            self._telemetry.record(deadline, self._last_update_time)
+        self._current_step += int(self._direction)
+        if self._current_step != self._goal:
+            if self._intervals is None:
+                return deadline + self._period
+            return deadline + self._intervals[abs(self._current_step) - 1]
+
+        self._is_complete = True
+        if not self._move_future.done():  # it may have been stopped from a callback during this step
+            self._move_future.set_result(self._pos)
+        return None
+
+    def advance(self, direction):
+        """
+        Step the motor once and keep track of its position. Used by anything that times steps for this motor.
+
+        Arguments:
             direction {StepperMotorDirection} -- what direction the motor should go
-                (default: {StepperMotorDirection.FORWARD})
         """
-        self.step(direction)
-        current_step += int(direction)
+        # Count the step first, since the write can set off switch callbacks that read or zero the position
         self._pos += int(direction)
-        self._last_update_time = time.time()
-        if math.fabs(goal - current_step) > 0:
-            self._timer = threading.Timer(period, self._step_and_reset_timer,
-                                          args=(period, current_step, goal, direction))
-            self._timer.start()
-        else:
-            self._is_complete = True
+        self.step(direction)
+        self._last_update_time = self._scheduler.now()
+        if self._trace is not None:
+            self._trace.step()
 
     def zero(self):
         """
@@ -146,48 +278,8 @@ class StepperMotor:
             direction {StepperMotorDirection} -- what direction the motor should go
                 (default: {StepperMotorDirection.FORWARD})
         """
-        self._i = (self._i + direction.value) % 8
-
-        if self._i == 0:
-            GPIO.output(self._out1, GPIO.HIGH)
-            GPIO.output(self._out2, GPIO.LOW)
-            GPIO.output(self._out3, GPIO.LOW)
-            GPIO.output(self._out4, GPIO.LOW)
-        elif self._i == 1:
-            GPIO.output(self._out1, GPIO.HIGH)
-            GPIO.output(self._out2, GPIO.HIGH)
-            GPIO.output(self._out3, GPIO.LOW)
-            GPIO.output(self._out4, GPIO.LOW)
-        elif self._i == 2:
-            GPIO.output(self._out1, GPIO.LOW)
-            GPIO.output(self._out2, GPIO.HIGH)
-            GPIO.output(self._out3, GPIO.LOW)
-            GPIO.output(self._out4, GPIO.LOW)
-        elif self._i == 3:
-            GPIO.output(self._out1, GPIO.LOW)
-            GPIO.output(self._out2, GPIO.HIGH)
-            GPIO.output(self._out3, GPIO.HIGH)
-            GPIO.output(self._out4, GPIO.LOW)
-        elif self._i == 4:
-            GPIO.output(self._out1, GPIO.LOW)
-            GPIO.output(self._out2, GPIO.LOW)
-            GPIO.output(self._out3, GPIO.HIGH)
-            GPIO.output(self._out4, GPIO.LOW)
-        elif self._i == 5:
-            GPIO.output(self._out1, GPIO.LOW)
-            GPIO.output(self._out2, GPIO.LOW)
-            GPIO.output(self._out3, GPIO.HIGH)
-            GPIO.output(self._out4, GPIO.HIGH)
-        elif self._i == 6:
-            GPIO.output(self._out1, GPIO.LOW)
-            GPIO.output(self._out2, GPIO.LOW)
-            GPIO.output(self._out3, GPIO.LOW)
-            GPIO.output(self._out4, GPIO.HIGH)
-        elif self._i == 7:
-            GPIO.output(self._out1, GPIO.HIGH)
-            GPIO.output(self._out2, GPIO.LOW)
-            GPIO.output(self._out3, GPIO.LOW)
-            GPIO.output(self._out4, GPIO.HIGH)
+        self._i = (self._i + direction.value) % len(self._phase_levels)
+        self._gpio.output(self._outs, self._phase_levels[self._i])
 
 
 if __name__ == '__main__':
@@ -209,4 +301,4 @@ if __name__ == '__main__':
     try:
         sp1.set_stepper(freq, goal, wait=True)
     finally:
-        GPIO.cleanup()
+        sp1._gpio.cleanup()
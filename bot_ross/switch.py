@@ -1,12 +1,186 @@
-import RPi.GPIO as GPIO
+import gpio_backend
+import math
+import threading
+import time
 
+# How often wait_for_edge checks a clock other than time.monotonic, which can jump ahead without waking it, like a
+# VirtualClock
+_CLOCK_POLL = .01  # seconds
 
-def Switch():
-    def __init__(self, in_channel):
+
+class Switch():
+    """
+    A limit switch read through edge interrupts rather than polling.
+
+    Every change is debounced in software on top of the GPIO library's own bouncetime, then latched into a "triggered"
+    flag, passed to any registered callbacks, and used to wake threads blocked in wait_for_edge. An edge that comes
+    within the debounce time of the last change is not lost: the switch is read again once that time is up, so it
+    always ends up matching the pin. Nothing runs while the switch is idle.
+    """
+
+    def __init__(self, in_channel, gpio=None, debounce=.005, clock=time.monotonic, scheduler=None):
+        """
+        Arguments:
+            in_channel {int} -- the GPIO.BCM channel the switch is wired to
+
+        Keyword Arguments:
+            gpio {module} -- the GPIO backend to read the switch with, for example a SimulatedGPIO
+                (default: {gpio_backend.default()})
+            debounce {float} -- how long the switch must settle before another change counts, in seconds
+                (default: {.005})
+            clock {function} -- returns the current time in seconds, for debouncing and timeouts
+                (default: {scheduler.now if there is a scheduler, otherwise time.monotonic})
+            scheduler {StepScheduler} -- reads the switch again at the end of a debounce time that swallowed an edge,
+                or None to use a timer thread (default: {None})
+        """
         self._in = in_channel
+        self._gpio = gpio or gpio_backend.default()
+        self._debounce = debounce
+        self._scheduler = scheduler
+        self._clock = scheduler.now if scheduler is not None and clock is time.monotonic else clock
+
+        self._callbacks = []  # [(callback, state)]
+        self._condition = threading.Condition()
+        self._triggered = False
+        self._last_edge_time = -math.inf
+        self._edges = 0  # counts debounced changes so wait_for_edge can tell when one has happened
+        self._settling = False  # True while the switch is waiting to be read again after an edge was debounced
+
+        # BCM like every other driver, since GPIO.setmode applies to the whole program
+        self._gpio.setmode(self._gpio.BCM)
+        self._gpio.setup(self._in, self._gpio.IN)
+        self._state = bool(self._gpio.input(self._in))
+        self._triggered = self._state
 
-        GPIO.setMode(GPIO.BOARD)
-        GPIO.setup(self._in, GPIO.IN)
+        bouncetime = int(debounce * 1000)
+        if bouncetime > 0:
+            self._gpio.add_event_detect(self._in, self._gpio.BOTH, callback=self._on_edge, bouncetime=bouncetime)
+        else:
+            self._gpio.add_event_detect(self._in, self._gpio.BOTH, callback=self._on_edge)
 
     def get_state(self):
-        return GPIO.input(self._in)
+        return self._gpio.input(self._in)
+
+    @property
+    def triggered(self):
+        """
+        True iff the switch has been pressed since it was created or last reset, even if it has been released since
+        """
+        return self._triggered
+
+    def reset(self):
+        """
+        Clear the triggered flag. It is set again straight away if the switch is still pressed.
+        """
+        with self._condition:
+            self._state = bool(self._gpio.input(self._in))
+            self._triggered = self._state
+
+    def add_callback(self, callback, state=None):
+        """
+        Call a function whenever the switch changes. Callbacks run on the GPIO library's event thread, so they should
+        be quick.
+
+        Arguments:
+            callback {function} -- called with the new state, True for pressed
+
+        Keyword Arguments:
+            state {bool} -- only call back on changes to this state, or None for every change (default: {None})
+        """
+        with self._condition:
+            self._callbacks.append((callback, state))
+
+    def remove_callback(self, callback):
+        with self._condition:
+            self._callbacks = [(c, s) for c, s in self._callbacks if c != callback]
+
+    def wait_for_edge(self, timeout=None, state=None):
+        """
+        Block until the switch changes
+
+        Keyword Arguments:
+            timeout {float} -- the most seconds to wait on the switch's clock, or None to wait forever
+                (default: {None})
+            state {bool} -- wait for a change to this state, or None for any change (default: {None})
+
+        Returns:
+            bool -- True iff the switch changed before the timeout
+        """
+        deadline = None if timeout is None else self._clock() + timeout
+        with self._condition:
+            edges = self._edges
+            while True:
+                if self._edges != edges and (state is None or self._state == state):
+                    return True
+                edges = self._edges
+                remaining = None if deadline is None else deadline - self._clock()
+                if remaining is not None and remaining <= 0:
+                    return False
+                if remaining is not None and self._clock is not time.monotonic:
+                    remaining = min(remaining, _CLOCK_POLL)
+                self._condition.wait(remaining)
+
+    def _on_edge(self, channel):
+        """
+        Handle an edge interrupt from the GPIO library
+        """
+        now = self._clock()
+        state = bool(self._gpio.input(self._in))
+        with self._condition:
+            if state == self._state:
+                return
+            if now - self._last_edge_time < self._debounce:
+                self._settle_later()
+                return
+            callbacks = self._change(state, now)
+
+        for callback in callbacks:
+            callback(state)
+
+    def _settle_later(self):
+        """
+        Read the switch again at the end of the debounce time, for an edge that came too soon after the last change.
+        Must be called holding the condition.
+        """
+        if self._settling:
+            return
+        self._settling = True
+        deadline = self._last_edge_time + self._debounce
+        if self._scheduler is not None:
+            self._scheduler.schedule(self._settle, deadline)
+        else:
+            timer = threading.Timer(max(0, deadline - self._clock()), self._settle, args=(deadline,))
+            timer.daemon = True
+            timer.start()
+
+    def _settle(self, deadline):
+        """
+        Take whatever level the switch has settled at once the debounce time is up
+
+        Returns:
+            None -- so a scheduler does not call it again
+        """
+        state = bool(self._gpio.input(self._in))
+        with self._condition:
+            self._settling = False
+            if state == self._state:
+                return None
+            callbacks = self._change(state, max(deadline, self._clock()))
+
+        for callback in callbacks:
+            callback(state)
+        return None
+
+    def _change(self, state, now):
+        """
+        Record a debounced change and wake anyone waiting for it. Must be called holding the condition.
+
+        Returns:
+            [function] -- the callbacks to call with the new state, once the condition is released
+        """
+        self._last_edge_time = now
+        self._state = state
+        self._triggered = self._triggered or state
+        self._edges += 1
+        self._condition.notify_all()
+        return [c for c, s in self._callbacks if s is None or s == state]
@@ -0,0 +1,92 @@
+import sys
+import unittest
+
+from unittest.mock import Mock, call, patch
+
+mock_rpi = sys.modules.setdefault('RPi', Mock())
+sys.modules.setdefault('RPi.GPIO', mock_rpi.GPIO)
+from compiled_move import LoopBackend, PigpioWaveBackend, SimulatedBackend, compile_move, play  # noqa: E402
+from simulated_gpio import SimulatedGPIO  # noqa: E402
+from step_scheduler import StepScheduler  # noqa: E402
+from stepper_motor import StepperMotor, StepperMotorDirection  # noqa: E402
+
+
+class TestCompiledMove(unittest.TestCase):
+    def setUp(self):
+        self.gpio = SimulatedGPIO()
+        self.scheduler = Mock(spec=StepScheduler)
+        # PigpioWaveBackend imports pigpio when it is made, so only the tests see the fake one
+        patcher = patch.dict(sys.modules, {'pigpio': Mock()})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def make_motor(self, *pins):
+        return StepperMotor(*pins, scheduler=self.scheduler, gpio=self.gpio)
+
+    def pin_mask(self, pins):
+        return sum(1 << pin for pin in pins if self.gpio.input(pin))
+
+    def test_matches_stepping(self):
+        motor = self.make_motor(1, 2, 3, 4)
+        compiled = compile_move([([motor], -10)], 100)
+        waveform = compiled.waveform
+        self.assertEqual(len(waveform), 10)
+        self.assertAlmostEqual(waveform.duration(), .09)
+
+        reference = self.make_motor(1, 2, 3, 4)
+        for mask in waveform.masks:
+            reference.step(StepperMotorDirection.REVERSE)
+            self.assertEqual(mask, self.pin_mask((1, 2, 3, 4)))
+
+        play(compiled, SimulatedBackend())
+        self.assertEqual(motor._pos, -10)
+        self.assertEqual(motor._i, reference._i)
+
+    def test_coordinated(self):
+        x = self.make_motor(1, 2, 3, 4)
+        y_left = self.make_motor(5, 6, 7, 8)
+        y_right = self.make_motor(9, 10, 11, 12)
+        compiled = compile_move([([x], 6), ([y_left, y_right], 3)], 100, acceleration=1000)
+        waveform = compiled.waveform
+        self.assertEqual(len(waveform), 6)
+        self.assertEqual(waveform.pins, [1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12])
+        self.assertGreater(waveform.times[1] - waveform.times[0], .01)
+
+        backend = SimulatedBackend(self.gpio)
+        play(compiled, backend)
+        self.assertEqual(len(backend.edges), 6)
+        self.assertEqual((x._pos, y_left._pos, y_right._pos), (6, 3, 3))
+        self.assertEqual(self.pin_mask(range(1, 13)), waveform.masks[-1])
+
+    def test_loop_backend(self):
+        motor = self.make_motor(1, 2, 3, 4)
+        compiled = compile_move([([motor], 4)], 1000)
+        play(compiled, LoopBackend(self.gpio))
+        self.assertEqual(self.pin_mask((1, 2, 3, 4)), compiled.waveform.masks[-1])
+        self.assertEqual(motor._pos, 4)
+
+    def test_pigpio_pulses(self):
+        pigpio = sys.modules['pigpio']
+        pigpio.pulse.side_effect = lambda on, off, delay: (on, off, delay)
+        pi = Mock()
+        pi.wave_create.side_effect = [5, 6]
+        pi.wave_tx_at.return_value = 9999  # nothing playing
+        pi.wave_tx_busy.return_value = 0
+        motor = self.make_motor(1, 2, 3, 4)
+        waveform = compile_move([([motor], 2)], 1000).waveform
+
+        backend = PigpioWaveBackend(pi, max_pulses=1)
+        # starting from phase 0 (pin 1 high): phase 1 turns on pin 2, phase 2 turns off pin 1
+        self.assertEqual(backend.pulses(waveform), [(1 << 2, 0, 1000), (0, 1 << 1, 0)])
+
+        backend.play(waveform)
+        pi.wave_add_generic.assert_has_calls([call([(1 << 2, 0, 1000)]), call([(0, 1 << 1, 0)])])
+        # The second chunk is queued behind the first before the first is deleted, so they play back to back
+        sync = pigpio.WAVE_MODE_ONE_SHOT_SYNC
+        waves = [c for c in pi.mock_calls if c[0] in ('wave_send_using_mode', 'wave_delete')]
+        self.assertEqual(waves, [call.wave_send_using_mode(5, sync), call.wave_send_using_mode(6, sync),
+                                 call.wave_delete(5), call.wave_delete(6)])
+
+
+if __name__ == '__main__':
+    unittest.main()
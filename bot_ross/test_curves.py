@@ -0,0 +1,108 @@
+import curves
+import math
+import unittest
+
+
+def max_arc_error(points, start, center, radius):
+    """
+    How far the chords between points stray inside a circle, at their midpoints
+    """
+    worst = 0
+    previous = start
+    for point in points:
+        middle = ((previous[0] + point[0]) / 2, (previous[1] + point[1]) / 2)
+        worst = max(worst, radius - math.hypot(middle[0] - center[0], middle[1] - center[1]))
+        previous = point
+    return worst
+
+
+class TestArc(unittest.TestCase):
+    def test_quarter_circle(self):
+        points = curves.arc((10, 0, 0), (0, 10, 4), (-10, 0), clockwise=False, tolerance=.01)
+        self.assertEqual(points[-1], (0, 10, 4))
+        for x, y, z in points:
+            self.assertAlmostEqual(math.hypot(x, y), 10)
+        self.assertLessEqual(max_arc_error(points, (10, 0), (0, 0), 10), .01)
+        # Z rises evenly, like a helix
+        self.assertAlmostEqual(points[len(points) // 2 - 1][2], 4 * (len(points) // 2) / len(points))
+
+    def test_direction(self):
+        counterclockwise = curves.arc((10, 0, 0), (0, 10, 0), (-10, 0), clockwise=False, tolerance=.01)
+        clockwise = curves.arc((10, 0, 0), (0, 10, 0), (-10, 0), clockwise=True, tolerance=.01)
+        self.assertGreater(counterclockwise[0][1], 0)
+        self.assertLess(clockwise[0][1], 0)
+        self.assertAlmostEqual(len(clockwise) / len(counterclockwise), 3, delta=.2)
+
+    def test_full_circle(self):
+        points = curves.arc((5, 0, 0), (5, 0, 0), (-5, 0), clockwise=True, tolerance=.01)
+        self.assertGreater(len(points), 8)
+        self.assertEqual(points[-1], (5, 0, 0))
+
+    def test_segments_grow_with_curvature(self):
+        # Arcs of the same length, one on a circle a hundred times tighter
+        angle = math.pi / 100
+        wide = curves.arc((100, 0, 0), (100 * math.cos(angle), 100 * math.sin(angle), 0), (-100, 0), False, .01)
+        tight = curves.arc((1, 0, 0), (-1, 0, 0), (-1, 0), False, .01)
+        self.assertGreater(len(tight), 3 * len(wide))
+
+    def test_never_finer_than_a_step(self):
+        points = curves.arc((10, 0, 0), (-10, 0, 0), (-10, 0), False, tolerance=0)
+        self.assertLessEqual(max_arc_error(points, (10, 0), (0, 0), 10), curves.resolution() / 2)
+        self.assertLess(len(points), 200)
+
+    def test_end_off_the_circle(self):
+        with self.assertRaises(ValueError):
+            curves.arc((10, 0, 0), (0, 12, 0), (-10, 0), False)
+
+    def test_center_from_radius(self):
+        for radius, clockwise, center in ((10, True, (10, 0)), (10, False, (0, 10)), (-10, True, (0, 10))):
+            for found, expected in zip(curves.center_from_radius((0, 0, 0), (10, 10, 0), radius, clockwise), center):
+                self.assertAlmostEqual(found, expected)
+        with self.assertRaises(ValueError):
+            curves.center_from_radius((0, 0, 0), (30, 0, 0), 10, clockwise=True)
+
+
+class TestBezier(unittest.TestCase):
+    def test_straight(self):
+        self.assertEqual(curves.bezier((0, 0, 0), (10, 0), (20, 0), (300, 0, 0)), [(300, 0, 0)])
+
+    def test_within_tolerance(self):
+        start, control1, control2, end = (0, 0, 0), (0, 40), (60, 40), (60, 0, 6)
+        points = curves.bezier(start, control1, control2, end, tolerance=.05)
+        self.assertEqual(points[-1], end)
+        self.assertGreater(len(points), 5)
+
+        def at(t):
+            return tuple((1 - t) ** 3 * a + 3 * (1 - t) ** 2 * t * b + 3 * (1 - t) * t ** 2 * c + t ** 3 * d
+                         for a, b, c, d in zip(start, control1, control2, end))
+
+        polyline = [start[:2]] + [point[:2] for point in points]
+        for k in range(101):
+            point = at(k / 100)
+            distance = min(_distance_to_segment(point, a, b) for a, b in zip(polyline, polyline[1:]))
+            self.assertLessEqual(distance, .05 + 1e-9)
+
+    def test_closed_loop(self):
+        points = curves.bezier((0, 0, 0), (40, 40), (-40, 40), (0, 0, 0))
+        self.assertEqual(points[-1], (0, 0, 0))
+        self.assertGreater(len(points), 10)
+        # the loop reaches y = 30 at t = .5
+        self.assertAlmostEqual(max(y for _, y, _ in points), 30, delta=.1)
+
+    def test_cache(self):
+        curves._bezier_offsets.cache_clear()
+        first = curves.bezier((0, 0, 0), (0, 5), (5, 5), (5, 0, 0))
+        second = curves.bezier((100.1, 200.3, 1), (100.1, 205.3), (105.1, 205.3), (105.1, 200.3, 1))
+        self.assertEqual(curves.cache_info()['bezier'].hits, 1)
+        self.assertEqual(len(first), len(second))
+        self.assertAlmostEqual(second[0][0], first[0][0] + 100.1)
+
+
+def _distance_to_segment(point, a, b):
+    dx, dy = b[0] - a[0], b[1] - a[1]
+    t = min(1, max(0, ((point[0] - a[0]) * dx + (point[1] - a[1]) * dy) / (dx * dx + dy * dy)))
+    return math.hypot(point[0] - a[0] - t * dx, point[1] - a[1] - t * dy)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import sys
+import unittest
+
+from unittest.mock import Mock
+
+mock_rpi = sys.modules.setdefault('RPi', Mock())
+sys.modules.setdefault('RPi.GPIO', mock_rpi.GPIO)
+from compiled_move import LoopBackend, compile_move, play  # noqa: E402
+from ganged_stepper_motor import GangedStepperMotor, ganged_sequence  # noqa: E402
+from homing import Homing, HomingAxis  # noqa: E402
+from simulated_gpio import SimulatedGPIO  # noqa: E402
+from simulated_hardware import SimulatedStepScheduler  # noqa: E402
+from stepper_motor import FULL_STEP_SEQUENCE, HALF_STEP_SEQUENCE  # noqa: E402
+from switch import Switch  # noqa: E402
+
+LEFT = (1, 2, 3, 4)
+RIGHT = (5, 6, 7, 8)
+
+
+class TestGangedSequence(unittest.TestCase):
+    def test_in_phase(self):
+        self.assertEqual(ganged_sequence(FULL_STEP_SEQUENCE, [0, 0]), (0b00110011, 0b01100110, 0b11001100, 0b10011001))
+
+    def test_out_of_phase(self):
+        self.assertEqual(ganged_sequence(FULL_STEP_SEQUENCE, [0, 1]), (0b01100011, 0b11000110, 0b10011100, 0b00111001))
+
+
+class TestGangedStepperMotor(unittest.TestCase):
+    def setUp(self):
+        self.scheduler = SimulatedStepScheduler()
+        self.gpio = SimulatedGPIO(clock=self.scheduler.clock)
+        self.motor = GangedStepperMotor([LEFT, RIGHT], scheduler=self.scheduler, gpio=self.gpio)
+        self.left = self.gpio.add_shaft(LEFT, HALF_STEP_SEQUENCE, phase=self.motor.side_phase(0))
+        self.right = self.gpio.add_shaft(RIGHT, HALF_STEP_SEQUENCE, phase=self.motor.side_phase(1))
+
+    def test_init(self):
+        self.assertEqual(self.motor._outs, LEFT + RIGHT)
+        self.assertEqual(self.motor.side_outs(1), RIGHT)
+        self.assertEqual(set(self.gpio.levels), set(LEFT + RIGHT))
+        self.assertEqual(self.motor.home_offsets, (0, 0))
+
+    def test_one_write_per_step(self):
+        self.motor.set_stepper(1000, 50, wait=True)
+        self.assertEqual(self.gpio.writes, 50)
+        self.assertEqual((self.left.position, self.right.position), (50, 50))
+        self.assertEqual(self.motor._pos, 50)
+
+        # every change of a step happens at the same time on both sides
+        left_times = [t for pin in LEFT for t, _ in self.gpio.transitions(pin)]
+        right_times = [t for pin in RIGHT for t, _ in self.gpio.transitions(pin)]
+        self.assertEqual(sorted(left_times), sorted(right_times))
+
+    def test_correct(self):
+        self.assertTrue(self.scheduler.wait(self.motor.correct((0, -3), 100)))
+        self.assertFalse(self.motor.correct((0, 5), 100).done())
+        self.scheduler.run_until_idle()
+        self.assertEqual((self.left.position, self.right.position), (0, 2))
+        self.assertEqual(self.motor._pos, 0)
+
+        self.motor.set_stepper(1000, -10, wait=True)
+        self.assertEqual((self.left.position, self.right.position), (-10, -8))
+
+    def test_correct_telemetry(self):
+        self.motor._telemetry = telemetry = Mock()
+        self.scheduler.wait(self.motor.correct((0, -3), 100))
+        self.assertEqual(telemetry.record.call_count, 3)
+
+    def test_correct_while_moving(self):
+        self.motor.set_stepper(1000, 50)
+        with self.assertRaises(RuntimeError):
+            self.motor.correct((1, 0), 100)
+
+    def test_compiled_move(self):
+        x = GangedStepperMotor([(11, 12, 13, 14)], scheduler=self.scheduler, gpio=self.gpio)
+        play(compile_move([([x], 6), ([self.motor], 3)], 1000), LoopBackend(self.gpio))
+        self.assertEqual((self.left.position, self.right.position), (3, 3))
+        self.assertEqual(self.motor._pos, 3)
+
+    def test_homing_squares_the_sides(self):
+        motor = GangedStepperMotor([(11, 12, 13, 14), (15, 16, 17, 18)], home_offsets=(0, 4), scheduler=self.scheduler,
+                                   gpio=self.gpio)
+        left = self.gpio.add_shaft(motor.side_outs(0), HALF_STEP_SEQUENCE, 300, phase=motor.side_phase(0))
+        right = self.gpio.add_shaft(motor.side_outs(1), HALF_STEP_SEQUENCE, 300, phase=motor.side_phase(1))
+        self.gpio.add_limit_switch(20, lambda: left.position <= 0)
+        switch = Switch(20, gpio=self.gpio, scheduler=self.scheduler)
+
+        Homing(self.scheduler, [HomingAxis('y', [motor], switch, 1000, 1000)]).run()
+        self.assertEqual((left.position, right.position), (0, 4))
+        self.assertEqual(motor._pos, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,230 @@
+import geometry
+import os
+import sys
+import tempfile
+import time
+import unittest
+
+from unittest.mock import Mock, patch
+
+mock_rpi = sys.modules.setdefault('RPi', Mock())
+sys.modules.setdefault('RPi.GPIO', mock_rpi.GPIO)
+import defines  # noqa: E402
+from gcode import GcodeCommand, GcodeError, GcodeExecutor, Home, Move, Planner, PlaySound, ToolChange, \
+    format_actions, parse, parse_line, prefetch  # noqa: E402
+from homing import HomingError  # noqa: E402
+from simulated_hardware import SimulatedMachine  # noqa: E402
+from test_simulated_hardware import SIMULATED_DEFINES  # noqa: E402
+
+
+class TestParse(unittest.TestCase):
+    def test_parse_line(self):
+        self.assertEqual(parse_line('G1 X10 Y-2.5 F600', 3), GcodeCommand(3, 'G', 1, {'X': 10, 'Y': -2.5, 'F': 600}))
+        self.assertEqual(parse_line('g0x1y2'), GcodeCommand(None, 'G', 0, {'X': 1, 'Y': 2}))
+        self.assertEqual(parse_line('N10 T3'), GcodeCommand(None, 'T', 3, {}))
+        self.assertEqual(parse_line('M72 P2 (play a sound) ; and a comment').params, {'P': 2})
+
+    def test_xbox_format(self):
+        command = parse_line('G1 X0.5 Y-0.25 Z0 E0.0 F63.6396')
+        self.assertEqual(command.params, {'X': .5, 'Y': -.25, 'Z': 0, 'E': 0, 'F': 63.6396})
+
+    def test_exponents(self):
+        command = parse_line('G1 X6.666666666666667e-05 Y0 Z0 E0 F60')
+        self.assertEqual(command.params, {'X': 6.666666666666667e-05, 'Y': 0, 'Z': 0, 'E': 0, 'F': 60})
+        self.assertEqual(parse_line('G1 X1.5E+2 Y1e3').params, {'X': 150, 'Y': 1000})
+        # Run together, an unsigned E is the extruder, as in gcode_table.tokenize
+        self.assertEqual(parse_line('G1X1E5').params, {'X': 1, 'E': 5})
+
+    def test_blank(self):
+        for line in ('', '   ', '; just a comment', '(another)'):
+            self.assertIsNone(parse_line(line))
+
+    def test_errors(self):
+        for line in ('X10', 'G1 X1-', 'G1 #', 'G1 (oops'):
+            with self.assertRaises(GcodeError):
+                parse_line(line)
+
+    def test_parse_is_lazy(self):
+        def lines():
+            yield 'G90'
+            yield ''
+            yield 'G1 X1'
+            raise AssertionError('read too far')
+
+        commands = parse(lines())
+        self.assertEqual(next(commands).number, 90)
+        self.assertEqual(next(commands).line_number, 3)
+
+
+class TestPlanner(unittest.TestCase):
+    def plan(self, planner, *lines):
+        return list(planner.plan(parse(lines)))
+
+    def test_absolute_and_relative(self):
+        planner = Planner(position=(1, 2, 3))
+        actions = self.plan(planner, 'G1 X10 F600', 'G91', 'G1 X1 Y1', 'G0 Z-1', 'G90', 'G1 Y0')
+        self.assertEqual(actions, [
+            Move(1, 10, None, None, 10),
+            Move(3, 11, 3, None, 10),
+            Move(4, None, None, 2, None),
+            Move(6, None, 0, None, 10)
+        ])
+        self.assertEqual(planner.position, [11, 0, 2])
+
+    def test_inches(self):
+        actions = self.plan(Planner(), 'G20', 'G1 X1 F1')
+        self.assertEqual(actions, [Move(2, geometry.mm_per_inch, None, None, geometry.mm_per_inch / 60)])
+
+    def test_other_commands(self):
+        planner = Planner(position=(5, 5, 5))
+        self.assertEqual(self.plan(planner, 'G28', 'T2', 'M72 P4'), [Home(1), ToolChange(2, 2), PlaySound(3, 4)])
+        self.assertEqual(planner.position, [0, 0, 0])
+
+    def test_format_actions(self):
+        actions = [Home(None), ToolChange(None, 2), Move(None, 1.5, None, -0.00001, 10),
+                   Move(None, None, 2, None, None), PlaySound(None, 4)]
+        lines = list(format_actions(actions))
+        self.assertEqual(lines, ['G21', 'G90', 'G28', 'T2', 'G1 X1.5 Z0 F600', 'G0 Y2', 'M72 P4'])
+        self.assertEqual([action._replace(line_number=None) for action in self.plan(Planner(), *lines)],
+                         [Home(None), ToolChange(None, 2), Move(None, 1.5, None, 0, 10),
+                          Move(None, None, 2, None, None), PlaySound(None, 4)])
+
+    def test_arcs(self):
+        planner = Planner(position=(10, 0, 0), tolerance=.01)
+        moves = self.plan(planner, 'G3 X0 Y10 I-10 F600', 'G91', 'G2 X10 Y-10 R10')
+        self.assertGreater(len(moves), 4)
+        self.assertEqual(moves[-1], Move(3, 10, 0, 0, 10))
+        self.assertTrue(all(move.feed_rate == 10 for move in moves))
+        self.assertEqual(planner.position, [10, 0, 0])
+        quarter = [move for move in moves if move.line_number == 1]
+        self.assertEqual(quarter[-1], Move(1, 0, 10, 0, 10))
+        for move in quarter:
+            self.assertAlmostEqual((move.x ** 2 + move.y ** 2) ** .5, 10)
+
+    def test_bezier(self):
+        moves = self.plan(Planner(tolerance=.01), 'G5 I0 J10 P0 Q10 X10 Y0 F60')
+        self.assertGreater(len(moves), 4)
+        self.assertEqual(moves[-1], Move(1, 10, 0, 0, 1))
+        self.assertTrue(all(move.y > 0 for move in moves[:-1]))
+
+    def test_bad_arcs(self):
+        with self.assertRaisesRegex(GcodeError, 'line 1: .*center'):
+            self.plan(Planner(), 'G2 X10')
+        with self.assertRaisesRegex(GcodeError, 'line 2: .*too far'):
+            self.plan(Planner(), 'G1 X0', 'G2 X30 R10')
+
+    def test_unsupported(self):
+        with self.assertRaisesRegex(GcodeError, 'line 1: unsupported command M3'):
+            self.plan(Planner(), 'M3')
+
+
+class TestPrefetch(unittest.TestCase):
+    def test_order(self):
+        self.assertEqual(list(prefetch(range(100), 4)), list(range(100)))
+
+    def test_bounded(self):
+        produced = []
+
+        def items():
+            for i in range(1000):
+                produced.append(i)
+                yield i
+
+        iterator = prefetch(items(), 4)
+        self.assertEqual(next(iterator), 0)
+        for _ in range(100):
+            if len(produced) > 4:
+                break
+            os.sched_yield()
+        # one handed out, four queued, and one waiting to be queued
+        self.assertLessEqual(len(produced), 6)
+        iterator.close()
+        # Closing waits for the producer to stop, so it takes nothing more
+        stopped_at = len(produced)
+        time.sleep(.05)
+        self.assertEqual(len(produced), stopped_at)
+
+    def test_error(self):
+        def items():
+            yield 1
+            raise GcodeError('bad line')
+
+        iterator = prefetch(items(), 4)
+        self.assertEqual(next(iterator), 1)
+        with self.assertRaisesRegex(GcodeError, 'bad line'):
+            next(iterator)
+
+
+class TestGcodeExecutor(unittest.TestCase):
+    def setUp(self):
+        patcher = patch.multiple(defines, **SIMULATED_DEFINES)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.machine = SimulatedMachine(start_position=(300, 200, 50))
+        self.tools = []
+        self.sounds = []
+        self.executor = GcodeExecutor(self.machine.cnc, tool_callback=self.tools.append,
+                                      sound_callback=self.sounds.append)
+
+    def assert_at_mm(self, x, y, z):
+        self.assertEqual(self.machine.cnc.get_position(),
+                         tuple(int(round(geometry.mm_to_steps(mm))) for mm in (x, y, z)))
+
+    def test_run_file(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.gcode', delete=False) as f:
+            f.write('G28\nT1\nG90\nG1 X4 Y3 F3000\nG91\nG1 X1 Z1 E0.5\nM72 P7\nG0 X-2\n')
+        self.addCleanup(os.remove, f.name)
+
+        self.executor.run_file(f.name)
+        self.assert_at_mm(3, 3, 1)
+        self.assertEqual(self.tools, [1])
+        self.assertEqual(self.sounds, [7])
+
+    def test_error_stops_the_job(self):
+        with self.assertRaisesRegex(GcodeError, 'line 3'):
+            self.executor.run(['G28', 'G1 X1 F3000', 'G1 X-10', 'G1 X2', 'G1 Y5'])
+        self.assert_at_mm(1, 0, 0)
+        # The lines after the error were planned ahead, but the next line is planned from where the machine is
+        self.assertEqual(self.executor.planner.position,
+                         [geometry.steps_to_mm(p) for p in self.machine.cnc.get_position()])
+
+    def test_do_line(self):
+        self.assertTrue(self.executor.do_line('G28'))
+        self.assertTrue(self.executor.do_line('G91'))
+        self.assertTrue(self.executor.do_line('G1 X0.5 Y0.5 Z0 E0 F600'))
+        with self.assertLogs('gcode', 'ERROR') as logs:
+            self.assertFalse(self.executor.do_line('G1 X-5'))
+            self.assertFalse(self.executor.do_line('M3'))
+        self.assertIn('soft limits', logs.output[0])
+        self.assertIn('unsupported command M3', logs.output[1])
+        self.assertTrue(self.executor.do_line('G1 X0.5'))
+        self.assert_at_mm(1, .5, 0)
+
+    def test_homing_error(self):
+        def zeroing():
+            self.machine.cnc.move_to_mm(2, 0, 0, feed_rate=3000, wait=True)
+            raise HomingError('the x axis did not reach its limit switch')
+
+        self.assertTrue(self.executor.do_line('G28'))
+        with patch.object(self.machine.cnc, 'zeroing', zeroing), self.assertLogs('gcode', 'ERROR') as logs:
+            self.assertFalse(self.executor.do_line('G28'))
+        self.assertIn('limit switch', logs.output[0])
+        self.assertTrue(self.executor.do_line('G91'))
+        self.assertTrue(self.executor.do_line('G1 X1 F3000'))
+        self.assert_at_mm(3, 0, 0)
+
+    def test_stop(self):
+        self.assertTrue(self.executor.do_line('G28'))
+        self.machine.scheduler.schedule(lambda deadline: self.executor.stop(), self.machine.clock() + .1)
+        with self.assertLogs('gcode', 'ERROR') as logs:
+            self.assertFalse(self.executor.do_line('G1 X10 F600'))
+        self.assertIn('stopped partway', logs.output[0])
+        x = self.executor.planner.position[0]
+        self.assertTrue(0 < x < 10)
+        self.assert_at_mm(x, 0, 0)
+        self.assertTrue(self.executor.do_line('G1 X10'))
+        self.assert_at_mm(10, 0, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
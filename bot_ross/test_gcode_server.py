@@ -0,0 +1,167 @@
+import asyncio
+import os
+import tempfile
+import threading
+import unittest
+
+from unittest.mock import Mock
+from gcode_server import GcodeServer
+
+
+class FakeMachine():
+    """
+    Records lines and blocks on each one until released, like do_line while the machine moves
+    """
+
+    def __init__(self):
+        self.lines = []
+        self.release = threading.Event()
+        self.release.set()
+        self.refuse = set()
+
+    def do_line(self, line):
+        self.lines.append(line)
+        self.release.wait(2)
+        return line not in self.refuse
+
+
+class TestGcodeServer(unittest.TestCase):
+    def setUp(self):
+        self.machine = FakeMachine()
+        self.kill = Mock()
+        self.addCleanup(self.machine.release.set)
+
+    def serve(self, test, queue_size=16, path=None, kill=True):
+        async def run():
+            server = GcodeServer(self.machine.do_line, kill_callback=self.kill if kill else None,
+                                 queue_size=queue_size)
+            await server.start(port=0, path=path)
+            try:
+                await asyncio.wait_for(test(server), 5)
+            finally:
+                self.machine.release.set()
+                await server.close()
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+        loop.run_until_complete(run())
+
+    async def connect(self, server):
+        if isinstance(server.address, str):
+            return await asyncio.open_unix_connection(server.address)
+        return await asyncio.open_connection(*server.address[:2])
+
+    async def send(self, client, line):
+        reader, writer = client
+        writer.write(line.encode('utf-8') + b'\n')
+        await writer.drain()
+        return (await reader.readline()).decode('utf-8').strip()
+
+    async def receive(self, client):
+        return (await client[0].readline()).decode('utf-8').strip()
+
+    async def drained(self, server):
+        while server.depth:
+            await asyncio.sleep(.01)
+
+    def test_controller_and_observers(self):
+        async def test(server):
+            controller = await self.connect(server)
+            observer = await self.connect(server)
+            self.assertEqual(await self.send(controller, 'G91'), 'ok')
+            self.assertEqual(await self.receive(controller), 'done G91')
+            self.assertEqual(await self.receive(observer), 'done G91')
+            self.assertEqual(await self.send(observer, 'G28'), 'error: observer')
+            self.assertEqual(await self.send(controller, 'G1 X1 F60'), 'ok')
+            self.assertEqual(await self.receive(observer), 'done G1 X1 F60')
+            self.assertEqual(self.machine.lines, ['G91', 'G1 X1 F60'])
+
+        self.serve(test)
+
+    def test_busy_when_queue_is_full(self):
+        async def test(server):
+            controller = await self.connect(server)
+            self.machine.release.clear()
+            self.assertEqual(await self.send(controller, 'G1 X1 F60'), 'ok')
+            await self.drained(server)  # the machine is busy with the first line
+            self.assertEqual(await self.send(controller, 'G1 X2 F60'), 'ok')
+            self.assertEqual(await self.send(controller, 'G1 X3 F60'), 'ok')
+            self.assertEqual(await self.send(controller, 'G1 X4 F60'), 'busy')
+            self.assertEqual(server.depth, 2)
+
+            self.machine.release.set()
+            for x in (1, 2, 3):
+                self.assertEqual(await self.receive(controller), 'done G1 X{} F60'.format(x))
+            self.assertEqual(await self.send(controller, 'G1 X4 F60'), 'ok')
+
+        self.serve(test, queue_size=2)
+
+    def test_failure_clears_queue(self):
+        async def test(server):
+            controller = await self.connect(server)
+            self.machine.refuse.add('G1 X-5')
+            self.machine.release.clear()
+            await self.send(controller, 'G1 X-5')
+            await self.drained(server)
+            await self.send(controller, 'G1 X1 F60')
+            self.machine.release.set()
+            self.assertEqual(await self.receive(controller), 'failed G1 X-5')
+            self.assertEqual(await self.receive(controller), 'dropped G1 X1 F60')
+            self.assertEqual(server.depth, 0)
+            self.assertEqual(self.machine.lines, ['G1 X-5'])
+
+        self.serve(test)
+
+    def test_kill_skips_queue(self):
+        async def test(server):
+            controller = await self.connect(server)
+            self.machine.release.clear()
+            await self.send(controller, 'G1 X1 F60')
+            await self.drained(server)
+            await self.send(controller, 'G1 X2 F60')
+            self.assertEqual(await self.send(controller, 'M112'), 'ok')
+            self.assertEqual(await self.receive(controller), 'dropped G1 X2 F60')
+            self.kill.assert_called_once_with()
+            self.assertEqual(server.depth, 0)
+
+        self.serve(test)
+
+    def test_kill_without_kill_callback(self):
+        async def test(server):
+            controller = await self.connect(server)
+            self.machine.release.clear()
+            await self.send(controller, 'G1 X1 F60')
+            await self.drained(server)
+            await self.send(controller, 'G1 X2 F60')
+            self.assertEqual(await self.send(controller, 'M112'), 'error: no kill')
+            self.assertEqual(server.depth, 1)
+
+        self.serve(test, kill=False)
+
+    def test_control_passes_on_when_controller_leaves(self):
+        async def test(server):
+            first = await self.connect(server)
+            second = await self.connect(server)
+            await self.send(first, 'G91')
+            self.assertEqual(await self.receive(second), 'done G91')
+            self.assertEqual(await self.send(second, 'G90'), 'error: observer')
+            first[1].close()
+            while server._controller is not None:
+                await asyncio.sleep(.01)
+            self.assertEqual(await self.send(second, 'G90'), 'ok')
+
+        self.serve(test)
+
+    @unittest.skipUnless(hasattr(asyncio, 'start_unix_server'), 'no Unix sockets')
+    def test_unix_socket(self):
+        path = os.path.join(tempfile.mkdtemp(), 'gcode.sock')
+        self.addCleanup(os.rmdir, os.path.dirname(path))
+        self.addCleanup(lambda: os.path.exists(path) and os.remove(path))
+
+        async def test(server):
+            self.assertEqual(await self.send(await self.connect(server), 'G28'), 'ok')
+
+        self.serve(test, path=path)
+
+
+if __name__ == '__main__':
+    unittest.main()
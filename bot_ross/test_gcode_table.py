@@ -0,0 +1,58 @@
+import math
+import os
+import tempfile
+import unittest
+
+from gcode import GcodeCommand, GcodeError, parse
+from gcode_table import tokenize, tokenize_file
+
+JOB = '''G90 ; absolute
+G1 X0.5 Y-0.25 Z0 E0.0 F63.6396
+N10 G1X1Y2
+M72 P3 (play a sound)
+
+T2
+g0 x-1 q7
+'''
+
+
+class TestGcodeTable(unittest.TestCase):
+    def test_columns(self):
+        table = tokenize(b'G1 X0.5 Y-0.25 Z0 E0.0 F63.6396\nG0 Z3\n')
+        self.assertEqual(len(table), 2)
+        self.assertEqual(list(table.letters), [ord('G'), ord('G')])
+        self.assertEqual(list(table.numbers), [1, 0])
+        self.assertEqual(list(table.columns['X'][:1]), [.5])
+        self.assertEqual(list(table.columns['F'][:1]), [63.6396])
+        self.assertTrue(math.isnan(table.columns['X'][1]))
+        self.assertEqual(table.columns['Z'][1], 3)
+
+    def test_same_as_parse(self):
+        self.assertEqual(list(tokenize(JOB.encode())), list(parse(JOB.splitlines())))
+
+    def test_extra_params(self):
+        table = tokenize(JOB.encode())
+        self.assertEqual(table.extra_params, {5: {'Q': 7}})
+        self.assertEqual(table.command(5), GcodeCommand(7, 'G', 0, {'X': -1, 'Q': 7}))
+
+    def test_errors(self):
+        for data in (b'G1 X1\nX10\n', b'G1\nG1 X1-\n', b'G1\nG1 (oops\n'):
+            with self.assertRaisesRegex(GcodeError, 'line 2'):
+                tokenize(data)
+
+    def test_tokenize_file(self):
+        with tempfile.NamedTemporaryFile(suffix='.gcode', delete=False) as f:
+            f.write(JOB.encode())
+        self.addCleanup(os.remove, f.name)
+        self.assertEqual(list(tokenize_file(f.name)), list(tokenize_file(f.name, use_mmap=False)))
+        self.assertEqual(len(tokenize_file(f.name)), 6)
+
+    def test_empty_file(self):
+        with tempfile.NamedTemporaryFile(suffix='.gcode', delete=False) as f:
+            pass
+        self.addCleanup(os.remove, f.name)
+        self.assertEqual(len(tokenize_file(f.name)), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+import ctypes
+import os
+import unittest
+
+from unittest.mock import patch
+
+import defines
+import gpio_backend
+import gpiochip_gpio
+from gpiochip_gpio import GpiochipGPIO
+from simulated_gpio import SimulatedGPIO
+
+
+class TestGPIOBackend(unittest.TestCase):
+    def test_create(self):
+        self.assertIsInstance(gpio_backend.create('simulated'), SimulatedGPIO)
+        with self.assertRaises(ValueError):
+            gpio_backend.create('parallel port')
+
+    @patch.object(defines, 'GPIO_BACKEND', 'gpiochip')
+    def test_default_name(self):
+        with patch.dict(os.environ, {gpio_backend.ENVIRONMENT_VARIABLE: ''}):
+            self.assertEqual(gpio_backend.default_name(), 'gpiochip')
+        with patch.dict(os.environ, {gpio_backend.ENVIRONMENT_VARIABLE: 'simulated'}):
+            self.assertEqual(gpio_backend.default_name(), 'simulated')
+
+
+class FakeChip():
+    """
+    Stands in for the kernel's side of the GPIO character device ioctls
+    """
+
+    def __init__(self):
+        self.next_fd = 100
+        self.lines = {}  # {fd: [offset]}
+        self.levels = {}
+        self.calls = []
+
+    def ioctl(self, fd, request, argument):
+        self.calls.append((fd, request))
+        if request == gpiochip_gpio.GPIO_GET_LINEHANDLE_IOCTL:
+            argument.fd = self.next_fd
+            self.lines[self.next_fd] = list(argument.lineoffsets[:argument.lines])
+            for offset, level in zip(self.lines[self.next_fd], argument.default_values):
+                self.levels[offset] = level
+            self.next_fd += 1
+        elif request == gpiochip_gpio.GPIOHANDLE_SET_LINE_VALUES_IOCTL:
+            for offset, level in zip(self.lines[fd], argument.values):
+                self.levels[offset] = level
+        elif request == gpiochip_gpio.GPIOHANDLE_GET_LINE_VALUES_IOCTL:
+            for i, offset in enumerate(self.lines[fd]):
+                argument.values[i] = self.levels.get(offset, 0)
+        return 0
+
+
+class TestGpiochipGPIO(unittest.TestCase):
+    def setUp(self):
+        self.chip = FakeChip()
+        patches = [
+            patch('gpiochip_gpio.os.open', return_value=3),
+            patch('gpiochip_gpio.os.close'),
+            patch('gpiochip_gpio.fcntl.ioctl', side_effect=self.chip.ioctl)
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+        self.gpio = GpiochipGPIO()
+
+    def test_ioctl_numbers(self):
+        # from linux/gpio.h
+        self.assertEqual(ctypes.sizeof(gpiochip_gpio._HandleRequest), 364)
+        self.assertEqual(gpiochip_gpio.GPIO_GET_LINEHANDLE_IOCTL, 0xC16CB403)
+        self.assertEqual(gpiochip_gpio.GPIO_GET_LINEEVENT_IOCTL, 0xC030B404)
+        self.assertEqual(gpiochip_gpio.GPIOHANDLE_GET_LINE_VALUES_IOCTL, 0xC040B408)
+        self.assertEqual(gpiochip_gpio.GPIOHANDLE_SET_LINE_VALUES_IOCTL, 0xC040B409)
+
+    def test_setmode(self):
+        self.gpio.setmode(GpiochipGPIO.BCM)
+        with self.assertRaises(ValueError):
+            self.gpio.setmode(GpiochipGPIO.BOARD)
+
+    def test_bulk_output_is_one_ioctl(self):
+        for channel in (6, 19, 22, 26):
+            self.gpio.setup(channel, GpiochipGPIO.OUT)
+        self.gpio.output((6, 19, 22, 26), (1, 0, 0, 1))
+        self.assertEqual(self.chip.lines[max(self.chip.lines)], [6, 19, 22, 26])
+
+        del self.chip.calls[:]
+        self.gpio.output((6, 19, 22, 26), (0, 1, 1, 0))
+        self.assertEqual(self.chip.calls, [(max(self.chip.lines), gpiochip_gpio.GPIOHANDLE_SET_LINE_VALUES_IOCTL)])
+        self.assertEqual([self.chip.levels[c] for c in (6, 19, 22, 26)], [0, 1, 1, 0])
+
+    def test_regrouping_keeps_levels(self):
+        self.gpio.setup(5, GpiochipGPIO.OUT)
+        self.gpio.output(5, GpiochipGPIO.HIGH)
+        self.gpio.output([5, 6], [GpiochipGPIO.HIGH, GpiochipGPIO.LOW])
+        self.gpio.output(5, GpiochipGPIO.LOW)
+        self.gpio.output(6, GpiochipGPIO.HIGH)
+        self.assertEqual((self.chip.levels[5], self.chip.levels[6]), (0, 1))
+
+    def test_input(self):
+        self.gpio.setup(27, GpiochipGPIO.IN)
+        self.assertEqual(self.gpio.input(27), GpiochipGPIO.LOW)
+        self.chip.levels[27] = 1
+        self.assertEqual(self.gpio.input(27), GpiochipGPIO.HIGH)
+
+    def test_inputs_and_outputs_can_not_be_grouped(self):
+        self.gpio.setup(27, GpiochipGPIO.IN)
+        with self.assertRaises(ValueError):
+            self.gpio.output([26, 27], [0, 0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import sys
+import unittest
+
+from concurrent.futures import Future
+from unittest.mock import Mock, patch
+
+mock_rpi = sys.modules.setdefault('RPi', Mock())
+sys.modules.setdefault('RPi.GPIO', mock_rpi.GPIO)
+from homing import Homing, HomingAxis, HomingError  # noqa: E402
+from simulated_gpio import SimulatedGPIO  # noqa: E402
+from simulated_hardware import SimulatedStepScheduler  # noqa: E402
+from stepper_motor import StepperMotor  # noqa: E402
+from switch import Switch  # noqa: E402
+
+LENGTH = 1000
+MAX_HZ = 1000.0
+
+
+class TestHoming(unittest.TestCase):
+    def setUp(self):
+        self.scheduler = SimulatedStepScheduler()
+        self.gpio = SimulatedGPIO(clock=self.scheduler.clock)
+
+    def add_axis(self, name, first_pin, switch_pin, position, is_pressed=None):
+        pins = range(first_pin, first_pin + 4)
+        motor = StepperMotor(*pins, scheduler=self.scheduler, acceleration=5000, gpio=self.gpio)
+        shaft = self.gpio.add_shaft(motor._outs, motor._sequence, position, phase=motor._i)
+        self.gpio.add_limit_switch(switch_pin, is_pressed or (lambda: shaft.position <= 0))
+        switch = Switch(switch_pin, gpio=self.gpio, scheduler=self.scheduler)
+        return HomingAxis(name, [motor], switch, MAX_HZ, LENGTH), shaft
+
+    def test_homes_to_the_switch(self):
+        for start in (0, 5, 333, 900):
+            axis, shaft = self.add_axis('x', 4 * start + 100, start + 10, start)
+            results = Homing(self.scheduler, [axis]).run()
+
+            self.assertEqual(shaft.position, 0)
+            self.assertEqual(axis.motors[0]._pos, 0)
+            self.assertEqual(results['x'].name, 'x')
+            self.assertEqual(results['x'].offset, 0)
+            self.assertGreater(results['x'].time, 0)
+
+    def test_axes_home_in_parallel(self):
+        axis_x, shaft_x = self.add_axis('x', 100, 10, 800)
+        axis_z, shaft_z = self.add_axis('z', 110, 11, 100)
+        start = self.scheduler.now()
+        results = Homing(self.scheduler, [axis_x, axis_z]).run()
+
+        self.assertEqual((shaft_x.position, shaft_z.position), (0, 0))
+        self.assertLess(results['z'].time, results['x'].time)
+        self.assertAlmostEqual(self.scheduler.now() - start, results['x'].time, places=3)
+
+    def test_missing_switch(self):
+        axis, shaft = self.add_axis('x', 100, 10, 500, is_pressed=lambda: False)
+        with self.assertRaisesRegex(HomingError, 'the x axis did not reach its limit switch'):
+            Homing(self.scheduler, [axis], backoff=10).run()
+        self.assertEqual(shaft.position, 500 - LENGTH - 10)
+
+    def test_stuck_switch(self):
+        axis, _ = self.add_axis('x', 100, 10, 500, is_pressed=lambda: True)
+        with self.assertRaisesRegex(HomingError, 'still at its limit switch'):
+            Homing(self.scheduler, [axis]).run()
+
+    def test_timeout(self):
+        axis, shaft = self.add_axis('x', 100, 10, 900)
+        with self.assertRaisesRegex(HomingError, 'did not home within 0.2 seconds'):
+            Homing(self.scheduler, [axis], timeout=.2).run()
+        self.assertAlmostEqual(self.scheduler.now(), .2)
+        self.assertGreater(shaft.position, 0)
+
+    def test_move_failure(self):
+        axis, shaft = self.add_axis('x', 100, 10, 500)
+        motor = axis.motors[0]
+        set_stepper = motor.set_stepper
+
+        def failing_set_stepper(frequency, steps):
+            if not steps:
+                return set_stepper(frequency, steps)
+            future = Future()
+            future.set_exception(RuntimeError('lost a step'))
+            return future
+
+        with patch.object(motor, 'set_stepper', failing_set_stepper), \
+                self.assertRaisesRegex(HomingError, 'the x axis failed to move: lost a step'):
+            Homing(self.scheduler, [axis]).run()
+        self.assertEqual(shaft.position, 500)
+
+    def test_failures_do_not_stop_other_axes(self):
+        axis_x, _ = self.add_axis('x', 100, 10, 500, is_pressed=lambda: False)
+        axis_z, shaft_z = self.add_axis('z', 110, 11, 300)
+        with self.assertRaisesRegex(HomingError, 'the x axis'):
+            Homing(self.scheduler, [axis_x, axis_z]).run()
+        self.assertEqual(shaft_z.position, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+import os
+import tempfile
+import unittest
+
+from gcode import Move, ToolChange
+from image_to_toolpath import Image, PixelStroke, ToolpathGenerator, choose_palette, read_ppm
+
+WHITE = (255, 255, 255)
+RED = (200, 20, 20)
+BLUE = (10, 10, 220)
+
+
+def make_image(width, height, color_at):
+    pixels = bytearray()
+    for y in range(height):
+        for x in range(width):
+            pixels.extend(color_at(x, y))
+    return Image(width, height, bytes(pixels))
+
+
+def flag(x, y):
+    """
+    A red square on the left, a blue bar on the right, and white everywhere else
+    """
+    if 2 <= x < 10 and 2 <= y < 10:
+        return (210, 30, 25)
+    if 14 <= x < 18:
+        return (0, 20, 240)
+    return (250, 250, 245)
+
+
+class TestReadPPM(unittest.TestCase):
+    def write(self, data):
+        with tempfile.NamedTemporaryFile(suffix='.ppm', delete=False) as f:
+            f.write(data)
+        self.addCleanup(os.remove, f.name)
+        return f.name
+
+    def test_ppm(self):
+        path = self.write(b'P6\n# a comment\n2 1\n255\n' + bytes(RED + BLUE))
+        self.assertEqual(read_ppm(path), Image(2, 1, bytes(RED + BLUE)))
+
+    def test_pgm(self):
+        self.assertEqual(read_ppm(self.write(b'P5 2 1 255\n\x00\x80')), Image(2, 1, b'\x00\x00\x00\x80\x80\x80'))
+
+    def test_unsupported(self):
+        for data in (b'P3\n1 1\n255\n0 0 0\n', b'P6\n1 1\n65535\n\x00\x00', b'P6\n2 2\n255\n\x00'):
+            with self.assertRaises(ValueError):
+                read_ppm(self.write(data))
+
+
+class TestToolpathGenerator(unittest.TestCase):
+    def setUp(self):
+        self.image = make_image(20, 12, flag)
+
+    def test_strokes(self):
+        generator = ToolpathGenerator([RED, BLUE], width=20, brush_width=4, min_length=1, workers=1)
+        self.assertEqual(generator.strokes(self.image), [
+            PixelStroke(0, 2, 2, 9), PixelStroke(0, 6, 2, 9),
+            PixelStroke(1, 2, 14, 17), PixelStroke(1, 6, 14, 17), PixelStroke(1, 10, 14, 17)
+        ])
+
+    def test_short_runs_are_dropped(self):
+        image = make_image(20, 1, lambda x, y: RED if x == 5 else WHITE)
+        self.assertEqual(ToolpathGenerator([RED], width=20, brush_width=1, min_length=2, workers=1).strokes(image), [])
+
+    def test_without_background(self):
+        generator = ToolpathGenerator([RED, BLUE, WHITE], width=20, background=None, brush_width=4,
+                                      min_length=1, workers=1)
+        self.assertEqual({stroke.tool for stroke in generator.strokes(self.image)}, {0, 1, 2})
+
+    def test_tiles_in_parallel(self):
+        image = make_image(64, 64, lambda x, y: RED if (x // 8 + y // 8) % 2 else BLUE)
+        serial = ToolpathGenerator([RED, BLUE], width=64, brush_width=1, tile_rows=4, workers=1)
+        parallel = ToolpathGenerator([RED, BLUE], width=64, brush_width=1, tile_rows=4, workers=2)
+        self.assertEqual(serial.strokes(image), parallel.strokes(image))
+        self.assertEqual(len(serial.strokes(image)), 64 * 8)
+
+    def test_actions(self):
+        generator = ToolpathGenerator([RED, BLUE], width=40, brush_width=8, paint_z=3, travel_z=0, feed_rate=5,
+                                      min_length=1, workers=1)
+        actions = generator.actions(self.image)
+        self.assertEqual(actions[:5], [
+            ToolChange(None, 0),
+            Move(None, None, None, 0, None), Move(None, 5, 19, None, None), Move(None, None, None, 3, 5),
+            Move(None, 19, 19, None, 5)
+        ])
+        # The second line goes the other way
+        self.assertEqual(actions[6:9], [Move(None, 19, 11, None, None), Move(None, None, None, 3, 5),
+                                        Move(None, 5, 11, None, 5)])
+        self.assertEqual([a.tool for a in actions if isinstance(a, ToolChange)], [0, 1])
+        self.assertEqual(actions[-1], Move(None, None, None, 0, None))
+
+
+class TestChoosePalette(unittest.TestCase):
+    def test_finds_the_colors(self):
+        image = make_image(20, 20, lambda x, y: RED if x < 10 else BLUE)
+        self.assertEqual(sorted(choose_palette(image, 2)), sorted([RED, BLUE]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+import threading
+import unittest
+
+from unittest.mock import Mock
+from jog_sender import JogSender
+from jog_trace import JogTrace
+
+
+class FakeMachine():
+    """
+    Records lines, and blocks on each one until released, like do_line while the machine moves
+    """
+
+    def __init__(self):
+        self.lines = []
+        self.release = threading.Event()
+        self.condition = threading.Condition()
+        self.succeeds = True
+
+    def do_line(self, line):
+        with self.condition:
+            self.lines.append(line)
+            self.condition.notify_all()
+        self.release.wait(2)
+        return self.succeeds
+
+    def wait_for_lines(self, count, timeout=2):
+        with self.condition:
+            return self.condition.wait_for(lambda: len(self.lines) >= count, timeout)
+
+
+def distances(line):
+    return [float(word[1:]) for word in line.split()[1:5]]
+
+
+class TestJogSender(unittest.TestCase):
+    def setUp(self):
+        self.machine = FakeMachine()
+        self.kill = Mock()
+        self.sender = JogSender(self.machine.do_line, kill_callback=self.kill, max_latency=.25)
+        self.addCleanup(self.sender.stop, 2)
+        self.addCleanup(self.machine.release.set)
+
+        # the machine is busy with the first line until released
+        self.assertTrue(self.sender.send('G91'))
+        self.assertTrue(self.machine.wait_for_lines(1))
+
+    def test_keeps_order(self):
+        for line in ('T1', 'G28', 'M72 P7'):
+            self.assertTrue(self.sender.send(line))
+        self.machine.release.set()
+        self.sender.stop(2)
+        self.assertEqual(self.machine.lines, ['G91', 'T1', 'G28', 'M72 P7'])
+
+    def test_merges_same_motion(self):
+        for _ in range(4):
+            self.sender.send('G1 X0.02 Y0.0 Z0.0 E0.0 F60.0')
+        self.machine.release.set()
+        self.sender.stop(2)
+        self.assertEqual(len(self.machine.lines), 2)
+        for actual, expected in zip(distances(self.machine.lines[1]), [0.08, 0, 0, 0]):
+            self.assertAlmostEqual(actual, expected)
+        self.assertEqual(self.sender.merged, 3)
+
+    def test_replaces_stale_motion(self):
+        self.sender.send('G1 X0.02 Y0.0 Z0.0 E0.0 F60.0')
+        self.sender.send('T1')
+        self.sender.send('G1 X0.0 Y-0.02 Z0.0 E0.0 F60.0')
+        self.machine.release.set()
+        self.sender.stop(2)
+        self.assertEqual(self.machine.lines, ['G91', 'T1', 'G1 X0.0000 Y-0.0200 Z0.0000 E0.0000 F60.0000'])
+
+    def test_limits_latency(self):
+        # each move takes half a second at 1 mm/second, so it is cut to a quarter of a second
+        self.sender.send('G1 X0.3 Y0.4 Z0.0 E0.0 F60.0')
+        self.sender.send('G1 X0.3 Y0.4 Z0.0 E0.0 F60.0')
+        self.machine.release.set()
+        self.sender.stop(2)
+        for actual, expected in zip(distances(self.machine.lines[1]), [0.15, 0.2, 0, 0]):
+            self.assertAlmostEqual(actual, expected)
+
+    def test_absolute_moves_are_not_merged(self):
+        self.sender.send('G90')
+        self.sender.send('G1 X1 F60')
+        self.sender.send('G1 X2 F60')
+        self.machine.release.set()
+        self.sender.stop(2)
+        self.assertEqual(self.machine.lines, ['G91', 'G90', 'G1 X1 F60', 'G1 X2 F60'])
+
+    def test_kill_skips_queue(self):
+        self.sender.send('G1 X0.02 Y0.0 Z0.0 E0.0 F60.0')
+        self.sender.kill()
+        self.kill.assert_called_once_with()
+        self.assertFalse(self.sender.send('G1 X0.02 Y0.0 Z0.0 E0.0 F60.0'))
+        self.machine.release.set()
+        self.sender.stop(2)
+        self.assertEqual(self.machine.lines, ['G91'])
+
+    def test_failure_stops_sending(self):
+        self.machine.succeeds = False
+        self.machine.release.set()
+        self.sender.stop(2)
+        self.assertFalse(self.sender.send('T1'))
+
+
+class TestJogSenderTrace(unittest.TestCase):
+    def test_merged_moves_run_as_the_latest_command(self):
+        machine = FakeMachine()
+        trace = JogTrace()
+        sender = JogSender(lambda line: trace.step() or machine.do_line(line), trace=trace)
+        self.addCleanup(sender.stop, 2)
+        self.addCleanup(machine.release.set)
+        sender.send('G91')
+        self.assertTrue(machine.wait_for_lines(1))
+
+        for _ in range(3):
+            trace.command()
+            sender.send('G1 X0.02 Y0.0 Z0.0 E0.0 F60.0')
+        machine.release.set()
+        sender.stop(2)
+        snapshot = trace.snapshot()
+        self.assertEqual((snapshot.commands, snapshot.moved), (3, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
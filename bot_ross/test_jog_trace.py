@@ -0,0 +1,95 @@
+import unittest
+
+from jog_trace import JogTrace
+
+
+class FakeClock():
+    def __init__(self):
+        self.time = 0.0
+
+    def __call__(self):
+        return self.time
+
+
+class TestJogTrace(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.trace = JogTrace(capacity=8, clock=self.clock)
+
+    def at(self, time):
+        self.clock.time = time
+
+    def test_empty(self):
+        snapshot = self.trace.snapshot()
+        self.assertEqual(snapshot.commands, 0)
+        self.assertEqual(snapshot.command_rate, 0)
+        self.assertEqual(snapshot.total.p50, 0)
+        self.assertIsNone(self.trace.latest)
+
+    def test_correlates_stages(self):
+        self.at(1.0)
+        self.trace.event()
+        self.at(1.5)
+        self.trace.event()  # the first event since the last command counts
+        self.at(2.0)
+        command_id = self.trace.command()
+        self.at(2.5)
+        self.trace.step()
+        self.at(2.75)
+        self.trace.step()  # only the first step counts
+        self.at(3.0)
+        self.trace.sent(command_id)
+
+        snapshot = self.trace.snapshot()
+        self.assertEqual((snapshot.commands, snapshot.moved), (1, 1))
+        self.assertEqual(snapshot.input.p50, 1.0)
+        self.assertEqual(snapshot.send.p50, 1.0)
+        self.assertEqual(snapshot.motion.p50, .5)
+        self.assertEqual(snapshot.total.max, 1.5)
+
+    def test_commands_without_events(self):
+        for i in range(4):
+            self.at(i)
+            self.trace.command()
+            self.at(i + .25)
+            self.trace.step()
+
+        snapshot = self.trace.snapshot()
+        self.assertEqual(snapshot.moved, 4)
+        self.assertEqual(snapshot.command_rate, 1.0)
+        self.assertEqual(snapshot.motion.p99, .25)
+        self.assertEqual(snapshot.input.max, 0)
+        self.assertEqual(snapshot.total.max, 0)
+
+    def test_queued_commands_run_when_told(self):
+        first = self.trace.command()
+        self.trace.running(first)
+        self.at(1.0)
+        self.trace.command()
+        self.at(2.0)
+        self.trace.command()
+        self.trace.step()  # still the first command's move
+        self.at(3.0)
+        self.trace.running(self.trace.latest)  # the second was replaced by the third
+        self.trace.step()
+
+        snapshot = self.trace.snapshot()
+        self.assertEqual((snapshot.commands, snapshot.moved), (3, 2))
+        self.assertEqual(snapshot.motion, (1.0, 2.0, 2.0, 2.0))
+
+    def test_ring_keeps_latest(self):
+        for i in range(20):
+            self.at(i)
+            self.trace.event()
+            self.trace.command()
+            self.at(i + (2 if i >= 16 else 1))
+            self.trace.step()
+
+        snapshot = self.trace.snapshot()
+        self.assertEqual((snapshot.commands, snapshot.moved), (20, 8))
+        self.assertEqual(snapshot.total.p50, 1)
+        self.assertEqual(snapshot.total.p95, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
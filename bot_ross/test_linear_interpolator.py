@@ -0,0 +1,87 @@
+import sys
+import unittest
+
+from unittest.mock import Mock
+
+mock_rpi = sys.modules.setdefault('RPi', Mock())
+sys.modules.setdefault('RPi.GPIO', mock_rpi.GPIO)
+from linear_interpolator import LinearInterpolator, path_frequency  # noqa: E402
+from step_scheduler import StepScheduler  # noqa: E402
+from stepper_motor import StepperMotorDirection  # noqa: E402
+
+
+class TestLinearInterpolator(unittest.TestCase):
+    def setUp(self):
+        self.mock_scheduler = Mock(spec=StepScheduler)
+        self.mock_scheduler.now.return_value = 0
+        self.interpolator = LinearInterpolator(self.mock_scheduler)
+
+    def run_move(self):
+        """
+        Call the scheduled tick until the move finishes, recording which axes step on each tick
+        """
+        tick = self.mock_scheduler.schedule.call_args[0][0]
+        deadline = 0
+        deadlines = []
+        while deadline is not None:
+            deadlines.append(deadline)
+            deadline = tick(deadline)
+        return deadlines
+
+    def test_telemetry(self):
+        telemetry = Mock()
+        self.interpolator = LinearInterpolator(self.mock_scheduler, telemetry=telemetry)
+        self.interpolator.move([([Mock()], 3)], 100)
+        self.mock_scheduler.now.return_value = .5
+        self.run_move()
+        self.assertEqual([c[0] for c in telemetry.record.call_args_list], [(0, .5), (.01, .5), (.02, .5)])
+
+    def test_move(self):
+        x, y_left, y_right = Mock(), Mock(), Mock()
+        self.interpolator.move([([x], 8), ([y_left, y_right], -4)], 100)
+        x.set_stepper.assert_called_once_with(0, 0)
+        self.assertFalse(self.interpolator.is_complete())
+
+        deadlines = self.run_move()
+
+        self.assertEqual(len(deadlines), 8)
+        self.assertAlmostEqual(deadlines[-1], .07)
+        self.assertTrue(self.interpolator.is_complete())
+        self.assertEqual(x.advance.call_count, 8)
+        x.advance.assert_called_with(StepperMotorDirection.FORWARD)
+        self.assertEqual(y_left.advance.call_count, 4)
+        self.assertEqual(y_right.advance.call_count, 4)
+        y_right.advance.assert_called_with(StepperMotorDirection.REVERSE)
+
+    def test_move_stays_on_line(self):
+        steps = []
+        x = Mock()
+        y = Mock()
+        x.advance.side_effect = lambda _: steps.append('x')
+        y.advance.side_effect = lambda _: steps.append('y')
+        self.interpolator.move([([x], 9), ([y], 3)], 100)
+
+        self.run_move()
+
+        # y steps once in the middle of every three x steps
+        self.assertEqual(''.join(steps), 'xxyxxxyxxxyx')
+
+    def test_move_nowhere(self):
+        self.interpolator.move([([Mock()], 0)], 100, wait=True)
+        self.mock_scheduler.schedule.assert_not_called()
+        self.assertTrue(self.interpolator.is_complete())
+
+    def test_stop(self):
+        self.interpolator.move([([Mock()], 10)], 100)
+        handle = self.mock_scheduler.schedule.return_value
+        self.interpolator.stop()
+        self.mock_scheduler.cancel.assert_called_once_with(handle)
+        self.assertTrue(self.interpolator.is_complete())
+
+    def test_path_frequency(self):
+        self.assertAlmostEqual(path_frequency([3, -4, 0], 10), 8)
+        self.assertEqual(path_frequency([0, 0], 10), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
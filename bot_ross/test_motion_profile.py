@@ -0,0 +1,45 @@
+import unittest
+
+from motion_profile import step_intervals
+
+
+class TestMotionProfile(unittest.TestCase):
+    def test_short_moves(self):
+        self.assertEqual(len(step_intervals(0, 100, 1000)), 0)
+        self.assertEqual(len(step_intervals(1, 100, 1000)), 0)
+        self.assertEqual(len(step_intervals(-2, 100, 1000)), 1)
+
+    def test_trapezoidal(self):
+        intervals = step_intervals(1000, 500, 2000)
+        self.assertEqual(len(intervals), 999)
+
+        # symmetric ramps that speed up, cruise at max_velocity, then slow down
+        self.assertEqual(list(intervals), list(reversed(intervals)))
+        self.assertGreater(intervals[0], intervals[1])
+        self.assertAlmostEqual(intervals[500], 1 / 500)
+        self.assertGreaterEqual(min(intervals), 1 / 500 - 1e-9)
+
+    def test_triangular(self):
+        # too short to reach max_velocity
+        intervals = step_intervals(11, 500, 2000)
+        self.assertEqual(len(intervals), 10)
+        self.assertEqual(list(intervals), list(reversed(intervals)))
+        self.assertGreater(min(intervals), 1 / 500)
+
+    def test_s_curve(self):
+        trapezoidal = step_intervals(1000, 500, 2000)
+        s_curve = step_intervals(1000, 500, 2000, jerk=20000)
+        self.assertEqual(len(s_curve), 999)
+        self.assertAlmostEqual(s_curve[500], 1 / 500)
+
+        # limiting jerk makes the start gentler and the move a little longer
+        self.assertGreater(s_curve[0], trapezoidal[0])
+        self.assertGreater(sum(s_curve), sum(trapezoidal))
+
+    def test_faster_than_constant_safe_speed(self):
+        # starting at 100 Hz is safe without ramping, but ramping lets a long move cruise at 500 Hz
+        self.assertLess(sum(step_intervals(5000, 500, 2000)), 4999 / 100)
+
+
+if __name__ == '__main__':
+    unittest.main()
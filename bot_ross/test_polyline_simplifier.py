@@ -0,0 +1,102 @@
+import math
+import random
+import unittest
+
+from gcode import Home, Move, ToolChange
+from polyline_simplifier import PolylineSimplifier, simplify_points
+
+
+def path(actions, position=(0.0, 0.0, 0.0)):
+    """
+    Every point the moves go through, with the feed rate they get there at
+    """
+    points = []
+    position = list(position)
+    for action in actions:
+        if isinstance(action, Move):
+            position = [p if m is None else m for m, p in zip((action.x, action.y, action.z), position)]
+            points.append((tuple(position), action.feed_rate))
+    return points
+
+
+def distance_to_polyline(point, polyline):
+    best = math.inf
+    for a, b in zip(polyline, polyline[1:]):
+        direction = [e - s for s, e in zip(a, b)]
+        length_squared = sum(d * d for d in direction) or 1
+        t = min(1, max(0, sum((p - s) * d for p, s, d in zip(point, a, direction)) / length_squared))
+        best = min(best, math.sqrt(sum((p - s - t * d) ** 2 for p, s, d in zip(point, a, direction))))
+    return best
+
+
+class TestSimplifyPoints(unittest.TestCase):
+    def test_collinear(self):
+        points = [(i, 2 * i, 0) for i in range(10)]
+        self.assertEqual(simplify_points(points, .01), [0, 9])
+
+    def test_corner(self):
+        points = [(0, 0, 0), (1, 0, 0), (2, 0, 0), (2, 1, 0), (2, 2, 0)]
+        self.assertEqual(simplify_points(points, .01), [0, 2, 4])
+
+    def test_near_collinear(self):
+        points = [(0, 0, 0), (1, .01, 0), (2, -.01, 0), (3, 0, 0)]
+        self.assertEqual(simplify_points(points, .05), [0, 3])
+        self.assertEqual(simplify_points(points, .005), [0, 1, 2, 3])
+
+    def test_short(self):
+        self.assertEqual(simplify_points([(0, 0, 0)], 1), [0])
+        self.assertEqual(simplify_points([], 1), [])
+
+
+class TestPolylineSimplifier(unittest.TestCase):
+    def test_merges_xbox_style_relative_moves(self):
+        moves = [Move(i + 1, (i + 1) * .5, (i + 1) * .25, None, 10) for i in range(100)]
+        simplifier = PolylineSimplifier(.01)
+        self.assertEqual(list(simplifier.simplify(moves)), [Move(100, 50, 25, 0, 10)])
+        self.assertEqual((simplifier.moves_in, simplifier.moves_out), (100, 1))
+        self.assertAlmostEqual(simplifier.reduction, .99)
+
+    def test_drops_moves_that_go_nowhere(self):
+        moves = [Move(1, 1, 0, 0, 10), Move(2, 1, None, None, 10), Move(3, None, 0, 0, None)]
+        self.assertEqual(list(PolylineSimplifier(.01).simplify(moves)), [Move(1, 1, 0, 0, 10)])
+
+    def test_feed_rates_and_other_actions_split_runs(self):
+        moves = [Move(1, 1, 0, 0, 10), Move(2, 2, 0, 0, 10), Move(3, 3, 0, 0, 20), Move(4, 4, 0, 0, 20),
+                 ToolChange(5, 1), Move(6, 5, 0, 0, 20), Home(7), Move(8, 1, 0, 0, 20)]
+        self.assertEqual(list(PolylineSimplifier(.01).simplify(moves)), [
+            Move(2, 2, 0, 0, 10), Move(4, 4, 0, 0, 20), ToolChange(5, 1), Move(6, 5, 0, 0, 20), Home(7),
+            Move(8, 1, 0, 0, 20)
+        ])
+
+    def test_stays_within_tolerance(self):
+        rng = random.Random(3)
+        position = [0.0, 0.0, 0.0]
+        moves = []
+        heading = 0
+        for i in range(500):
+            heading += rng.gauss(0, .05)
+            position = [position[0] + math.cos(heading) * .2, position[1] + math.sin(heading) * .2, 0]
+            moves.append(Move(i, position[0], position[1], None, 10))
+
+        for window in (16, 10000):
+            simplifier = PolylineSimplifier(.05, window=window)
+            simplified = list(simplifier.simplify(moves))
+            self.assertLess(len(simplified), len(moves) / 5)
+            polyline = [(0, 0, 0)] + [point for point, _ in path(simplified)]
+            self.assertEqual(polyline[-1], tuple(position))
+            for point, _ in path(moves):
+                self.assertLessEqual(distance_to_polyline(point, polyline), .05 + 1e-9)
+
+    def test_streaming_holds_back_at_most_a_window(self):
+        simplifier = PolylineSimplifier(.01, window=8)
+        ready = []
+        for i in range(1, 101):
+            # a zigzag, so every point is a corner
+            ready.extend(simplifier.feed(Move(i, i, i % 2, None, 10)))
+            self.assertGreaterEqual(len(ready), i - 8)
+        ready.extend(simplifier.flush())
+        self.assertEqual([move.line_number for move in ready], list(range(1, 101)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+import unittest
+
+from array import array
+from unittest.mock import patch
+
+import defines
+from gcode import Home, Move, ToolChange
+from preview import PreviewRenderer, bounds, heatmap_image
+from toolpath_optimizer import estimate_time
+
+RATES = {'STEPPER_X_MAX_HZ': 1000.0, 'STEPPER_Y_MAX_HZ': 1000.0, 'STEPPER_Z_MAX_HZ': 1000.0}
+
+WHITE = (255, 255, 255)
+RED = (255, 0, 0)
+BLUE = (0, 0, 255)
+GRAY = (128, 128, 128)
+
+# Lift the brush, and lower it to the paint height the renderers under test use
+UP = Move(None, None, None, 0, None)
+DOWN = Move(None, None, None, 1, 10)
+
+
+def pixel(image, x, y):
+    offset = 3 * (y * image.width + x)
+    return tuple(image.pixels[offset:offset + 3])
+
+
+class TestPreviewRenderer(unittest.TestCase):
+    def setUp(self):
+        patcher = patch.multiple(defines, **RATES)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.renderer = PreviewRenderer([RED, BLUE], brush_width=3, travel_color=GRAY, paint_z=1)
+
+    def test_paint_and_travel(self):
+        actions = [Move(None, 2, 5, None, None), DOWN, Move(None, 17, 5, None, 10), UP, Move(None, 17, 15, None, None)]
+        preview = self.renderer.render(actions, (0, 0, 20, 20))
+        image = preview.image
+        self.assertEqual((image.width, image.height), (20, 20))
+        # The brush is three pixels wide, and row 14 from the top is y = 5
+        for x in range(2, 18):
+            for y in (13, 14, 15):
+                self.assertEqual(pixel(image, x, y), RED)
+        self.assertEqual(pixel(image, 10, 12), WHITE)
+        self.assertEqual(pixel(image, 17, 8), GRAY)
+        self.assertEqual(pixel(image, 0, 19), GRAY)
+        self.assertEqual((preview.paint_length, preview.travel_length), (15, 10 + (4 + 25) ** .5))
+        self.assertEqual(preview.time, estimate_time(actions))
+
+    def test_later_paint_covers_earlier_paint(self):
+        actions = [Move(None, 10, 0, None, None), DOWN, Move(None, 10, 20, None, 10), UP, ToolChange(None, 1),
+                   Move(None, 0, 10, None, None), DOWN, Move(None, 20, 10, None, 10)]
+        image = self.renderer.render(actions, (0, 0, 20, 20)).image
+        self.assertEqual(pixel(image, 10, 9), BLUE)
+        self.assertEqual(pixel(image, 10, 3), RED)
+
+    def test_long_moves_covered_by_later_paint(self):
+        actions = [Move(None, 50, 0, None, None), DOWN, Move(None, 50, 100, None, 10), UP, ToolChange(None, 1)]
+        for x in range(0, 101, 2):
+            actions += [Move(None, x, 0, None, None), DOWN, Move(None, x, 100, None, 10), UP]
+        actions += [ToolChange(None, 0), Move(None, 20, 0, None, None), DOWN, Move(None, 20, 60, None, 10)]
+        image = self.renderer.render(actions, (0, 0, 100, 100)).image
+        self.assertEqual(pixel(image, 50, 50), BLUE)
+        self.assertEqual(pixel(image, 20, 69), RED)
+        self.assertEqual(pixel(image, 20, 19), BLUE)
+
+    def test_without_heatmaps(self):
+        actions = [Move(None, 2, 5, None, None), DOWN, Move(None, 17, 15, None, 10), UP, Move(None, 0, 0, None, None)]
+        preview = PreviewRenderer([RED, BLUE], brush_width=3, travel_color=GRAY, paint_z=1,
+                                  heatmaps=False).render(actions, (0, 0, 20, 20))
+        self.assertIsNone(preview.paint_heatmap)
+        self.assertIsNone(preview.travel_heatmap)
+        self.assertEqual(preview.image, self.renderer.render(actions, (0, 0, 20, 20)).image)
+        self.assertEqual(preview.time, estimate_time(actions))
+
+    def test_heatmaps(self):
+        actions = [DOWN, Move(None, 0, 5, None, 10), Move(None, 0, 0, None, 10), Move(None, 0, 5, None, 10),
+                   Home(None), Move(None, 9, 0, None, None)]
+        preview = self.renderer.render(actions, (0, 0, 10, 10))
+        bottom_left = 9 * 10
+        self.assertEqual(pixel(preview.paint_heatmap, 0, 7), (255, 255, 255))  # passed over twice
+        self.assertEqual(pixel(preview.paint_heatmap, 5, 5), (0, 0, 0))
+        self.assertNotEqual(preview.travel_heatmap.pixels[3 * bottom_left:3 * bottom_left + 3], b'\x00\x00\x00')
+
+    def test_brush_height_decides_paint(self):
+        # A rapid move with the brush down paints, and a feed move with it up travels
+        actions = [Move(None, None, None, 1, None), Move(None, 10, 0, None, None), Move(None, None, None, 0, 10),
+                   Move(None, 10, 10, None, 10)]
+        preview = self.renderer.render(actions, (0, 0, 20, 20))
+        self.assertEqual((preview.paint_length, preview.travel_length), (10, 10))
+        self.assertEqual(pixel(preview.image, 5, 19), RED)
+        self.assertEqual(pixel(preview.image, 10, 14), GRAY)
+
+    def test_diagonal(self):
+        preview = self.renderer.render([DOWN, Move(None, 15, 15, None, 10)], (0, 0, 20, 20))
+        for k in range(16):
+            self.assertEqual(pixel(preview.image, k, 19 - k), RED)
+            self.assertEqual(pixel(preview.paint_heatmap, k, 19 - k), (255, 255, 255))  # each passed over once
+        self.assertEqual(pixel(preview.image, 8, 12), RED)  # within the brush
+        self.assertEqual(pixel(preview.image, 15, 19), WHITE)
+        self.assertEqual(pixel(preview.image, 8, 13), WHITE)
+
+    def test_default_area(self):
+        preview = self.renderer.render([Move(None, 10, 4, None, 10)])
+        self.assertEqual((preview.image.width, preview.image.height), (13, 7))
+
+
+class TestBounds(unittest.TestCase):
+    def test_bounds(self):
+        actions = [Move(None, 5, None, 1, None), Move(None, None, -3, None, 10), Home(None), Move(None, 2, 8, 0, None)]
+        self.assertEqual(bounds(actions, (1, 1, 0)), (0, -3, 5, 8))
+
+
+class TestHeatmapImage(unittest.TestCase):
+    def test_scale(self):
+        image = heatmap_image(3, 1, array('I', [0, 1, 1000]))
+        self.assertEqual(image.pixels[:3], b'\x00\x00\x00')
+        self.assertEqual(image.pixels[6:], b'\xff\xff\xff')
+        self.assertGreater(image.pixels[3], 0)
+
+    def test_empty(self):
+        self.assertEqual(heatmap_image(2, 1, array('I', [0, 0])).pixels, bytes(6))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,167 @@
+import defines
+import io
+import sys
+import unittest
+
+from unittest.mock import Mock, call, patch
+from gcode import GcodeExecutor
+from jog_trace import JogTrace
+from session_log import BUTTONS, ControllerState, GcodeLine, ReplayController, SessionRecorder, read_session, \
+    replay, replay_controller
+from simulated_hardware import SimulatedMachine, VirtualClock
+from test_simulated_hardware import SIMULATED_DEFINES
+
+sys.modules.setdefault('xbox360controller', Mock())  # replay_controller imports it, and it only installs on Linux
+
+
+def controller(lx=0.0, ly=0.0, trigger_r=0.0, pressed=()):
+    controller = Mock()
+    controller.axis_l.x, controller.axis_l.y = lx, ly
+    controller.axis_r.x = controller.axis_r.y = 0
+    controller.trigger_l.value, controller.trigger_r.value = 0, trigger_r
+    controller.hat.x, controller.hat.y = 0, -1
+    for name in BUTTONS:
+        getattr(controller, name).is_pressed = name in pressed
+    return controller
+
+
+class TestSessionRecorder(unittest.TestCase):
+    def setUp(self):
+        self.clock = VirtualClock(100.0)
+        self.file = io.BytesIO()
+        self.recorder = SessionRecorder(self.file, clock=self.clock)
+
+    def read(self):
+        self.recorder.flush()
+        return read_session(io.BytesIO(self.file.getvalue()))
+
+    def test_round_trip(self):
+        self.clock.advance_to(100.5)
+        self.recorder.record_state(controller(lx=1.0, ly=-.5, trigger_r=.25, pressed=['button_b']))
+        self.recorder.record_gcode('G1 X0.1 Y-0.05 Z0.0 E0.0 F60.0')
+        self.clock.advance_to(101.25)
+        self.recorder.record_gcode('M72 P7')
+
+        state, move, sound = self.read()
+        self.assertIsInstance(state, ControllerState)
+        self.assertEqual(state.time, .5)
+        # sticks and triggers are stored to within 1/32767
+        self.assertEqual([round(v, 4) for v in (state.axis_l_x, state.axis_l_y, state.trigger_r)], [1.0, -.5, .25])
+        self.assertEqual((state.hat_x, state.hat_y, state.buttons), (0, -1, 0b10))
+        self.assertEqual(move, GcodeLine(.5, 'G1 X0.1 Y-0.05 Z0.0 E0.0 F60.0'))
+        self.assertEqual(sound, GcodeLine(1.25, 'M72 P7'))
+
+    def test_skips_repeated_states(self):
+        for _ in range(3):
+            self.recorder.record_state(controller(lx=.5))
+        self.recorder.record_state(controller())
+        self.assertEqual([round(record.axis_l_x, 4) for record in self.read()], [.5, 0])
+
+    def test_compact(self):
+        for _ in range(100):
+            self.recorder.record_state(controller(lx=.5))
+            self.recorder.record_gcode('G1 X0.0166 Y0.0 Z0.0 E0.0 F30.0')
+        self.recorder.flush()
+        self.assertLess(len(self.file.getvalue()), 100 * 60)
+
+    def test_not_a_session(self):
+        with self.assertRaisesRegex(ValueError, 'not a'):
+            read_session(io.BytesIO(b'G1 X1\n'))
+
+    def test_cut_short(self):
+        self.recorder.record_gcode('G28')
+        self.recorder.flush()
+        with self.assertRaisesRegex(ValueError, 'cut short'):
+            read_session(io.BytesIO(self.file.getvalue()[:-1]))
+
+
+class TestReplay(unittest.TestCase):
+    def setUp(self):
+        self.clock = VirtualClock()
+        self.session = [GcodeLine(0.0, 'G91'), ControllerState(.5, 1, 0, 0, 0, 0, 0, 0, 0, 0),
+                        GcodeLine(.5, 'G1 X0.1 F60'), GcodeLine(2.0, 'G1 X0.1 F60')]
+        self.lines = []
+
+    def callback(self, line):
+        self.lines.append((self.clock(), line))
+        return True
+
+    def sleep(self, seconds):
+        self.clock.advance_to(self.clock() + seconds)
+
+    def test_accelerated(self):
+        result = replay(self.session, self.callback, speed=2.0, clock=self.clock, sleep=self.sleep)
+        self.assertEqual(self.lines, [(0.0, 'G91'), (.25, 'G1 X0.1 F60'), (1.0, 'G1 X0.1 F60')])
+        self.assertEqual((result.lines, result.failed, result.elapsed), (3, False, 1.0))
+        self.assertEqual(result.lines_per_second, 3.0)
+        self.assertEqual(result.lateness.max, 0)
+
+    def test_as_fast_as_possible(self):
+        sleep = Mock()
+        result = replay(self.session, self.callback, speed=None, clock=self.clock, sleep=sleep)
+        sleep.assert_not_called()
+        self.assertEqual(result.lines, 3)
+
+    def test_stops_when_refused(self):
+        result = replay(self.session, lambda line: line == 'G91', speed=None)
+        self.assertEqual((result.lines, result.failed), (2, True))
+
+    def test_speed_must_be_positive(self):
+        for speed in (0, -1.0):
+            with self.assertRaisesRegex(ValueError, 'positive'):
+                replay(self.session, self.callback, speed=speed)
+            with self.assertRaisesRegex(ValueError, 'positive'):
+                replay_controller(self.session, self.callback, speed=speed)
+        with self.assertRaisesRegex(ValueError, 'positive'):
+            replay_controller(self.session, self.callback, speed=None)
+
+    def test_simulated_machine(self):
+        patcher = patch.multiple(defines, **SIMULATED_DEFINES)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        trace = JogTrace()
+        machine = SimulatedMachine(start_position=(300, 200, 50), trace=trace)
+        result = replay(self.session, GcodeExecutor(machine.cnc).do_line, speed=None, trace=trace)
+        self.assertEqual((result.lines, result.failed), (3, False))
+        snapshot = trace.snapshot()
+        self.assertEqual((snapshot.commands, snapshot.moved), (3, 2))
+
+
+class TestReplayController(unittest.TestCase):
+    def state(self, time, lx=0.0, pressed=()):
+        buttons = sum(1 << BUTTONS.index(name) for name in pressed)
+        return ControllerState(time, lx, 0, 0, 0, 0, 0, 0, 0, buttons)
+
+    def test_apply(self):
+        controller = ReplayController()
+        callback = Mock()
+        controller.axis_l.when_moved = controller.axis_r.when_moved = callback
+        controller.button_b.when_pressed = controller.button_b.when_released = callback
+
+        controller.apply(self.state(0, lx=.5, pressed=['button_b']))
+        controller.apply(self.state(1, lx=.5, pressed=['button_b']))
+        self.assertEqual((controller.axis_l.x, controller.button_b.is_pressed), (.5, True))
+        controller.apply(self.state(2))
+        self.assertEqual(callback.call_args_list, [call(controller.axis_l), call(controller.button_b)] * 2)
+        self.assertFalse(controller.button_b.is_pressed)
+
+    def test_replay(self):
+        lines = []
+        session = [GcodeLine(0, 'G1 X5'), self.state(0, lx=1.0), self.state(.1)]
+        result = replay_controller(session, lambda line: lines.append(line) or True, rate=50.0)
+        # The lines come from XboxToGcode reading the controller, not from the log
+        self.assertEqual(lines[0], 'G91')
+        self.assertIn('G1 X0.0200 Y0.0000 Z0.0000 E0.0000 F60.0000', lines)
+        self.assertNotIn('G1 X5', lines)
+        self.assertEqual((result.lines, result.failed), (len(lines), False))
+
+    def test_stops_when_refused(self):
+        session = [self.state(0, lx=1.0), self.state(5)]
+        result = replay_controller(session, lambda line: line == 'G91', rate=50.0)
+        self.assertEqual((result.lines, result.failed), (2, True))
+        self.assertLess(result.elapsed, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+import sys
+import time
+import unittest
+
+from concurrent.futures import Future
+from unittest.mock import Mock, patch
+
+mock_rpi = sys.modules.setdefault('RPi', Mock())
+sys.modules.setdefault('RPi.GPIO', mock_rpi.GPIO)
+import defines  # noqa: E402
+from simulated_hardware import SimulatedMachine, SimulatedStepScheduler  # noqa: E402
+from step_telemetry import StepTelemetry  # noqa: E402
+
+
+# The real pin numbers are not all filled in yet, so give the simulated machine distinct ones
+SIMULATED_DEFINES = {
+    'BOARD_X_LENGTH': 2000,
+    'BOARD_Y_LENGTH': 1500,
+    'BOARD_Z_LENGTH': 400,
+    'STEPPER_Y_RIGHT_1': 5,
+    'STEPPER_Y_RIGHT_2': 12,
+    'STEPPER_Y_RIGHT_3': 13,
+    'STEPPER_Y_RIGHT_4': 24,
+    'STEPPER_X_MAX_HZ': 1000.0,
+    'STEPPER_Y_MAX_HZ': 800.0,
+    'STEPPER_Z_MAX_HZ': 500.0,
+    'STEPPER_X_MAX_ACCEL': 4000.0,
+    'STEPPER_Y_MAX_ACCEL': 4000.0,
+    'STEPPER_Z_MAX_ACCEL': 4000.0,
+    'SWITCH_RESET_X': 27,
+    'SWITCH_RESET_Y': 2,
+    'SWITCH_RESET_Z': 3
+}
+
+
+class TestSimulatedStepScheduler(unittest.TestCase):
+    def test_runs_in_virtual_time(self):
+        scheduler = SimulatedStepScheduler()
+        calls = []
+
+        def callback(deadline):
+            calls.append(deadline)
+            return deadline + 10 if deadline < 30 else None
+
+        scheduler.schedule(callback, 5)
+        scheduler.sleep(20)
+        self.assertEqual(calls, [5, 15])
+        self.assertEqual(scheduler.now(), 20)
+
+        scheduler.run_until_idle()
+        self.assertEqual(calls, [5, 15, 25, 35])
+        self.assertEqual(scheduler.now(), 35)
+
+    def test_wait_timeout(self):
+        scheduler = SimulatedStepScheduler()
+        self.assertFalse(scheduler.wait(Future(), timeout=3))
+        self.assertEqual(scheduler.now(), 3)
+
+
+@patch.multiple(defines, **SIMULATED_DEFINES)
+class TestSimulatedMachine(unittest.TestCase):
+    def test_zeroing_and_painting(self):
+        start = time.monotonic()
+        machine = SimulatedMachine(start_position=(700, 300, 100))
+        cnc = machine.cnc
+
+        results = cnc.zeroing()
+        self.assertEqual(sorted(results), ['x', 'y', 'z'])
+        self.assertEqual(cnc.get_position(), (0, 0, 0))
+        self.assertEqual(machine.physical_position(), (0, 0, 0))
+        home = machine.physical_position()
+
+        for x, y, z in [(400, 300, 20), (1000, 1200, 20), (50, 60, 0), (1500, 100, 60)]:
+            cnc.move_to(x, y, z, feed_rate=900, wait=True)
+            self.assertEqual(cnc.get_position(), (x, y, z))
+            self.assertEqual(machine.physical_position(), (x + home[0], y + home[1], z + home[2]))
+        self.assertEqual(machine.shaft_y_left.position, machine.shaft_y_right.position)
+
+        with self.assertRaises(ValueError):
+            cnc.move_to(x=defines.BOARD_X_LENGTH + 1)
+        with self.assertRaises(ValueError):
+            cnc.move_to(z=-1)
+
+        # several seconds of motion, simulated much faster than that
+        self.assertGreater(machine.clock(), 5)
+        self.assertLess(time.monotonic() - start, machine.clock() / 5)
+
+        transitions = machine.gpio.transitions(defines.STEPPER_X_1)
+        self.assertGreater(len(transitions), 100)
+        times = [t for t, _ in transitions]
+        self.assertEqual(times, sorted(times))
+
+    def test_telemetry(self):
+        telemetry = StepTelemetry()
+        machine = SimulatedMachine(start_position=(300, 200, 50), telemetry=telemetry)
+        machine.cnc.zeroing()
+        homing_steps = telemetry.snapshot().steps
+        self.assertGreater(homing_steps, 0)
+
+        machine.cnc.move_to(400, 300, 20, feed_rate=900, wait=True)
+        snapshot = telemetry.snapshot()
+        # one for each tick of the coordinated move, which steps x on every tick
+        self.assertEqual(snapshot.steps - homing_steps, 400)
+        self.assertEqual(snapshot.jitter_max, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
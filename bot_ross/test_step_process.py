@@ -0,0 +1,96 @@
+import sys
+import time
+import unittest
+
+from unittest.mock import Mock
+
+mock_rpi = sys.modules.setdefault('RPi', Mock())
+sys.modules.setdefault('RPi.GPIO', mock_rpi.GPIO)
+from simulated_gpio import SimulatedGPIO  # noqa: E402
+from step_process import CommandRing, StepGeneratorProcess, _MOVE, _ZERO  # noqa: E402
+
+
+class TestCommandRing(unittest.TestCase):
+    def test_push_pop(self):
+        ring = CommandRing(capacity=2)
+        self.assertIsNone(ring.pop())
+
+        ring.push(_MOVE, motor=1, move_id=7, frequency=100.0, goal=-5)
+        ring.push(_ZERO, motor=0, move_id=8)
+
+        command = ring.pop()
+        self.assertEqual((command.kind, command.motor, command.move_id, command.frequency, command.goal),
+                         (_MOVE, 1, 7, 100.0, -5))
+        self.assertEqual(ring.pop().kind, _ZERO)
+        self.assertIsNone(ring.pop())
+
+        # wraps around
+        ring.push(_MOVE, goal=3)
+        self.assertEqual(ring.pop().goal, 3)
+
+
+class TestStepGeneratorProcess(unittest.TestCase):
+    def test_moves(self):
+        process = StepGeneratorProcess([(1, 2, 3, 4), (5, 6, 7, 8)], gpio_factory=SimulatedGPIO, priority=1)
+        process.start()
+        try:
+            x, y = process.motors
+            x.set_stepper(2000, 20)
+            y.set_stepper(2000, -10, wait=True)
+            x.wait_until_complete()
+            self.assertEqual(x._pos, 20)
+            self.assertEqual(y._pos, -10)
+
+            x.set_stepper_absolute(2000, 5, wait=True, acceleration=100000)
+            self.assertEqual(x._pos, 5)
+
+            x.zero()
+            self.assertEqual(x._pos, 0)
+        finally:
+            # unprivileged test runs usually cannot get real-time priority, which must not stop the motors
+            process.stop()
+
+    def test_futures(self):
+        process = StepGeneratorProcess([(1, 2, 3, 4)], gpio_factory=SimulatedGPIO)
+        process.start()
+        try:
+            x, = process.motors
+            replaced = x.set_stepper(10, 1000)
+            future = x.set_stepper(2000, 20)
+            self.assertTrue(replaced.cancelled())
+            self.assertEqual(future.result(5), 20)
+            self.assertEqual(x.set_stepper_absolute(2000, 5).result(5), 5)
+        finally:
+            process.stop()
+
+    def test_zero_while_moving(self):
+        process = StepGeneratorProcess([(1, 2, 3, 4)], gpio_factory=SimulatedGPIO)
+        process.start()
+        try:
+            x, = process.motors
+            future = x.set_stepper(500, 100)
+            deadline = time.monotonic() + 5
+            while x._pos == 0 and time.monotonic() < deadline:
+                time.sleep(.001)
+            x.zero()
+            # The move carries on from the new zero rather than being replaced
+            self.assertFalse(future.cancelled())
+            self.assertTrue(0 < future.result(5) < 100)
+        finally:
+            process.stop()
+
+    def test_child_dies(self):
+        process = StepGeneratorProcess([(1, 2, 3, 4)], gpio_factory=SimulatedGPIO)
+        process.start()
+        x, = process.motors
+        future = x.set_stepper(10, 1000)
+        process._process.terminate()
+        with self.assertRaisesRegex(RuntimeError, 'exited'):
+            future.result(5)
+        with self.assertRaisesRegex(RuntimeError, 'exited'):
+            x.set_stepper(10, 1000, wait=True)
+        process._watcher.join(5)
+
+
+if __name__ == '__main__':
+    unittest.main()
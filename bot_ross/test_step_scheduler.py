@@ -0,0 +1,86 @@
+import threading
+import time
+import unittest
+
+from concurrent.futures import Future
+from step_scheduler import StepScheduler
+
+
+class TestStepScheduler(unittest.TestCase):
+    def setUp(self):
+        self.scheduler = StepScheduler()
+
+    def test_callbacks_run_in_deadline_order(self):
+        calls = []
+        done = threading.Event()
+        now = self.scheduler.now()
+
+        def make_callback(name):
+            def callback(deadline):
+                calls.append(name)
+                if len(calls) == 3:
+                    done.set()
+            return callback
+
+        self.scheduler.schedule(make_callback('c'), now + .03)
+        self.scheduler.schedule(make_callback('a'), now + .01)
+        self.scheduler.schedule(make_callback('b'), now + .02)
+
+        self.assertTrue(done.wait(1))
+        self.assertEqual(calls, ['a', 'b', 'c'])
+
+    def test_reschedules_from_absolute_deadlines(self):
+        deadlines = []
+        done = threading.Event()
+        start = self.scheduler.now()
+
+        def callback(deadline):
+            deadlines.append(deadline)
+            time.sleep(.002)  # take a while each call, which must not push back later deadlines
+            if len(deadlines) == 5:
+                done.set()
+                return None
+            return deadline + .005
+
+        self.scheduler.schedule(callback, start)
+
+        self.assertTrue(done.wait(1))
+        for i, deadline in enumerate(deadlines):
+            self.assertAlmostEqual(deadline, start + i * .005)
+
+    def test_cancel(self):
+        calls = []
+        handle = self.scheduler.schedule(calls.append, self.scheduler.now() + .01)
+        self.scheduler.cancel(handle)
+        time.sleep(.03)
+        self.assertEqual(calls, [])
+
+    def test_failing_callback_is_dropped(self):
+        calls = []
+        done = threading.Event()
+        future = Future()
+        now = self.scheduler.now()
+
+        def failing(deadline):
+            raise RuntimeError('broken driver')
+
+        def working(deadline):
+            calls.append(deadline)
+            if len(calls) == 3:
+                done.set()
+                return None
+            return deadline + .005
+
+        with self.assertLogs('step_scheduler', 'ERROR'):
+            self.scheduler.schedule(failing, now, future=future)
+            self.scheduler.schedule(working, now + .001)
+            with self.assertRaisesRegex(RuntimeError, 'broken driver'):
+                future.result(1)
+            self.assertTrue(done.wait(1))
+
+    def test_default_is_shared(self):
+        self.assertIs(StepScheduler.default(), StepScheduler.default())
+
+
+if __name__ == '__main__':
+    unittest.main()
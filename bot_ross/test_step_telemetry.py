@@ -0,0 +1,44 @@
+import unittest
+
+from step_telemetry import StepTelemetry, percentile
+
+
+class TestStepTelemetry(unittest.TestCase):
+    def test_empty(self):
+        snapshot = StepTelemetry().snapshot()
+        self.assertEqual(snapshot.steps, 0)
+        self.assertEqual(snapshot.step_rate, 0)
+        self.assertEqual(snapshot.jitter_max, 0)
+
+    def test_snapshot(self):
+        telemetry = StepTelemetry(capacity=100, late_threshold=.001)
+        for i in range(100):
+            late = .002 if i % 10 == 0 else .0001 * (i % 10)
+            telemetry.record(i * .01, i * .01 + late)
+
+        snapshot = telemetry.snapshot()
+        self.assertEqual(snapshot.steps, 100)
+        self.assertEqual(snapshot.missed_deadlines, 10)
+        self.assertAlmostEqual(snapshot.step_rate, 100, places=0)
+        self.assertAlmostEqual(snapshot.jitter_p50, .0005)
+        self.assertAlmostEqual(snapshot.jitter_p95, .002)
+        self.assertAlmostEqual(snapshot.jitter_max, .002)
+
+    def test_ring_keeps_latest(self):
+        telemetry = StepTelemetry(capacity=4)
+        for i in range(10):
+            telemetry.record(i, i + (1 if i >= 6 else 0))
+
+        snapshot = telemetry.snapshot()
+        self.assertEqual(snapshot.steps, 10)
+        self.assertEqual(snapshot.missed_deadlines, 4)
+        self.assertEqual(snapshot.jitter_p50, 1)
+
+    def test_percentile(self):
+        self.assertEqual(percentile([1, 2, 3, 4], .5), 2)
+        self.assertEqual(percentile([1, 2, 3, 4], .99), 4)
+        self.assertEqual(percentile([], .5), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,15 +1,16 @@
+import asyncio
 import sys
-import threading
 import unittest
 
+from concurrent.futures import TimeoutError
+
 from unittest.mock import Mock, call, patch
 
-mock_gpio = Mock()
-mock_rpi = Mock()
-mock_rpi.GPIO = mock_gpio
-sys.modules['RPi'] = mock_rpi
-sys.modules['RPi.GPIO'] = mock_gpio
-from stepper_motor import StepperMotor, StepperMotorDirection  # noqa: 402
+# Other tests may have mocked RPi.GPIO already, and stepper_motor only imports it once
+mock_rpi = sys.modules.setdefault('RPi', Mock())
+mock_gpio = sys.modules.setdefault('RPi.GPIO', mock_rpi.GPIO)
+from step_scheduler import StepScheduler  # noqa: 402
+from stepper_motor import FULL_STEP_SEQUENCE, StepperMotor, StepperMotorDirection  # noqa: 402
 
 
 class TestStepperMotor(unittest.TestCase):
@@ -18,6 +19,8 @@ class TestStepperMotor(unittest.TestCase):
         mock_gpio.OUT = 'out!'
         mock_gpio.HIGH = 'hi'
         mock_gpio.LOW = 'lo'
+        self.mock_scheduler = Mock(spec=StepScheduler)
+        self.mock_scheduler.now.return_value = 0
 
     def test_init(self):
         StepperMotor(1, 2, 3, 4)
@@ -31,207 +34,235 @@ class TestStepperMotor(unittest.TestCase):
 
     def test_step(self):
         motor = StepperMotor(1, 2, 3, 4)
+        mock_gpio.output.reset_mock()
 
         # 7
         motor.step(StepperMotorDirection.REVERSE)
-        mock_gpio.output.assert_has_calls([
-            call(1, 'hi'),
-            call(2, 'lo'),
-            call(3, 'lo'),
-            call(4, 'hi')
-        ])
+        self.assertEqual(motor._i, 7)
+        mock_gpio.output.assert_called_once_with((1, 2, 3, 4), ('hi', 'lo', 'lo', 'hi'))
         mock_gpio.output.reset_mock()
 
         # 0
         motor.step(StepperMotorDirection.FORWARD)
-        mock_gpio.output.assert_has_calls([
-            call(1, 'hi'),
-            call(2, 'lo'),
-            call(3, 'lo'),
-            call(4, 'lo')
-        ])
+        self.assertEqual(motor._i, 0)
+        mock_gpio.output.assert_called_once_with((1, 2, 3, 4), ('hi', 'lo', 'lo', 'lo'))
         mock_gpio.output.reset_mock()
 
         # 1
         motor.step(StepperMotorDirection.FORWARD)
-        mock_gpio.output.assert_has_calls([
-            call(1, 'hi'),
-            call(2, 'hi'),
-            call(3, 'lo'),
-            call(4, 'lo')
-        ])
+        self.assertEqual(motor._i, 1)
+        mock_gpio.output.assert_called_once_with((1, 2, 3, 4), ('hi', 'hi', 'lo', 'lo'))
         mock_gpio.output.reset_mock()
 
         # 2
         motor.step(StepperMotorDirection.FORWARD)
-        mock_gpio.output.assert_has_calls([
-            call(1, 'lo'),
-            call(2, 'hi'),
-            call(3, 'lo'),
-            call(4, 'lo')
-        ])
+        self.assertEqual(motor._i, 2)
+        mock_gpio.output.assert_called_once_with((1, 2, 3, 4), ('lo', 'hi', 'lo', 'lo'))
         mock_gpio.output.reset_mock()
 
         # 3
         motor.step(StepperMotorDirection.FORWARD)
-        mock_gpio.output.assert_has_calls([
-            call(1, 'lo'),
-            call(2, 'hi'),
-            call(3, 'hi'),
-            call(4, 'lo')
-        ])
+        self.assertEqual(motor._i, 3)
+        mock_gpio.output.assert_called_once_with((1, 2, 3, 4), ('lo', 'hi', 'hi', 'lo'))
         mock_gpio.output.reset_mock()
 
         # 4
         motor.step(StepperMotorDirection.FORWARD)
-        mock_gpio.output.assert_has_calls([
-            call(1, 'lo'),
-            call(2, 'lo'),
-            call(3, 'hi'),
-            call(4, 'lo')
-        ])
+        self.assertEqual(motor._i, 4)
+        mock_gpio.output.assert_called_once_with((1, 2, 3, 4), ('lo', 'lo', 'hi', 'lo'))
         mock_gpio.output.reset_mock()
 
         # 5
         motor.step(StepperMotorDirection.FORWARD)
-        mock_gpio.output.assert_has_calls([
-            call(1, 'lo'),
-            call(2, 'lo'),
-            call(3, 'hi'),
-            call(4, 'hi')
-        ])
+        self.assertEqual(motor._i, 5)
+        mock_gpio.output.assert_called_once_with((1, 2, 3, 4), ('lo', 'lo', 'hi', 'hi'))
         mock_gpio.output.reset_mock()
 
         # 6
         motor.step(StepperMotorDirection.FORWARD)
-        mock_gpio.output.assert_has_calls([
-            call(1, 'lo'),
-            call(2, 'lo'),
-            call(3, 'lo'),
-            call(4, 'hi')
-        ])
+        self.assertEqual(motor._i, 6)
+        mock_gpio.output.assert_called_once_with((1, 2, 3, 4), ('lo', 'lo', 'lo', 'hi'))
+        mock_gpio.output.reset_mock()
+
+    def test_step_full_step_sequence(self):
+        motor = StepperMotor(1, 2, 3, 4, sequence=FULL_STEP_SEQUENCE)
+        mock_gpio.output.reset_mock()
+
+        motor.step(StepperMotorDirection.FORWARD)
+        self.assertEqual(motor._i, 1)
+        mock_gpio.output.assert_called_once_with((1, 2, 3, 4), ('lo', 'hi', 'hi', 'lo'))
         mock_gpio.output.reset_mock()
 
+        motor.step(StepperMotorDirection.REVERSE)
+        motor.step(StepperMotorDirection.REVERSE)
+        self.assertEqual(motor._i, 3)
+        mock_gpio.output.assert_called_with((1, 2, 3, 4), ('hi', 'lo', 'lo', 'hi'))
+
     @patch.object(StepperMotor, 'step')
-    @patch('time.time', autospec=True)
-    @patch('threading.Timer', autospec=True)
-    def test_step_and_reset_timer(self, mock_timer, mock_time, mock_step):
-        mock_time.return_value = 3000
-        mock_timer_instance = Mock(spec=threading.Timer)
-        mock_timer.return_value = mock_timer_instance
-        motor = StepperMotor(1, 2, 3, 4)
+    def test_step_and_reschedule(self, mock_step):
+        self.mock_scheduler.now.return_value = 3000
+        motor = StepperMotor(1, 2, 3, 4, scheduler=self.mock_scheduler)
+        motor._start_stepper(10, 2)
 
         #  Tests with goal not reached
-        motor._step_and_reset_timer(10, 0, 10, StepperMotorDirection.FORWARD)
+        next_deadline = motor._step_and_reschedule(50)
 
         self.assertEqual(motor._pos, 1)
         mock_step.assert_called_once_with(StepperMotorDirection.FORWARD)
         self.assertEqual(motor._last_update_time, 3000)
-        mock_timer.assert_called_once_with(10, motor._step_and_reset_timer,
-                                           args=(10, 1, 10, StepperMotorDirection.FORWARD))
-        mock_timer_instance.start.assert_called_once_with()
+        self.assertAlmostEqual(next_deadline, 50.1)
+        self.assertFalse(motor._move_future.done())
 
         #  Tests with goal reached
-        motor._step_and_reset_timer(10, 9, 10, StepperMotorDirection.FORWARD)
+        next_deadline = motor._step_and_reschedule(50.1)
 
-        self.assertEqual(motor._last_update_time, 3000)
-        mock_timer_instance.assert_not_called()
+        self.assertIsNone(next_deadline)
         self.assertEqual(motor._pos, 2)
+        self.assertTrue(motor._is_complete)
+        self.assertTrue(motor._move_future.done())
 
-    @patch.object(StepperMotor, '_step_and_reset_timer')
-    @patch('time.time', autospec=True)
-    def test_start_stepper_faster_frequency(self, mock_time, mock_reset_timer):
+    @patch.object(StepperMotor, 'step')
+    def test_step_and_reschedule_telemetry(self, mock_step):
+        telemetry = Mock()
+        self.mock_scheduler.now.return_value = 7
+        motor = StepperMotor(1, 2, 3, 4, scheduler=self.mock_scheduler, telemetry=telemetry)
+        motor._start_stepper(10, 2)
+        motor._step_and_reschedule(6.5)
+        telemetry.record.assert_called_once_with(6.5, 7)
+
+    def test_start_stepper_faster_frequency(self):
         # This tests the case where the time since last update is greater than the new period
-        mock_time.return_value = 2
-        motor = StepperMotor(1, 2, 3, 4)
-        motor._timer = Mock(spec=threading.Timer)
+        self.mock_scheduler.now.return_value = 2
+        motor = StepperMotor(1, 2, 3, 4, scheduler=self.mock_scheduler)
         motor._last_update_time = 1
 
         motor._start_stepper(20, 100)
-        mock_reset_timer.assert_called_once_with(.05, 0, 100, StepperMotorDirection.FORWARD)
+        self.mock_scheduler.schedule.assert_called_once_with(motor._step_and_reschedule, 2,
+                                                             future=motor._move_future)
+        self.assertEqual(motor._period, .05)
+        self.assertEqual(motor._goal, 100)
+        self.assertEqual(motor._direction, StepperMotorDirection.FORWARD)
 
-    @patch('threading.Timer', autospec=True)
-    @patch('time.time', autospec=True)
-    def test_start_stepper_slower_frequency(self, mock_time, mock_timer):
+    def test_start_stepper_slower_frequency(self):
         # This tests the case where the time since last update is less than the new period
-        mock_time.return_value = 1.05
-        motor = StepperMotor(1, 2, 3, 4)
-        mock_timer_instance = Mock(spec=threading.Timer)
-        mock_timer.return_value = mock_timer_instance
+        self.mock_scheduler.now.return_value = 1.05
+        motor = StepperMotor(1, 2, 3, 4, scheduler=self.mock_scheduler)
         motor._last_update_time = 1
 
         motor._start_stepper(10, 100)
 
-        calls = mock_timer.call_args_list
+        calls = self.mock_scheduler.schedule.call_args_list
         self.assertEqual(len(calls), 1)
-        args, kwargs = calls[0]
-        self.assertAlmostEqual(args[0], .05)
-        self.assertEqual(args[1], motor._step_and_reset_timer)
-        self.assertEqual(kwargs['args'], (.1, 0, 100, StepperMotorDirection.FORWARD))
-        mock_timer_instance.start.assert_called_once_with()
-
-    @patch.object(StepperMotor, '_step_and_reset_timer')
-    def test_start_stepper_forward(self, mock_reset_timer):
-        motor = StepperMotor(1, 2, 3, 4)
-        motor._start_stepper(20, 20)
-        mock_reset_timer.assert_called_once_with(.05, 0, 20, StepperMotorDirection.FORWARD)
+        args, _ = calls[0]
+        self.assertEqual(args[0], motor._step_and_reschedule)
+        self.assertAlmostEqual(args[1], 1.1)
 
-    @patch.object(StepperMotor, '_step_and_reset_timer')
-    def test_start_stepper_reverse(self, mock_reset_timer):
-        motor = StepperMotor(1, 2, 3, 4)
+    def test_start_stepper_reverse(self):
+        motor = StepperMotor(1, 2, 3, 4, scheduler=self.mock_scheduler)
         motor._start_stepper(20, -20)
-        mock_reset_timer.assert_called_once_with(.05, 0, -20, StepperMotorDirection.REVERSE)
+        self.assertEqual(motor._goal, -20)
+        self.assertEqual(motor._direction, StepperMotorDirection.REVERSE)
 
     @patch.object(StepperMotor, 'wait_until_complete')
     @patch.object(StepperMotor, '_start_stepper')
-    @patch('threading.Timer', autospec=True)
-    def test_set_stepper_stop(self, mock_timer, mock_start_stepper, mock_wait):
-        motor = StepperMotor(1, 2, 3, 4)
-        motor._timer = Mock(spec=threading.Timer)
+    def test_set_stepper_stop(self, mock_start_stepper, mock_wait):
+        motor = StepperMotor(1, 2, 3, 4, scheduler=self.mock_scheduler)
+        scheduled_step = Mock()
+        motor._scheduled_step = scheduled_step
 
         motor.set_stepper(0, 100)
-        motor._timer.cancel.assert_called_once_with()
+        self.mock_scheduler.cancel.assert_called_once_with(scheduled_step)
         mock_start_stepper.assert_not_called()
+        self.assertTrue(motor._move_future.done())
 
-        motor._timer = Mock(spec=threading.Timer)
+        self.mock_scheduler.cancel.reset_mock()
+        motor._scheduled_step = scheduled_step
         motor.set_stepper(100, 0)
-        motor._timer.cancel.assert_called_once_with()
+        self.mock_scheduler.cancel.assert_called_once_with(scheduled_step)
         mock_start_stepper.assert_not_called()
         mock_wait.assert_not_called()
 
     @patch.object(StepperMotor, 'wait_until_complete')
     @patch.object(StepperMotor, '_start_stepper')
-    @patch('threading.Timer', autospec=True)
-    def test_set_stepper_wait(self, mock_timer, mock_start_stepper, mock_wait):
-        motor = StepperMotor(1, 2, 3, 4)
-        motor._timer = Mock(spec=threading.Timer)
+    def test_set_stepper_wait(self, mock_start_stepper, mock_wait):
+        motor = StepperMotor(1, 2, 3, 4, scheduler=self.mock_scheduler)
+        scheduled_step = Mock()
+        motor._scheduled_step = scheduled_step
 
         motor.set_stepper(10, 100, wait=True)
 
-        motor._timer.cancel.assert_called_once_with()
-        mock_start_stepper.assert_called_once_with(10, 100)
+        self.mock_scheduler.cancel.assert_called_once_with(scheduled_step)
+        mock_start_stepper.assert_called_once_with(10, 100, None, None)
         mock_wait.assert_called_once_with()
 
     def test_wait_until_complete(self):
-        motor = StepperMotor(1, 2, 3, 4)
-        motor.wait_until_complete()  # test with None timer
+        motor = StepperMotor(1, 2, 3, 4, scheduler=self.mock_scheduler)
+        self.mock_scheduler.wait.return_value = True
+        motor.wait_until_complete()  # test with no move
 
-        motor._timer = Mock(spec=threading.Timer)
-        motor._is_complete = False
+        motor._start_stepper(10, 1)
+        self.mock_scheduler.wait.reset_mock()
+        motor.wait_until_complete(timeout=2)
+        self.mock_scheduler.wait.assert_called_once_with(motor._move_future, 2)
 
-        def make_complete():
-            motor._is_complete = True
+        self.mock_scheduler.wait.return_value = False
+        with self.assertRaises(TimeoutError):
+            motor.wait_until_complete(timeout=2)
 
-        motor._timer.join.side_effect = make_complete
-        motor.wait_until_complete()
-        motor._timer.join.assert_called_once_with()
+    @patch.object(StepperMotor, 'step')
+    def test_step_and_reschedule_accelerating(self, mock_step):
+        motor = StepperMotor(1, 2, 3, 4, scheduler=self.mock_scheduler, acceleration=1000)
+        motor._start_stepper(100, 4)
+        self.assertEqual(len(motor._intervals), 3)
+
+        deadline = 0
+        for i in range(3):
+            next_deadline = motor._step_and_reschedule(deadline)
+            self.assertAlmostEqual(next_deadline - deadline, motor._intervals[i])
+            deadline = next_deadline
+        self.assertIsNone(motor._step_and_reschedule(deadline))
+        self.assertEqual(motor._pos, 4)
+
+    def test_start_stepper_acceleration_override(self):
+        motor = StepperMotor(1, 2, 3, 4, scheduler=self.mock_scheduler, acceleration=1000)
+        motor._start_stepper(100, 10, acceleration=0)
+        self.assertIsNone(motor._intervals)
+
+    def test_set_stepper_with_scheduler(self):
+        motor = StepperMotor(1, 2, 3, 4, scheduler=StepScheduler())
+        motor.set_stepper(1000, -5, wait=True)
+        self.assertEqual(motor._pos, -5)
+        self.assertEqual(motor._i, 3)
+
+    def test_set_stepper_future(self):
+        motor = StepperMotor(1, 2, 3, 4, scheduler=StepScheduler())
+        self.assertEqual(motor.set_stepper(1000, 3).result(1), 3)
+
+        replaced = motor.set_stepper(1, 100)
+        stopped = motor.set_stepper(0, 0)
+        self.assertTrue(replaced.cancelled())
+        self.assertTrue(stopped.done())
+        motor.wait_until_complete(timeout=1)
+
+    def test_set_stepper_async(self):
+        scheduler = StepScheduler()
+        motor_1 = StepperMotor(1, 2, 3, 4, scheduler=scheduler)
+        motor_2 = StepperMotor(5, 6, 7, 8, scheduler=scheduler)
+
+        async def move_both():
+            return await asyncio.gather(motor_1.set_stepper_async(1000, 4),
+                                        motor_2.set_stepper_absolute_async(1000, -2))
+
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+        self.assertEqual(loop.run_until_complete(move_both()), [4, -2])
 
     @patch.object(StepperMotor, 'set_stepper')
     def test_set_stepper_absolute(self, mock_set_stepper):
         motor = StepperMotor(1, 2, 3, 4)
         motor._pos = 200
         motor.set_stepper_absolute(100, 50, wait=True)
-        mock_set_stepper.assert_called_once_with(100, -150, wait=True)
+        mock_set_stepper.assert_called_once_with(100, -150, wait=True, acceleration=None, jerk=None)
 
 
 if __name__ == '__main__':
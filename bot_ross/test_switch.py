@@ -0,0 +1,113 @@
+import sys
+import threading
+import time
+import unittest
+
+from unittest.mock import Mock
+
+mock_rpi = sys.modules.setdefault('RPi', Mock())
+sys.modules.setdefault('RPi.GPIO', mock_rpi.GPIO)
+from simulated_gpio import SimulatedGPIO  # noqa: E402
+from simulated_hardware import SimulatedStepScheduler  # noqa: E402
+from switch import Switch  # noqa: E402
+
+CHANNEL = 27
+
+
+class TestSwitch(unittest.TestCase):
+    def setUp(self):
+        self.gpio = SimulatedGPIO()
+        self.scheduler = SimulatedStepScheduler()
+        self.clock = self.scheduler.clock
+        self.switch = Switch(CHANNEL, gpio=self.gpio, scheduler=self.scheduler)
+
+    def press(self, level=SimulatedGPIO.HIGH, at=None):
+        if at is not None:
+            self.clock.advance_to(at)
+        self.gpio.set_input(CHANNEL, level)
+
+    def test_init(self):
+        self.assertEqual(self.gpio.mode, SimulatedGPIO.BCM)
+        self.assertIn(CHANNEL, self.gpio._event_callbacks)
+        self.assertFalse(self.switch.get_state())
+        self.assertFalse(self.switch.triggered)
+
+    def test_triggered_latches_until_reset(self):
+        self.press(at=1)
+        self.press(SimulatedGPIO.LOW, at=2)
+        self.assertTrue(self.switch.triggered)
+
+        self.switch.reset()
+        self.assertFalse(self.switch.triggered)
+
+        self.press(at=3)
+        self.switch.reset()
+        self.assertTrue(self.switch.triggered)
+
+    def test_callbacks(self):
+        changes = []
+        presses = []
+        self.switch.add_callback(changes.append)
+        self.switch.add_callback(presses.append, state=True)
+
+        self.press(at=1)
+        self.press(SimulatedGPIO.LOW, at=2)
+        self.assertEqual(changes, [True, False])
+        self.assertEqual(presses, [True])
+
+        self.switch.remove_callback(changes.append)
+        self.press(at=3)
+        self.assertEqual(changes, [True, False])
+        self.assertEqual(presses, [True, True])
+
+    def test_debounce(self):
+        changes = []
+        self.switch.add_callback(changes.append)
+
+        self.press(at=1)
+        self.press(SimulatedGPIO.LOW, at=1.001)
+        self.assertEqual(changes, [True])
+
+        # the bounce is ignored, so the switch reads as pressed until it is released after settling
+        self.press(SimulatedGPIO.HIGH, at=1.002)
+        self.press(SimulatedGPIO.LOW, at=1.01)
+        self.assertEqual(changes, [True, False])
+
+    def test_edge_inside_debounce_is_read_again(self):
+        changes = []
+        self.switch.add_callback(changes.append)
+
+        self.press(at=1)
+        self.press(SimulatedGPIO.LOW, at=1.002)
+        self.assertEqual(changes, [True])
+
+        self.scheduler.run_until_idle()
+        self.assertEqual(changes, [True, False])
+        self.assertEqual(self.clock(), 1.005)
+        self.assertFalse(self.switch._state)
+        self.assertTrue(self.switch.triggered)
+
+    def test_edge_inside_debounce_is_read_again_without_scheduler(self):
+        switch = Switch(CHANNEL + 1, gpio=self.gpio, debounce=.02)
+        self.gpio.set_input(CHANNEL + 1, SimulatedGPIO.HIGH)
+        self.gpio.set_input(CHANNEL + 1, SimulatedGPIO.LOW)
+        self.assertTrue(switch.wait_for_edge(timeout=1, state=False))
+
+    def test_wait_for_edge(self):
+        timer = threading.Timer(.01, self.press, kwargs={'at': 1})
+        timer.start()
+        self.assertTrue(self.switch.wait_for_edge(timeout=5, state=True))
+        timer.join()
+
+    def test_wait_for_edge_timeout(self):
+        # the timeout is on the switch's clock, which jumps past it here long before 5 real seconds pass
+        timer = threading.Timer(.01, self.clock.advance_to, args=(6,))
+        timer.start()
+        start = time.monotonic()
+        self.assertFalse(self.switch.wait_for_edge(timeout=5))
+        self.assertLess(time.monotonic() - start, 1)
+        timer.join()
+
+
+if __name__ == '__main__':
+    unittest.main()
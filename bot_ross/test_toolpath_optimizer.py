@@ -0,0 +1,154 @@
+import random
+import unittest
+
+from collections import Counter
+from unittest.mock import patch
+
+import defines
+from gcode import Home, Move, Planner, PlaySound, ToolChange, format_actions, parse
+from toolpath_optimizer import ToolpathOptimizer, estimate_time, paints
+
+RATES = {'STEPPER_X_MAX_HZ': 1000.0, 'STEPPER_Y_MAX_HZ': 1000.0, 'STEPPER_Z_MAX_HZ': 1000.0}
+
+
+def job(*strokes):
+    """
+    Make a job that lifts the brush to Z 0, travels to each stroke, and paints it at Z 1
+    """
+    actions = []
+    for tool, points in strokes:
+        actions.append(ToolChange(None, tool))
+        actions.append(Move(None, None, None, 0, None))
+        actions.append(Move(None, points[0][0], points[0][1], None, None))
+        actions.append(Move(None, None, None, 1, 10))
+        actions.extend(Move(None, x, y, None, 10) for x, y in points[1:])
+    return actions
+
+
+def painted(actions, tool=0):
+    """
+    Every line the brush paints at Z 1, with its tool, as a Counter
+    """
+    position = [0.0, 0.0, 0.0]
+    lines = Counter()
+    for action in actions:
+        if isinstance(action, ToolChange):
+            tool = action.tool
+        elif isinstance(action, Home):
+            position = [0.0, 0.0, 0.0]
+        elif isinstance(action, Move):
+            target = [p if m is None else m for m, p in zip((action.x, action.y, action.z), position)]
+            if paints(position[2], target[2], 1):
+                lines[(tool, tuple(position), tuple(target))] += 1
+            position = target
+    return lines
+
+
+def tools(actions):
+    return [action.tool for action in actions if isinstance(action, ToolChange)]
+
+
+class TestToolpathOptimizer(unittest.TestCase):
+    def setUp(self):
+        patcher = patch.multiple(defines, **RATES)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.optimizer = ToolpathOptimizer(travel_z=0, paint_z=1, brush_width=1, time_budget=5)
+
+    def assert_same_painting(self, before, after):
+        self.assertEqual(painted(before), painted(after))
+
+    def test_groups_tools(self):
+        actions = job(*[(i % 2, [(10 * i, 0), (10 * i, 5)]) for i in range(6)])
+        result = self.optimizer.optimize(actions)
+        self.assert_same_painting(actions, result.actions)
+        self.assertEqual(tools(result.actions), [1])
+        self.assertLess(result.time_after, result.time_before)
+
+    def test_overlapping_colors_keep_their_order(self):
+        # red, then blue over it, then red over the blue
+        actions = job((0, [(0, 0), (10, 0)]), (1, [(5, -5), (5, 5)]), (0, [(0, 1), (10, 1)]), (1, [(50, 0), (60, 0)]))
+        result = self.optimizer.optimize(actions)
+        self.assert_same_painting(actions, result.actions)
+        strokes = [(tool, start) for tool, start, end in painted(result.actions) if start[2] == 1]
+        self.assertLess(strokes.index((1, (5, -5, 1))), strokes.index((0, (0, 1, 1))))
+        self.assertEqual(tools(result.actions), [1, 0])
+
+    def test_shortens_travel(self):
+        rng = random.Random(1)
+        strokes = []
+        for _ in range(60):
+            x, y = rng.uniform(0, 500), rng.uniform(0, 500)
+            strokes.append((rng.randrange(3), [(x, y), (x + 3, y + 2)]))
+        actions = job(*strokes)
+        result = self.optimizer.optimize(actions)
+        self.assert_same_painting(actions, result.actions)
+        self.assertLess(result.time_after, result.time_before / 2)
+        self.assertEqual(result.time_after, estimate_time(result.actions))
+
+    def test_two_opt_and_or_opt_improve_on_nearest_neighbour(self):
+        rng = random.Random(2)
+        starts = [(rng.uniform(0, 100), rng.uniform(0, 100)) for _ in range(40)]
+        ends = [(rng.uniform(0, 100), rng.uniform(0, 100)) for _ in range(40)]
+        strokes = [(0, [s, e]) for s, e in zip(starts, ends)]
+        actions = job(*strokes)
+        greedy = ToolpathOptimizer(travel_z=0, paint_z=1, brush_width=1, time_budget=5)
+        greedy._two_opt = greedy._or_opt = lambda tour, starts, ends: False
+        self.assertLess(self.optimizer.optimize(actions).time_after, greedy.optimize(actions).time_after)
+
+    def test_out_of_time_keeps_the_original_order(self):
+        now = [0]
+
+        def clock():
+            now[0] += 1
+            return now[0]
+
+        actions = job((0, [(30, 0), (31, 0)]), (0, [(10, 0), (11, 0)]), (0, [(20, 0), (21, 0)]))
+        result = ToolpathOptimizer(travel_z=0, paint_z=1, time_budget=0, clock=clock).optimize(actions)
+        self.assert_same_painting(actions, result.actions)
+
+    def test_homes_and_sounds_stay_put(self):
+        actions = job((0, [(30, 0), (31, 0)]), (0, [(10, 0), (11, 0)]))
+        actions += [PlaySound(None, 3)] + job((1, [(20, 0), (21, 0)])) + [Home(None)] + job((0, [(5, 0), (6, 0)]))
+        result = self.optimizer.optimize(actions)
+        self.assert_same_painting(actions, result.actions)
+        others = [action for action in result.actions if isinstance(action, (Home, PlaySound))]
+        self.assertEqual(others, [PlaySound(None, 3), Home(None)])
+        sound = result.actions.index(PlaySound(None, 3))
+        self.assertEqual(painted(result.actions[:sound]), painted(actions[:actions.index(PlaySound(None, 3))]))
+
+    def test_keeps_a_job_that_can_not_be_improved(self):
+        actions = job((0, [(10, 0), (11, 0)]), (0, [(20, 0), (21, 0)]))
+        result = self.optimizer.optimize(actions)
+        self.assertEqual(result.actions, actions)
+        self.assertEqual(result.time_after, result.time_before)
+
+    def test_rapids_with_the_brush_down_paint(self):
+        # the second stroke starts with a rapid at the paint height, which paints like any other move there
+        actions = job((0, [(30, 0), (31, 0)]))
+        actions += [Move(None, None, None, 0, None), Move(None, 10, 0, None, None), Move(None, None, None, 1, 10),
+                    Move(None, 11, 0, None, None), Move(None, 12, 0, None, 10)]
+        result = self.optimizer.optimize(actions)
+        self.assert_same_painting(actions, result.actions)
+        self.assertIn((0, (10, 0, 1), (11, 0, 1)), painted(result.actions))
+        self.assertLess(result.time_after, result.time_before)
+
+    def test_lowers_the_brush_at_the_feed_rate(self):
+        actions = job((0, [(30, 0), (31, 0)]), (0, [(10, 0), (11, 0)]))
+        result = self.optimizer.optimize(actions)
+        lowering = [action for action in result.actions if isinstance(action, Move) and action.z == 1]
+        self.assertEqual([action.feed_rate for action in lowering], [10, 10])
+
+    def test_travel_height_must_not_paint(self):
+        with self.assertRaises(ValueError):
+            ToolpathOptimizer(travel_z=1, paint_z=1)
+
+    def test_round_trips_through_gcode(self):
+        actions = job((1, [(30, 0), (31, 0.5)]), (0, [(10, 0), (11, 0)]))
+        result = self.optimizer.optimize(actions)
+        replanned = list(Planner().plan(parse(format_actions(result.actions))))
+        self.assert_same_painting(actions, replanned)
+
+
+if __name__ == '__main__':
+    unittest.main()
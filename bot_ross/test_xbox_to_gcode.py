@@ -0,0 +1,154 @@
+import io
+import sys
+import threading
+import time
+import unittest
+
+from unittest.mock import Mock
+
+sys.modules['xbox360controller'] = Mock()  # mock before import, since it only installs on Linux
+import xbox_to_gcode  # noqa: E402
+from jog_trace import JogTrace  # noqa: E402
+from session_log import GcodeLine, SessionRecorder, read_session  # noqa: E402
+from xbox_to_gcode import XboxToGcode  # noqa: E402
+
+
+def still_controller():
+    controller = Mock()
+    for axis in (controller.axis_l, controller.axis_r, controller.hat):
+        axis.x = axis.y = 0
+    controller.trigger_l.value = controller.trigger_r.value = 0
+    return controller
+
+
+class TestXboxToGcode(unittest.TestCase):
+    def setUp(self):
+        self.controller = still_controller()
+        xbox_to_gcode.Xbox360Controller.return_value = self.controller
+        self.lines = []
+        self.sent = threading.Condition()
+
+    def send(self, line):
+        with self.sent:
+            self.lines.append((time.monotonic(), line))
+            self.sent.notify_all()
+        return True
+
+    def wait_for_lines(self, count, timeout=2):
+        with self.sent:
+            self.assertTrue(self.sent.wait_for(lambda: len(self.lines) >= count, timeout))
+
+    def start(self, **kwargs):
+        generator = XboxToGcode(self.send, (0.01, 2.0), sound_ids=[7], **kwargs)
+        thread = threading.Thread(target=generator.run, daemon=True)
+        thread.start()
+        self.addCleanup(thread.join, 2)
+        self.addCleanup(generator._kill, None)
+        self.wait_for_lines(1)
+        return generator
+
+    def test_move_format(self):
+        generator = XboxToGcode(self.send, rate=10.0)
+        self.controller.axis_l.x = 1
+        self.assertEqual(generator._get_gcode(), 'G1 X0.1000 Y0.0000 Z0.0000 E0.0000 F60.0000')
+
+    def test_event_driven_sleeps_while_idle(self):
+        self.start(rate=100.0, event_driven=True)
+        time.sleep(.1)
+        self.assertEqual([line for _, line in self.lines], ['G91'])
+
+    def test_event_driven_buttons_are_sent_at_once(self):
+        generator = self.start(rate=1.0, event_driven=True)
+        pressed = time.monotonic()
+        generator._set_play_sound(None)
+        self.wait_for_lines(2)
+        self.assertEqual(self.lines[1][1], 'M72 P7')
+        self.assertLess(self.lines[1][0] - pressed, .5)
+
+    def test_event_driven_moves_grow_while_held(self):
+        generator = self.start(rate=50.0, event_driven=True)
+        self.controller.axis_l.x = 1
+        moved = time.monotonic()
+        self.controller.axis_l.when_moved(None)
+        self.wait_for_lines(6)
+        self.assertLess(self.lines[1][0] - moved, .1)
+
+        distances = [float(line.split()[1][1:]) for _, line in self.lines[1:6]]
+        self.assertEqual(distances[0], 0.02)
+        self.assertEqual(distances[1:4], [0.04, 0.08, 0.16])
+        self.assertEqual(distances[4], 0.16)  # no longer than _MAX_PERIODS_PER_MOVE periods
+
+        # A change in direction goes back to short moves straight away
+        count = len(self.lines)
+        self.controller.axis_l.x = -1
+        generator._on_event(None)
+        self.wait_for_lines(count + 1)
+        self.assertEqual(self.lines[count][1].split()[1], 'X-0.0200')
+
+    def test_event_driven_moves_are_no_longer_than_max_latency(self):
+        generator = self.start(rate=50.0, event_driven=True, max_latency=.05)
+        self.controller.axis_l.x = 1
+        generator._on_event(None)
+        self.wait_for_lines(5)
+        distances = [float(line.split()[1][1:]) for _, line in self.lines[1:5]]
+        self.assertEqual(distances, [0.02, 0.04, 0.05, 0.05])
+
+    def test_event_driven_stops_when_released(self):
+        generator = self.start(rate=50.0, event_driven=True)
+        self.controller.axis_l.y = .5
+        generator._on_event(None)
+        self.wait_for_lines(2)
+        self.controller.axis_l.y = 0
+        generator._on_event(None)
+        time.sleep(.2)
+        count = len(self.lines)
+        time.sleep(.2)
+        self.assertEqual(len(self.lines), count)
+
+    def test_event_driven_barely_moving_trigger_after_stop(self):
+        generator = self.start(rate=50.0, event_driven=True)
+        self.controller.axis_l.x = 1
+        generator._on_event(None)
+        self.wait_for_lines(2)
+        self.controller.axis_l.x = 0
+        generator._on_event(None)
+        time.sleep(.05)
+
+        # just over the minimum speed, but within _VELOCITY_EPSILON of standing still
+        count = len(self.lines)
+        self.controller.trigger_r.value = 5 / 255
+        generator._on_event(None)
+        self.wait_for_lines(count + 1)
+        self.assertIn(' E', self.lines[count][1])
+        self.assertNotEqual(self.lines[count][1].split()[4], 'E0.0000')
+
+    def test_trace(self):
+        trace = JogTrace()
+        self.send = Mock(side_effect=lambda line: trace.step() or True)  # as if it stepped straight away
+        generator = XboxToGcode(self.send, rate=50.0, trace=trace)
+        generator._on_event(None)
+        self.controller.axis_l.x = 1
+        self.assertTrue(generator._send(generator._get_gcode()))
+
+        snapshot = trace.snapshot()
+        self.assertEqual((snapshot.commands, snapshot.moved), (1, 1))
+        self.assertGreater(snapshot.total.max, 0)
+        self.assertGreaterEqual(snapshot.send.max, snapshot.motion.max)
+
+    def test_record(self):
+        file = io.BytesIO()
+        recorder = SessionRecorder(file)
+        generator = XboxToGcode(self.send, rate=10.0, recorder=recorder)
+        self.controller.axis_l.x = 1
+        generator._on_event(None)
+        generator._send(generator._get_gcode())
+        recorder.flush()
+
+        state, line = read_session(io.BytesIO(file.getvalue()))
+        self.assertEqual(state.axis_l_x, 1.0)
+        self.assertEqual(line.line, 'G1 X0.1000 Y0.0000 Z0.0000 E0.0000 F60.0000')
+        self.assertIsInstance(line, GcodeLine)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,438 @@
+import argparse
+import defines
+import geometry
+import logging
+import math
+import time
+
+from collections import namedtuple
+from gcode import Home, Move, Planner, ToolChange, format_actions, parse, read_lines
+
+logger = logging.getLogger(__name__)
+
+# A run of painting moves with one tool: where the brush has to be for it to start, where it ends, and its moves, with
+# its bounding box in XY as (min x, min y, max x, max y)
+Stroke = namedtuple('Stroke', ['tool', 'start', 'end', 'moves', 'bounds'])
+
+# The reordered actions, and the estimated seconds the job took before and takes after
+Optimization = namedtuple('Optimization', ['actions', 'time_before', 'time_after'])
+
+# How far in mm the brush may be above the paint height and still paint, for heights converted from inches
+_Z_TOLERANCE = 1e-6
+
+
+def paints(start_z, end_z, paint_z):
+    """
+    Tell whether a move paints, which it does iff the brush is at least at the paint height (Z grows towards the
+    canvas) from start to end, whether the move is a feed (G1) or rapid (G0) move
+
+    Arguments:
+        start_z {float} -- the height the move starts at, in mm
+        end_z {float} -- the height the move ends at, in mm
+        paint_z {float} -- the height the brush touches the canvas at, in mm
+
+    Returns:
+        bool -- True iff the move paints
+    """
+    return min(start_z, end_z) >= paint_z - _Z_TOLERANCE
+
+
+def max_rates():
+    """
+    Returns:
+        (float, float, float) -- the top speed of each axis in mm/second, from STEPPER_*_MAX_HZ
+    """
+    return tuple(geometry.steps_to_mm(hz)
+                 for hz in (defines.STEPPER_X_MAX_HZ, defines.STEPPER_Y_MAX_HZ, defines.STEPPER_Z_MAX_HZ))
+
+
+def estimate_time(actions, position=(0.0, 0.0, 0.0), tool=0, tool_change_time=None, rates=None):
+    """
+    Estimate how long a job takes, the way BrushCNC.move_to times its moves: at the feed rate, or the slowest axis's
+    top speed for rapids, slowed down if any axis would go over its top speed. Acceleration is not counted.
+
+    Arguments:
+        actions {iterable of Move or Home or ToolChange or PlaySound} -- the planned job
+
+    Keyword Arguments:
+        position {(float, float, float)} -- where the machine starts, in mm (default: {(0.0, 0.0, 0.0)})
+        tool {int} -- the tool the machine starts with (default: {0})
+        tool_change_time {float} -- seconds per tool change (default: {defines.TOOL_CHANGE_TIME})
+        rates {(float, float, float)} -- the top speed of each axis in mm/second (default: see max_rates)
+
+    Returns:
+        float -- the estimated time in seconds
+    """
+    if tool_change_time is None:
+        tool_change_time = defines.TOOL_CHANGE_TIME
+    rates = rates or max_rates()
+    position = list(position)
+    total = 0.0
+    for action in actions:
+        if isinstance(action, Move):
+            target = _target(action, position)
+            total += _move_time(position, target, action.feed_rate, rates)
+            position = target
+        elif isinstance(action, Home):
+            total += _move_time(position, [0.0, 0.0, 0.0], None, rates)
+            position = [0.0, 0.0, 0.0]
+        elif isinstance(action, ToolChange) and action.tool != tool:
+            total += tool_change_time
+            tool = action.tool
+    return total
+
+
+def _target(move, position):
+    return [p if m is None else m for m, p in zip((move.x, move.y, move.z), position)]
+
+
+def _move_time(start, end, feed_rate, rates):
+    # Unrolled, since previews time a million moves
+    dx, dy, dz = abs(end[0] - start[0]), abs(end[1] - start[1]), abs(end[2] - start[2])
+    distance = math.sqrt(dx * dx + dy * dy + dz * dz)
+    if distance == 0:
+        return 0.0
+    return max(distance / (feed_rate or min(rates)), dx / rates[0], dy / rates[1], dz / rates[2])
+
+
+def _distance(a, b):
+    return math.hypot(b[0] - a[0], b[1] - a[1])
+
+
+class ToolpathOptimizer():
+    """
+    Reorders a job's strokes to cut the time spent travelling with the brush up and changing colors.
+
+    A stroke is a run of moves that paint, with the brush down at the paint height (see paints), whether they are feed
+    (G1) or rapid (G0) moves. Every other move is travel, so it is dropped and new travel is made to each stroke's
+    start: up to the travel height, across, and down at the speed the stroke starts painting at. Strokes are grouped
+    by tool so each color is loaded as few times as possible, and each group is ordered by nearest neighbour and then
+    improved with 2-opt and Or-opt moves until the time budget runs out.
+
+    What gets painted never changes: every stroke is painted whole, in its own direction, with its own tool, and a
+    stroke never moves ahead of an earlier stroke of another color that it overlaps, since that would change which
+    paint ends up on top. Homes and sounds stay where they are, with only the strokes between them reordered.
+    """
+
+    def __init__(self, position=(0.0, 0.0, 0.0), tool=0, travel_z=None, paint_z=None, brush_width=None,
+                 time_budget=None, clock=time.monotonic):
+        """
+        Keyword Arguments:
+            position {(float, float, float)} -- where the machine starts, in mm (default: {(0.0, 0.0, 0.0)})
+            tool {int} -- the tool the machine starts with (default: {0})
+            travel_z {float} -- the height to lift the brush to between strokes, which must be less than paint_z
+                (default: {defines.TRAVEL_Z})
+            paint_z {float} -- the height in mm the brush touches the canvas at (default: {defines.PAINT_Z})
+            brush_width {float} -- strokes closer than this in mm count as overlapping (default:
+                {defines.BRUSH_WIDTH})
+            time_budget {float} -- the most seconds to spend improving the order (default:
+                {defines.OPTIMIZER_TIME_BUDGET})
+            clock {function} -- returns the time in seconds (default: {time.monotonic})
+
+        Raises:
+            ValueError -- if the brush would paint at travel_z
+        """
+        self._position = tuple(position)
+        self._tool = tool
+        self._travel_z = defines.TRAVEL_Z if travel_z is None else travel_z
+        self._paint_z = defines.PAINT_Z if paint_z is None else paint_z
+        if paints(self._travel_z, self._travel_z, self._paint_z):
+            raise ValueError('the brush would paint at the travel height {} mm, since it paints from {} mm'.format(
+                self._travel_z, self._paint_z))
+        self._brush_width = defines.BRUSH_WIDTH if brush_width is None else brush_width
+        self._time_budget = defines.OPTIMIZER_TIME_BUDGET if time_budget is None else time_budget
+        self._clock = clock
+        self._deadline = None
+
+    def optimize(self, actions):
+        """
+        Reorder a planned job
+
+        Arguments:
+            actions {iterable of Move or Home or ToolChange or PlaySound} -- the job, like the output of Planner.plan
+
+        Returns:
+            Optimization -- the new actions and the estimated times. If reordering would not save time, the actions
+                are the original ones.
+        """
+        actions = list(actions)
+        self._deadline = self._clock() + self._time_budget
+        optimized = []
+        position = list(self._position)
+        tool = self._tool
+        output = [list(self._position), self._tool]  # where the optimized job has left the machine, and its tool
+        strokes = []
+        trailing = []  # the travel and tool changes since the last stroke, kept in case they end the job or a group
+        painting = False
+
+        for action in actions:
+            if isinstance(action, Move):
+                target = _target(action, position)
+                if not paints(position[2], target[2], self._paint_z):
+                    trailing.append(action)
+                    painting = False
+                elif painting:
+                    strokes[-1].moves.append(action)
+                    strokes[-1].end[:] = target
+                else:
+                    strokes.append(Stroke(tool, tuple(position), list(target), [action], None))
+                    trailing = []
+                    painting = True
+                position = target
+            elif isinstance(action, ToolChange):
+                tool = action.tool
+                trailing.append(action)
+                painting = False
+            else:
+                # Homes and sounds happen at a point in the job, so the strokes on either side of them stay there
+                self._emit(optimized, output, strokes, trailing)
+                optimized.append(action)
+                if isinstance(action, Home):
+                    position = [0.0, 0.0, 0.0]
+                    output[0] = [0.0, 0.0, 0.0]
+                strokes, trailing = [], []
+                painting = False
+        self._emit(optimized, output, strokes, trailing)
+
+        time_before = estimate_time(actions, self._position, self._tool)
+        time_after = estimate_time(optimized, self._position, self._tool)
+        logger.info('estimated time: %.1f s before, %.1f s after', time_before, time_after)
+        if time_after >= time_before:
+            return Optimization(actions, time_before, time_before)
+        return Optimization(optimized, time_before, time_after)
+
+    def _emit(self, optimized, output, strokes, trailing):
+        """
+        Order a group of strokes and add them to the optimized job, followed by the travel and tool changes that came
+        after the last of them, like parking the brush at the end of the job
+        """
+        strokes = [stroke._replace(end=tuple(stroke.end), bounds=self._bounds(stroke)) for stroke in strokes]
+        for stroke in self.order(strokes, output[0], output[1]):
+            if stroke.tool != output[1]:
+                optimized.append(ToolChange(None, stroke.tool))
+                output[1] = stroke.tool
+            optimized.extend(self._travel(output[0], stroke.start, stroke.moves[0].feed_rate))
+            optimized.extend(stroke.moves)
+            output[0] = list(stroke.end)
+        for action in trailing:
+            optimized.append(action)
+            if isinstance(action, Move):
+                output[0] = _target(action, output[0])
+            else:
+                output[1] = action.tool
+
+    def _travel(self, start, end, feed_rate):
+        """
+        Make the moves from one stroke to the next, lifting the brush to the travel height unless it can go straight
+        there without painting, and lowering it at feed_rate, or as a rapid if that is None
+        """
+        if list(start) == list(end):
+            return []
+        if (start[0], start[1]) == (end[0], end[1]) and not paints(start[2], end[2], self._paint_z):
+            return [Move(None, None, None, end[2], feed_rate if end[2] > start[2] else None)]
+        moves = []
+        if start[2] != self._travel_z:
+            moves.append(Move(None, None, None, self._travel_z, None))
+        moves.append(Move(None, end[0], end[1], None, None))
+        if end[2] != self._travel_z:
+            moves.append(Move(None, None, None, end[2], feed_rate))
+        return moves
+
+    def _bounds(self, stroke):
+        xs = [stroke.start[0]]
+        ys = [stroke.start[1]]
+        position = list(stroke.start)
+        for move in stroke.moves:
+            position = _target(move, position)
+            xs.append(position[0])
+            ys.append(position[1])
+        return (min(xs), min(ys), max(xs), max(ys))
+
+    def order(self, strokes, position, tool):
+        """
+        Order strokes to paint each tool in as few batches as possible, with as little travel as possible
+
+        Arguments:
+            strokes {[Stroke]} -- the strokes in the order the job had them
+            position {(float, float, float)} -- where the machine is before the first stroke
+            tool {int} -- the tool loaded before the first stroke
+
+        Returns:
+            [Stroke] -- the same strokes in a new order
+        """
+        if not strokes:
+            return []
+        blockers, dependents = self._dependencies(strokes)
+        ready = [i for i in range(len(strokes)) if not blockers[i]]
+        ordered = []
+        while ready:
+            # Paint everything the loaded tool can paint now before changing it. Strokes only wait on strokes of
+            # other tools, so no more of this tool's strokes become ready until the tool changes.
+            if not any(strokes[i].tool == tool for i in ready):
+                tool = strokes[min(ready)].tool
+            batch = [i for i in ready if strokes[i].tool == tool]
+            ready = [i for i in ready if strokes[i].tool != tool]
+            tour = self.order_batch([strokes[i] for i in batch], position)
+            for i in tour:
+                ordered.append(strokes[batch[i]])
+                for j in dependents[batch[i]]:
+                    blockers[j] -= 1
+                    if not blockers[j]:
+                        ready.append(j)
+            position = ordered[-1].end
+            ready.sort()
+        return ordered
+
+    def _dependencies(self, strokes):
+        """
+        Find which strokes overlap an earlier stroke of another tool, using a grid so only nearby strokes are compared
+
+        Returns:
+            ([int], [[int]]) -- how many strokes each stroke has to wait for, and the strokes waiting on each stroke
+        """
+        pad = self._brush_width / 2
+        boxes = [(b[0] - pad, b[1] - pad, b[2] + pad, b[3] + pad) for b in (s.bounds for s in strokes)]
+        width = max(b[2] for b in boxes) - min(b[0] for b in boxes)
+        height = max(b[3] for b in boxes) - min(b[1] for b in boxes)
+        cell = max(width, height, 1e-9) / max(1, int(math.sqrt(len(strokes))))
+
+        grid = {}
+        blockers = [0] * len(strokes)
+        dependents = [[] for _ in strokes]
+        for j, box in enumerate(boxes):
+            cells = [(cx, cy)
+                     for cx in range(int(box[0] // cell), int(box[2] // cell) + 1)
+                     for cy in range(int(box[1] // cell), int(box[3] // cell) + 1)]
+            earlier = set()
+            for key in cells:
+                earlier.update(grid.get(key, ()))
+            for i in sorted(earlier):
+                other = boxes[i]
+                if strokes[i].tool != strokes[j].tool and \
+                        other[0] <= box[2] and box[0] <= other[2] and other[1] <= box[3] and box[1] <= other[3]:
+                    blockers[j] += 1
+                    dependents[i].append(j)
+            for key in cells:
+                grid.setdefault(key, []).append(j)
+        return blockers, dependents
+
+    def order_batch(self, strokes, position):
+        """
+        Order strokes that can be painted in any order, to travel as little as possible between them
+
+        Arguments:
+            strokes {[Stroke]} -- the strokes
+            position {(float, float, float)} -- where the machine is before the first stroke
+
+        Returns:
+            [int] -- the indices of the strokes, in the order to paint them
+        """
+        # Node 0 is the starting position and node k is strokes[k - 1]. The tour is an open path from node 0.
+        starts = [position] + [s.start for s in strokes]
+        ends = [position] + [s.end for s in strokes]
+        tour = self._nearest_neighbour(starts, ends)
+        improved = True
+        while improved and self._clock() < self._deadline:
+            improved = self._two_opt(tour, starts, ends)
+            improved = self._or_opt(tour, starts, ends) or improved
+        return [node - 1 for node in tour[1:]]
+
+    def _nearest_neighbour(self, starts, ends):
+        tour = [0]
+        remaining = set(range(1, len(starts)))
+        while remaining:
+            if self._clock() >= self._deadline:
+                tour.extend(sorted(remaining))  # out of time, so keep the rest in their original order
+                break
+            end = ends[tour[-1]]
+            nearest = min(remaining, key=lambda node: (_distance(end, starts[node]), node))
+            tour.append(nearest)
+            remaining.remove(nearest)
+        return tour
+
+    def _two_opt(self, tour, starts, ends):
+        """
+        Reverse the order of runs of strokes while that shortens the tour. Strokes are never painted backwards, so the
+        travel inside a reversed run changes too, which prefix sums of the travel each way keep cheap to find.
+        """
+        n = len(tour)
+        improved = False
+
+        def prefix_sums():
+            forward = [0.0]
+            backward = [0.0]
+            for k in range(n - 1):
+                forward.append(forward[-1] + _distance(ends[tour[k]], starts[tour[k + 1]]))
+                backward.append(backward[-1] + _distance(ends[tour[k + 1]], starts[tour[k]]))
+            return forward, backward
+
+        forward, backward = prefix_sums()
+        for i in range(1, n - 1):
+            if self._clock() >= self._deadline:
+                break
+            before = ends[tour[i - 1]]
+            for j in range(i + 1, n):
+                old = _distance(before, starts[tour[i]]) + forward[j] - forward[i]
+                new = _distance(before, starts[tour[j]]) + backward[j] - backward[i]
+                if j + 1 < n:
+                    after = starts[tour[j + 1]]
+                    old += _distance(ends[tour[j]], after)
+                    new += _distance(ends[tour[i]], after)
+                if new < old - 1e-9:
+                    tour[i:j + 1] = reversed(tour[i:j + 1])
+                    forward, backward = prefix_sums()
+                    improved = True
+        return improved
+
+    def _or_opt(self, tour, starts, ends):
+        """
+        Move runs of one to three strokes elsewhere in the tour while that shortens it
+        """
+        improved = False
+        for length in (1, 2, 3):
+            i = 1
+            while i + length <= len(tour):
+                if self._clock() >= self._deadline:
+                    return improved
+                n = len(tour)
+                first, last = tour[i], tour[i + length - 1]
+                prev = tour[i - 1]
+                next_ = tour[i + length] if i + length < n else None
+                removed = _distance(ends[prev], starts[first])
+                if next_ is not None:
+                    removed += _distance(ends[last], starts[next_]) - _distance(ends[prev], starts[next_])
+
+                best, best_gain = None, 1e-9
+                for p in range(n):
+                    if i - 1 <= p < i + length:
+                        continue
+                    after = tour[p + 1] if p + 1 < n else None
+                    added = _distance(ends[tour[p]], starts[first])
+                    if after is not None:
+                        added += _distance(ends[last], starts[after]) - _distance(ends[tour[p]], starts[after])
+                    if removed - added > best_gain:
+                        best, best_gain = p, removed - added
+                if best is None:
+                    i += 1
+                    continue
+                segment = tour[i:i + length]
+                anchor = tour[best]
+                del tour[i:i + length]
+                insert_at = tour.index(anchor) + 1
+                tour[insert_at:insert_at] = segment
+                improved = True
+        return improved
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='reorder the strokes of a G-code file to paint it faster')
+    parser.add_argument('path', help='the G-code file')
+    parser.add_argument('output', help='where to write the reordered G-code')
+    parser.add_argument('--time-budget', type=float, default=None, help='the most seconds to spend optimizing')
+    args = parser.parse_args()
+
+    result = ToolpathOptimizer(time_budget=args.time_budget).optimize(Planner().plan(parse(read_lines(args.path))))
+    with open(args.output, 'w') as f:
+        for line in format_actions(result.actions):
+            f.write(line + '\n')
+    print('estimated time: {:.1f} s before, {:.1f} s after'.format(result.time_before, result.time_after))
@@ -2,6 +2,8 @@ import cnc.main
 import cnc.logging_config
 import cnc.config as config
 
+from jog_sender import JogSender
+from jog_trace import JogTrace
 from xbox_to_gcode import XboxToGcode
 
 
@@ -11,18 +13,25 @@ if __name__ == '__main__':
     extruder_ranges = [(min_speed, e['max_speed'] / 60.0) for e in config.EXTRUDER_CONFIG]
 
     # cnc.logging_config.debug_enable()
+    # PyCNC's steps are not traced, so this only measures the input and send latencies
+    trace = JogTrace()
+    # do_line blocks while the machine moves, so lines are sent from another thread without piling up
+    sender = JogSender(cnc.main.do_line, kill_callback=cnc.hal.disable_steppers, trace=trace)
     gcode_generator = XboxToGcode(
-        cnc.main.do_line,
-        kill_callback=cnc.hal.disable_steppers,
+        sender.send,
+        kill_callback=sender.kill,
         rate=30.0,
         *extruder_ranges,
         range_x=(min_speed, config.MAX_VELOCITY_MM_PER_MIN_X / 60.0),
         range_y=(min_speed, config.MAX_VELOCITY_MM_PER_MIN_X / 60.0),
         range_z=(min_speed, config.MAX_VELOCITY_MM_PER_MIN_X / 60.0),
-        sound_ids=list(config.AUDIO_FILES.keys())
+        sound_ids=list(config.AUDIO_FILES.keys()),
+        trace=trace
     )
     try:
         gcode_generator.start()
         gcode_generator.join()
+        sender.stop()
     finally:
         cnc.main.machine.release()
+        print(trace.snapshot())
@@ -1,8 +1,10 @@
+import argparse
+import defines
 import math
 import time
 
 from enum import Enum
-from threading import Thread
+from threading import Event, Thread
 from xbox360controller import Xbox360Controller
 
 
@@ -21,6 +23,13 @@ _LED_MODES = [
 
 _STICK_DEADZONE = .2
 
+# In event-driven mode, velocities that differ by less than this fraction of each axis's max speed count as the same
+_VELOCITY_EPSILON = .02
+
+# In event-driven mode, how many times longer than a period a move may be while the sticks are held still, as long as
+# it is no longer than max_latency
+_MAX_PERIODS_PER_MOVE = 8
+
 
 class DpadDirection(Enum):
     N = 0
@@ -85,7 +94,7 @@ class XboxToGcode(Thread):
                  range_x=(_DEFAULT_MINSPEED, _DEFAULT_MAXSPEED),
                  range_y=(_DEFAULT_MINSPEED, _DEFAULT_MAXSPEED),
                  range_z=(_DEFAULT_MINSPEED, _DEFAULT_MAXSPEED),
-                 sound_ids=[]):
+                 sound_ids=[], event_driven=False, max_latency=None, trace=None, recorder=None, controller=None):
         """
         Pipe xbox controller input into gcode output
 
@@ -103,6 +112,18 @@ class XboxToGcode(Thread):
             range_e {[(float, float)]} -- a list containing the range for each extruder as a tuple of
                 (min speed, max speed) in mm/second
             sound_ids {[int]} -- a list of IDs to pass into a M72 command to play a sound
+            event_driven {bool} -- True to wake on controller events instead of polling at rate. Buttons are handled
+                as soon as they are pressed, a move is only sent when the sticks change or the last move is about to
+                run out, and moves get longer (up to {_MAX_PERIODS_PER_MOVE} periods) while the sticks are held
+                still. (default: {False})
+            max_latency {float} -- in event-driven mode, the longest in seconds a move may take, so the machine
+                stops about this soon after the sticks are released (default: {defines.JOG_MAX_LATENCY})
+            trace {JogTrace} -- stamps each controller event and line of gcode, to measure latency, or None to not
+                trace (default: {None})
+            recorder {SessionRecorder} -- records the controller's state at each event and line of gcode, and the
+                gcode, to replay later, or None to not record (default: {None})
+            controller {Xbox360Controller} -- the controller to read, like a session_log.ReplayController, or None
+                for the first xbox controller connected (default: {None})
         """
         # configuration
         self._send_gcode = callback
@@ -116,6 +137,10 @@ class XboxToGcode(Thread):
         else:
             self._range_e = [(_DEFAULT_MINSPEED, _DEFAULT_MAXSPEED)]
         self._sound_ids = sound_ids
+        self._event_driven = event_driven
+        self._max_latency = defines.JOG_MAX_LATENCY if max_latency is None else max_latency
+        self._trace = trace
+        self._recorder = recorder
 
         # state
         self._extruder_id = 0
@@ -125,8 +150,9 @@ class XboxToGcode(Thread):
         self._should_stop = False
         self._should_play_sound = False
         self._sound_index = 0
+        self._wake = Event()  # set by every controller event, for the event-driven mode
 
-        self._controller = Xbox360Controller()
+        self._controller = Xbox360Controller() if controller is None else controller
         super().__init__()
 
     def run(self):
@@ -137,17 +163,28 @@ class XboxToGcode(Thread):
         self._controller.button_trigger_l.when_released = self._use_prev_sound
         self._controller.button_trigger_r.when_released = self._use_next_sound
         self._controller.hat.when_moved = self._select_color_from_stick
+        for axis in (self._controller.axis_l, self._controller.axis_r,
+                     self._controller.trigger_l, self._controller.trigger_r):
+            axis.when_moved = self._on_event
 
         # configure the machine to use relative positioning
-        self._send_gcode('G91')
+        self._send('G91')
 
+        if self._event_driven:
+            self._run_event_driven()
+        else:
+            self._run_polling()
+
+        self._controller.close()
+
+    def _run_polling(self):
         while not self._should_stop:
             start_time = time.time()
 
             command = self._get_gcode()
             if command:
                 # print('sent command: \"{}\"'.format(command))
-                success = self._send_gcode(command)
+                success = self._send(command)
                 if not success:
                     break
 
@@ -157,7 +194,59 @@ class XboxToGcode(Thread):
             if time_to_wait > 0:
                 time.sleep(time_to_wait)
 
-        self._controller.close()
+    def _run_event_driven(self):
+        sent_velocity = (0, 0, 0, 0)
+        period = self._period
+        deadline = None  # when the last move runs out, or None if the machine is not moving
+        while not self._should_stop:
+            # sleep until something happens on the controller, or the last move is about to run out
+            timeout = None if deadline is None else max(0, deadline - self._period / 2 - time.monotonic())
+            self._wake.wait(timeout)
+            self._wake.clear()
+            if self._should_stop:
+                break
+
+            command = self._get_action_gcode()
+            if command:
+                if not self._send(command):
+                    break
+                self._wake.set()  # there may be more to do
+                continue
+
+            velocity = self._get_velocity()
+            now = time.monotonic()
+            if not self._is_moving(velocity):
+                sent_velocity = (0, 0, 0, 0)
+                deadline = None
+                continue
+            if deadline is not None and self._same_velocity(velocity, sent_velocity):
+                if now < deadline - self._period / 2:
+                    continue  # woken by a change too small to matter
+                # held still, so each move can cover a little longer than the last, but the machine only stops
+                # once the move sent last runs out, so not so long that letting go of the sticks takes a while
+                period = min(period * 2, self._period * _MAX_PERIODS_PER_MOVE, max(self._period, self._max_latency))
+            else:
+                period = self._period
+
+            if not self._send(self._get_move_gcode(velocity, period)):
+                break
+            sent_velocity = velocity
+            deadline = max(now, deadline or now) + period
+
+    def _send(self, command):
+        """
+        Send a line of gcode, tracing and recording it if there is a trace and a recorder. Returns True iff the
+        callback succeeded.
+        """
+        if self._recorder is not None:
+            self._recorder.record_state(self._controller)
+            self._recorder.record_gcode(command)
+        if self._trace is None:
+            return self._send_gcode(command)
+        command_id = self._trace.command()
+        success = self._send_gcode(command)
+        self._trace.sent(command_id)
+        return success
 
     def _num_extruders(self):
         return len(self._range_e)
@@ -174,6 +263,7 @@ class XboxToGcode(Thread):
             return
 
         self._next_extruder_id = index
+        self._on_event(None)
 
     def _use_next_led_mode(self, _):
         self._led_mode = (self._led_mode + 1) % len(_LED_MODES)
@@ -181,9 +271,11 @@ class XboxToGcode(Thread):
 
     def _set_go_home(self, _):
         self._go_home = True
+        self._on_event(None)
 
     def _set_play_sound(self, _):
         self._should_play_sound = True
+        self._on_event(None)
 
     def _use_next_sound(self, _):
         self._sound_index = (self._sound_index + 1) % len(self._sound_ids)
@@ -191,15 +283,42 @@ class XboxToGcode(Thread):
     def _use_prev_sound(self, _):
         self._sound_index = (self._sound_index - 1) % len(self._sound_ids)
 
+    def stop(self):
+        """
+        Stop sending gcode, from any thread, without killing the machine
+        """
+        self._should_stop = True
+        self._wake.set()
+
     def _kill(self, _):
         if self._send_kill_command:
             self._send_kill_command()
-        self._should_stop = True
+        self.stop()
+
+    def _on_event(self, _):
+        if self._trace is not None:
+            self._trace.event()
+        if self._recorder is not None:
+            self._recorder.record_state(self._controller)
+        self._wake.set()
 
     def _get_gcode(self):
         """
         Get a line of gcode for the current state of the xbox controller, or None if it is inactive.
         """
+        command = self._get_action_gcode()
+        if command:
+            return command
+
+        velocity = self._get_velocity()
+        if self._is_moving(velocity):
+            return self._get_move_gcode(velocity, self._period)
+        return None
+
+    def _get_action_gcode(self):
+        """
+        Get a line of gcode for a button that has been pressed, or None if there is none.
+        """
         # check sound button
         if self._should_play_sound and self._sound_ids:
             self._should_play_sound = False
@@ -216,7 +335,12 @@ class XboxToGcode(Thread):
             self._extruder_id = self._next_extruder_id
             return 'T{}'.format(self._extruder_id)
 
-        # calculate commanded velocity on each axis
+        return None
+
+    def _get_velocity(self):
+        """
+        Get the velocity the sticks and triggers command, as (x, y, z, e) in mm/second.
+        """
         vel_x = 0
         vel_y = 0
         vel_z = 0
@@ -240,20 +364,37 @@ class XboxToGcode(Thread):
         else:
             vel_e = self._controller.trigger_r.value * range_e[1]
 
-        # if any axis is moving fast enough, send a rapid move command
-        if abs(vel_x) > self._range_x[0] or abs(vel_y) > self._range_y[0] or abs(vel_z) > self._range_z[0] \
-                or abs(vel_e) > range_e[0]:
-            dx = vel_x * self._period
-            dy = vel_y * self._period
-            dz = vel_z * self._period
-            de = vel_e * self._period
+        return vel_x, vel_y, vel_z, vel_e
 
-            speed = math.sqrt(vel_x * vel_x + vel_y * vel_y + vel_z * vel_z + vel_e * vel_e)
-            speed *= 60.0  # convert to mm/minute
+    def _is_moving(self, velocity):
+        """
+        Returns True iff any axis is moving fast enough for the machine to accept a move command.
+        """
+        vel_x, vel_y, vel_z, vel_e = velocity
+        return abs(vel_x) > self._range_x[0] or abs(vel_y) > self._range_y[0] or abs(vel_z) > self._range_z[0] \
+            or abs(vel_e) > self._extruder_range()[0]
 
-            return 'G1 X{} Y{} Z{} E{} F{}'.format(dx, dy, dz, de, speed)
+    def _same_velocity(self, a, b):
+        """
+        Returns True iff two velocities differ by less than _VELOCITY_EPSILON of the max speed on every axis.
+        """
+        max_speeds = (self._range_x[1], self._range_y[1], self._range_z[1], self._extruder_range()[1])
+        return all(abs(u - v) <= _VELOCITY_EPSILON * max_speed for u, v, max_speed in zip(a, b, max_speeds))
 
-        return None
+    def _get_move_gcode(self, velocity, period):
+        """
+        Get a line of gcode that moves at a velocity for period seconds.
+        """
+        vel_x, vel_y, vel_z, vel_e = velocity
+        dx = vel_x * period
+        dy = vel_y * period
+        dz = vel_z * period
+        de = vel_e * period
+
+        speed = math.sqrt(vel_x * vel_x + vel_y * vel_y + vel_z * vel_z + vel_e * vel_e)
+        speed *= 60.0  # convert to mm/minute
+
+        return 'G1 X{:.4f} Y{:.4f} Z{:.4f} E{:.4f} F{:.4f}'.format(dx, dy, dz, de, speed)
 
 
 if __name__ == '__main__':
@@ -264,6 +405,19 @@ if __name__ == '__main__':
         print(line, end='\r')
         return True
 
-    gcode_generator = XboxToGcode(do_line, rate=1.0)
-    gcode_generator.start()
-    gcode_generator.join()
+    parser = argparse.ArgumentParser(description='print the G-code an xbox controller sends')
+    parser.add_argument('--record', metavar='PATH', help='record the session to replay with session_log.py')
+    args = parser.parse_args()
+
+    recorder = None
+    if args.record:
+        from session_log import SessionRecorder
+        recorder = SessionRecorder(open(args.record, 'wb'))
+
+    gcode_generator = XboxToGcode(do_line, rate=1.0, recorder=recorder)
+    try:
+        gcode_generator.start()
+        gcode_generator.join()
+    finally:
+        if recorder:
+            recorder.close()